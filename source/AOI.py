@@ -1,4 +1,5 @@
-from carmera import Carmera
+from source.Api import get_scheduler, get_service
+from source.Paginator import paginate
 # -*- coding: utf-8 -*-
 __author__ = 'Rainer Arencibia'
 
@@ -41,10 +42,17 @@ class AOI(object):
     Class useful for search for Image(s) in an Area of Interest.
     Area of Interest queries default sort by Captured On Ascending.
     """
-    def __init__(self, key):
-        cm = Carmera(api_key=str(key))
-        self.aoi = cm.Aoi()       # AOI Service
+    def __init__(self, key, cache=None, url=None, scheduler=None):
+        """
+        :param key: API key.
+        :param cache: Optional Cache object, searches already requested are read from it.
+        :param url: Base URL of the API, e.g. a local MockCarmera. None, the carmera client.
+        :param scheduler: Scheduler of the requests. None, the one shared by all the services of the same API.
+        """
+        self.scheduler = scheduler or get_scheduler(url)
+        self.aoi = get_service(key, 'Aoi', url=url, scheduler=self.scheduler)  # AOI Service
         self.aoi_id_set = set()
+        self.cache = cache
 
     @staticmethod
     def size_all_aois(self):
@@ -118,6 +126,23 @@ class AOI(object):
             print(e.error)
         return None
 
+    @staticmethod
+    def stream(self, options, offset=0, limit=1000, prefetch=True):
+        """
+        Search for Image(s) in an Area of Interest walking all the pages.
+        The next page is requested while the current one is consumed.
+        :param self: AOI object.
+        :param options: Dict with the search options. e.g. {'aoi': [[[lon,lat],[lon,lat],[lon,lat],[lon,lat]]]}
+        :param offset: Offset of the first page.
+        :param limit: Integer that indicate the results page size. 1 - 1000
+        :param prefetch: Request the next page in background.
+        :return: Generator of images, one image feature at a time.
+        """
+        def add_aoi(feature_collection):
+            self.aoi_id_set.add(feature_collection['id'])
+        search = self.aoi.search if self.cache is None else self.cache.cached_search('aoi', self.aoi.search)
+        return paginate(search, options, offset=offset, limit=limit, prefetch=prefetch, on_page=add_aoi)
+
     @staticmethod
     def search(self, aoi=None, sort='captured_on', order='ASC', filt=None, range=None, tags=None, offset=0, limit=1000):
         """
@@ -129,9 +154,9 @@ class AOI(object):
         :param tags: Look for image with a specific tag
         :param filt: Special setting for look for better quality pictures, like speed=0, position, etc.
         :param range: Range of dates to look  for pictures
-        :param offset: Integer that indicate tha max number of pages.
+        :param offset: Offset of the first page. All the pages after it are walked.
         :param limit: Integer that indicate the results page size.
-        :return: Retrieve an AOI you created.
+        :return: A set of the pictures ID in the AOI.
         """
         try:
             options = {
@@ -142,13 +167,9 @@ class AOI(object):
                 'filter': filt,     # filter=position=1|4,speed>=20,
                 'range': range,     # '2016-07-01,2016-07-15',
                 'tags': tags,       # tags=safety.score>=8,
-                'offset': offset,   # {} The pagination offset.0 Default value
-                'limit': limit,     # 1 - 1000
             }
-            feature_collection = self.aoi.search(options).json()
-            self.aoi_id_set.add(feature_collection['id'])
             img_id_set = set()
-            for image in feature_collection['features']:
+            for image in AOI.stream(self, options, offset=offset, limit=limit):
                 img_id_set.add(image['properties']['image_id'])
             return img_id_set
         except Exception as e:
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from source.Scheduler import Scheduler, Throttled
+
+
+""" REST client with the same methods as the carmera client, for any base URL. e.g. a local MockCarmera.
+    GET  {url}images/search/?apikey=...&address=...&radius=...&offset=...&limit=...
+    GET  {url}images/{image_id}/
+    GET  {url}aois/search/?aoi=[[[lon,lat],...]]&range=...
+    GET  {url}aois/{aoi_id}/
+    POST {url}aois/            {"aoi": [[[lon,lat],...]], "name": "East Village"}
+    PUT  {url}aois/{aoi_id}/   {"aoi": [[[lon,lat],...]], "name": "East Village"}
+    GET  {url}tags/search/?tags=car.make=bmw
+    Lists and dicts of the options are sent as JSON, the options with None are not sent.
+"""
+
+
+class ApiError(Exception):
+    """
+    Error answered by the server. Same attributes as the errors of the carmera client.
+    """
+    def __init__(self, code, error, retry_after=None):
+        Exception.__init__(self, '{} {}'.format(code, error))
+        self.code = code
+        self.error = error
+        self.retry_after = retry_after      # Seconds asked by the server before the next request, for a 429.
+
+
+def encode(options):
+    """
+    :param options: Dict with the options of a request.
+    :return: Dict ready to be sent as URL parameters.
+    """
+    params = {}
+    for k, v in (options or {}).items():
+        if v is None:
+            continue
+        params[k] = json.dumps(v, separators=(',', ':')) if isinstance(v, (list, tuple, dict)) else v
+    return params
+
+
+class Service(object):
+    def __init__(self, api, name):
+        """
+        :param api: Api object, its session is shared by all the services.
+        :param name: Path of the service, e.g. 'images'
+        """
+        self.api = api
+        self.name = name
+
+    def request(self, method, path, options=None, body=None):
+        """
+        :return: Response, .json() for the content. Raise ApiError when the server answer with an error.
+        """
+        return self.api.request(method, '{}/{}'.format(self.name, path), options, body)
+
+    def search(self, options):
+        """
+        :param options: Dict with the search options, 'offset' and 'limit' included.
+        :return: Response with a FeatureCollection.
+        """
+        return self.request('GET', 'search/', options)
+
+    def get_by_id(self, id, options=None):
+        return self.request('GET', '{}/'.format(id), options)
+
+
+class ImageService(Service):
+    def __init__(self, api):
+        Service.__init__(self, api, 'images')
+
+
+class AoiService(Service):
+    def __init__(self, api):
+        Service.__init__(self, api, 'aois')
+
+    def create(self, aoi, name):
+        return self.request('POST', '', body={'aoi': aoi, 'name': name})
+
+    def update(self, aoi_id, aoi, name):
+        return self.request('PUT', '{}/'.format(aoi_id), body={'aoi': aoi, 'name': name})
+
+
+class TagService(Service):
+    def __init__(self, api):
+        Service.__init__(self, api, 'tags')
+
+
+class Api(object):
+    """
+    Replacement of Carmera(api_key=...) for a base URL. All the services share one keep-alive session, and one
+    Scheduler when it is given.
+    """
+    URL = 'https://api.carmera.com/v1/'
+
+    def __init__(self, key, url=URL, connections=16, timeout=30, scheduler=None):
+        """
+        :param key: API key.
+        :param url: Base URL of the API.
+        :param connections: Max open connections kept alive.
+        :param timeout: Seconds to wait for the server.
+        :param scheduler: Scheduler of the requests, None to send them at once with no retry.
+        """
+        self.key = str(key)
+        self.url = url if url.endswith('/') else url + '/'
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, path, options=None, body=None):
+        """
+        :param method: 'GET', 'POST' or 'PUT'
+        :param path: Path after the base URL.
+        :param options: Dict of URL parameters.
+        :param body: Object sent as JSON.
+        :return: Response. Raise ApiError when the server answer with an error, after the retries of the Scheduler.
+        """
+        if self.scheduler is None:
+            return self.send(method, path, options, body)
+        try:
+            return self.scheduler.call(self.send, method, path, options, body)
+        except requests.RequestException as e:
+            raise ApiError(None, str(e))
+
+    def send(self, method, path, options=None, body=None):
+        params = encode(options)
+        params['apikey'] = self.key
+        res = self.session.request(method, self.url + path, params=params, json=body, timeout=self.timeout)
+        if res.status_code >= 400:
+            raise ApiError(res.status_code, res.reason, res.headers.get('Retry-After'))
+        return res
+
+    def Image(self):
+        return ImageService(self)
+
+    def Aoi(self):
+        return AoiService(self)
+
+    def Tag(self):
+        return TagService(self)
+
+
+SCHEDULERS = {}     # Base URL -> Scheduler, shared by all the services of the process to the same API.
+APIS = {}           # (key, base URL) -> Api, one keep-alive session per API.
+LOCK = threading.Lock()
+
+
+def get_scheduler(url=None):
+    """
+    :param url: Base URL of the API, None for the Carmera API.
+    :return: The Scheduler of the process for that API. Replace it with SCHEDULERS[url] = Scheduler(...)
+    """
+    url = url or Api.URL
+    with LOCK:
+        if url not in SCHEDULERS:
+            SCHEDULERS[url] = Scheduler()
+        return SCHEDULERS[url]
+
+
+def get_service(key, name, url=None, scheduler=None):
+    """
+    :param key: API key.
+    :param name: 'Image', 'Aoi' or 'Tag'
+    :param url: Base URL of the API. None, the carmera client.
+    :param scheduler: Scheduler of the requests. None, the one of the process for that API.
+    :return: Service of the API with every request going through the scheduler.
+    """
+    scheduler = scheduler or get_scheduler(url)
+    if url is None:
+        from carmera import Carmera
+        return Throttled(getattr(Carmera(api_key=str(key)), name)(), scheduler)
+    with LOCK:
+        api = APIS.get((str(key), url))
+        if api is None or api.scheduler is not scheduler:
+            api = APIS[(str(key), url)] = Api(key, url=url, scheduler=scheduler)
+    return getattr(api, name)()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from source.Downloader import Downloader
+from source.MockCarmera import MockCarmera
+from source.Paginator import image_id
+from source.Scheduler import Scheduler
+
+
+""" Throughput of every step against a local MockCarmera, no network and no API key needed.
+    python -m source.Benchmark --images 5000 --latency 0.01 --workers 16 --output bench.json
+    Same arguments, same catalog and same errors, so two runs can be compared before and after a change.
+"""
+
+KEY = 'benchmark'
+
+
+def rate(items, seconds):
+    return items / seconds if seconds > 0 else 0.0
+
+
+def bench_search(url, options, limit=1000, scheduler=None):
+    """
+    :return: (image features found, dict with the speed of the search)
+    """
+    from source.Image import Image
+    service = Image(KEY, url=url, scheduler=scheduler)
+    start = time.time()
+    images = list(Image.stream_images(service, options, limit=limit))
+    seconds = time.time() - start
+    return images, {'images': len(images), 'pages': len(images) // limit + 1, 'seconds': seconds,
+                    'images_per_sec': rate(len(images), seconds)}
+
+
+def bench_download(url, ids, out_dir, workers=8, per_host=8, width=None, scheduler=None):
+    """
+    :return: Dict with the speed of the downloads.
+    """
+    downloader = Downloader(KEY, url=url, workers=workers, per_host=per_host, scheduler=scheduler)
+    downloader.download_all(ids, out_dir, width=width)
+    return dict(downloader.stats)
+
+
+def bench_thumbnail(folder, out_dir, width=320, processes=None):
+    """
+    :return: Dict with the speed of the thumbnails.
+    """
+    from source.Processing.Thumbnail import thumbnails
+    sources = [os.path.join(folder, f) for f in sorted(os.listdir(folder))]
+    return thumbnails(sources, out_dir, width=width, processes=processes)[1]
+
+
+def bench_ping(url, ids, workers=4, batch_url=None):
+    """
+    :return: Dict with the speed of the pings, every ping sent when it returns.
+    """
+    from source.Notifier import Notifier
+    notifier = Notifier(url=url, workers=workers, batch_url=batch_url).start()
+    start = time.time()
+    for i in ids:
+        notifier.notify(i)
+    notifier.close()
+    seconds = time.time() - start
+    stats = dict(notifier.stats)
+    stats.update({'seconds': seconds, 'images_per_sec': rate(stats['sent'], seconds)})
+    return stats
+
+
+def bench_pipeline(url, images, out_dir, ping_url, width=320, workers=8, thumbnail_workers=2, scheduler=None):
+    """
+    Search, download, thumbnail and ping at the same time.
+    :return: Dict with the metrics of every stage, and the speed of all of them.
+    """
+    from source.Notifier import Notifier
+    from source.Pipeline import Pipeline
+    notifier = Notifier(url=ping_url).start()
+    downloader = Downloader(KEY, url=url, workers=workers, per_host=workers, scheduler=scheduler)
+    pipeline = Pipeline(downloader, out_dir, width=width, ping=notifier.notify, download_workers=workers,
+                        thumbnail_workers=thumbnail_workers)
+    start = time.time()
+    metrics = pipeline.run(images)
+    notifier.close()
+    seconds = time.time() - start
+    metrics['total'] = {'images': len(images), 'seconds': seconds, 'images_per_sec': rate(len(images), seconds),
+                        'errors': len(pipeline.errors)}
+    return metrics
+
+
+def run(images=1000, latency=0.0, error_rate=0.0, page_size=1000, workers=8, processes=None, width=320, seed=0):
+    """
+    Start a MockCarmera and measure search, download, thumbnail, ping and the whole pipeline.
+    :param images: Images of the catalog, all of them are searched and downloaded.
+    :param latency: Seconds added by the server to every answer.
+    :param error_rate: Part of the requests failed by the server.
+    :param page_size: Images per page of the search.
+    :param workers: Threads downloading images.
+    :param processes: Processes making thumbnails. None, one per core.
+    :param width: Width of the downloads and the thumbnails.
+    :param seed: Seed of the catalog and the errors.
+    :return: Dict of results per step.
+    """
+    # No rate limit, the scheduler only retries the errors of the server.
+    scheduler = Scheduler(rate=None, concurrency=max(16, workers), backoff=0.01)
+    folder = tempfile.mkdtemp()
+    results = {'config': {'images': images, 'latency': latency, 'error_rate': error_rate, 'page_size': page_size,
+                          'workers': workers, 'processes': processes, 'width': width, 'seed': seed}}
+    try:
+        with MockCarmera(images=images, latency=latency, error_rate=error_rate, page_size=page_size,
+                         seed=seed) as mock:
+            found, results['search'] = bench_search(mock.url, {'address': 'East Village', 'sort': 'captured_on'},
+                                                    limit=page_size, scheduler=scheduler)
+            ids = [image_id(image) for image in found]
+            downloads = os.path.join(folder, 'download')
+            results['download'] = bench_download(mock.url, ids, downloads, workers=workers, per_host=workers,
+                                                 width=width, scheduler=scheduler)
+            results['thumbnail'] = bench_thumbnail(downloads, os.path.join(folder, 'thumbnail'), width=width // 2,
+                                                   processes=processes)
+            results['ping'] = bench_ping(mock.ping_url, ids, workers=workers)
+            results['ping_batch'] = bench_ping(mock.ping_url, ids, workers=workers, batch_url=mock.batch_url)
+            results['pipeline'] = bench_pipeline(mock.url, found, os.path.join(folder, 'pipeline'), mock.ping_url,
+                                                 width=width, workers=workers, scheduler=scheduler)
+            results['server'] = dict(mock.stats)
+            results['scheduler'] = scheduler.metrics()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m source.Benchmark', description='Offline throughput benchmark.')
+    parser.add_argument('--images', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every answer.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Part of the requests failed, 0 - 1.')
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--width', type=int, default=320)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file with all the results.')
+    args = parser.parse_args(argv)
+    results = run(images=args.images, latency=args.latency, error_rate=args.error_rate, page_size=args.page_size,
+                  workers=args.workers, processes=args.processes, width=args.width, seed=args.seed)
+    for name in ('search', 'download', 'thumbnail', 'ping', 'ping_batch'):
+        print('{:<12}{:>10.1f} images/sec'.format(name, results[name]['images_per_sec']))
+    print('{:<12}{:>10.1f} images/sec'.format('pipeline', results['pipeline']['total']['images_per_sec']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
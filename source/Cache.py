@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SEARCH_TTL = 24 * 3600.0    # Default seconds a cached search is valid, new images are captured every day.
+
+
+class CachedResponse(object):
+    """
+    Answer of the cache with the same interface of the API responses.
+    """
+    def __init__(self, value):
+        self.value = value
+
+    def json(self):
+        return self.value
+
+
+class Cache(object):
+    """
+    Persistent cache of the API answers on a local SQLite file, with an optional small cache in memory on top.
+    The entries expire after ttl seconds, and the least recently used entries are removed when there are more than
+    max_entries.
+    """
+    def __init__(self, path, ttl=None, max_entries=100000, memory=0, touch_batch=100, search_ttl=None):
+        """
+        :param path: SQLite file. ':memory:' for a cache that lives only in this process.
+        :param ttl: Default seconds an entry is valid. None, the entries never expire.
+        :param max_entries: Max number of entries on disk.
+        :param memory: Number of entries to keep in memory too. 0, no memory layer.
+        :param touch_batch: Hits of the memory layer kept before their access time is written to disk at once.
+        :param search_ttl: Default seconds a search of cached_search is valid. None, ttl when it is given, else
+                           SEARCH_TTL: a search never lives forever, its results change when new images are captured.
+        """
+        self.ttl = ttl
+        self.search_ttl = search_ttl if search_ttl is not None else ttl if ttl is not None else SEARCH_TTL
+        self.max_entries = max_entries
+        self.memory_size = memory
+        self.memory = OrderedDict()     # key -> (expires, value)
+        self.touch_batch = touch_batch
+        self.touched = {}               # key -> time of the last hit in memory, not written to disk yet.
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'memory_hits': 0, 'misses': 0}
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS cache '
+                        '(key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+        self.db.commit()
+        self.size = self.db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    @staticmethod
+    def image_key(image_id):
+        """
+        :param image_id: ID of an image.
+        :return: Key of the image metadata.
+        """
+        return 'image:{}'.format(image_id)
+
+    @staticmethod
+    def search_key(name, options):
+        """
+        Two searches with the same options get the same key, no matter the order of the options. Options with None
+        value are not send to the API, so they are not part of the key.
+        :param name: Name of the search, e.g. 'image' or 'aoi'.
+        :param options: Dict with the search options.
+        :return: Key of the search.
+        """
+        options = dict((k, v) for k, v in options.items() if v is not None)
+        return 'search:{}:{}'.format(name, json.dumps(options, sort_keys=True, separators=(',', ':')))
+
+    def get(self, key):
+        """
+        :param key: Key of the entry.
+        :return: The value saved with the key, None when it is not in the cache or it expired.
+        """
+        now = time.time()
+        with self.lock:
+            if key in self.memory:
+                expires, value = self.memory[key]
+                if expires is None or expires > now:
+                    self.memory.move_to_end(key)
+                    self.touch(key, now)
+                    self.stats['hits'] += 1
+                    self.stats['memory_hits'] += 1
+                    return value
+                del self.memory[key]
+                self.touched.pop(key, None)
+
+            row = self.db.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            if row[1] is not None and row[1] <= now:
+                self.db.execute('DELETE FROM cache WHERE key = ?', (key,))
+                self.db.commit()
+                self.size -= 1
+                self.stats['misses'] += 1
+                return None
+            self.db.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+            self.db.commit()
+            value = json.loads(row[0])
+            self.remember(key, row[1], value)
+            self.stats['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        :param key: Key of the entry.
+        :param value: Any value that can be saved as JSON.
+        :param ttl: Seconds the entry is valid. None, the default ttl of the cache.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+        with self.lock:
+            self.touched.pop(key, None)
+            exists = self.db.execute('SELECT 1 FROM cache WHERE key = ?', (key,)).fetchone()
+            self.db.execute('INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                            (key, json.dumps(value), expires, now))
+            if exists is None:
+                self.size += 1
+            if self.size > self.max_entries:
+                self.evict(self.size - self.max_entries)
+            self.db.commit()
+            self.remember(key, expires, value)
+
+    def touch(self, key, now):
+        """
+        Remember a hit of the memory layer, so the entry does not look cold on disk to evict.
+        """
+        self.touched[key] = now
+        if len(self.touched) >= self.touch_batch:
+            self.flush_touched()
+            self.db.commit()
+
+    def flush_touched(self):
+        """
+        Write the access times of the hits of the memory layer to disk, one statement for all of them.
+        """
+        if self.touched:
+            self.db.executemany('UPDATE cache SET accessed = ? WHERE key = ?',
+                                [(accessed, key) for key, accessed in self.touched.items()])
+            self.touched.clear()
+
+    def evict(self, count):
+        """
+        Remove the least recently used entries from disk.
+        :param count: Number of entries to remove.
+        """
+        self.flush_touched()
+        self.db.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)', (count,))
+        self.size = self.db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def remember(self, key, expires, value):
+        if self.memory_size <= 0:
+            return
+        self.memory[key] = (expires, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.touched.clear()
+            self.db.execute('DELETE FROM cache')
+            self.db.commit()
+            self.size = 0
+
+    def close(self):
+        with self.lock:
+            self.flush_touched()
+            self.db.commit()
+            self.db.close()
+
+    def cached_search(self, name, search, ttl=None):
+        """
+        Wrap a search function of the API, so the same search is only requested once.
+        :param name: Name of the search, e.g. 'image' or 'aoi'.
+        :param search: Function of the API that receive the options and return a response with .json()
+        :param ttl: Seconds the results are valid. None, the search_ttl of the cache.
+        :return: Function with the same interface of search.
+        """
+        ttl = self.search_ttl if ttl is None else ttl
+
+        def cached(options):
+            key = Cache.search_key(name, options)
+            value = self.get(key)
+            if value is None:
+                value = search(options).json()
+                self.set(key, value, ttl=ttl)
+            return CachedResponse(value)
+        return cached
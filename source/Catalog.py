@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+
+import numpy as np
+
+from source.Paginator import image_id
+from source.Spatial import SpatialIndex, timestamps, time_window
+from source.Sync import captured_on
+
+
+""" Metadata of millions of images in a few typed NumPy columns, instead of a GeoJSON dict and a set entry each.
+    31 bytes per image: id int64, lon/lat float32, captured_on int64 (seconds since 1970), speed float32,
+    position int8, camera int16. The rows are sorted by id, so membership is a binary search (np.searchsorted).
+    catalog = Catalog.from_features(Image.stream_images(image, options))
+    catalog.new(ids)                                -> the IDs not in the catalog yet
+    catalog.select(catalog.mask(max_speed=5, position=1, range='2017-01-17,2017-01-18'))
+    catalog.save('catalog/') ... Catalog.load('catalog/')   One .npy per column, memory mapped.
+"""
+
+COLUMNS = [('ids', np.int64), ('lon', np.float32), ('lat', np.float32), ('captured', np.int64),
+           ('speed', np.float32), ('position', np.int8), ('camera', np.int16)]
+
+
+class Catalog(object):
+    """
+    Columns of image metadata, one row per image, sorted by ID and without duplicates.
+    """
+    def __init__(self, ids=(), lon=(), lat=(), captured=(), speed=(), position=(), camera=(), sort=True):
+        """
+        :param sort: False when the rows are already sorted by ID and without duplicates, e.g. loaded from disk.
+        """
+        columns = [ids, lon, lat, captured, speed, position, camera]
+        columns = [c if isinstance(c, np.ndarray) and c.dtype == dtype else np.asarray(c, dtype=dtype)
+                   for c, (_, dtype) in zip(columns, COLUMNS)]
+        if sort and len(columns[0]):
+            # The last copy of an ID wins, so the metadata of a later harvest replaces the old one.
+            reverse = columns[0][::-1]
+            _, last = np.unique(reverse, return_index=True)
+            keep = len(reverse) - 1 - last
+            columns = [c[keep] for c in columns]
+        self.ids, self.lon, self.lat, self.captured, self.speed, self.position, self.camera = columns
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, image_id):
+        i = np.searchsorted(self.ids, image_id)
+        return i < len(self.ids) and self.ids[i] == image_id
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name, _ in COLUMNS)
+
+    @staticmethod
+    def from_features(features, batch=100000):
+        """
+        :param features: Iterable of image features, e.g. Image.stream_images(...). Only 'batch' features are kept
+                         as dicts at the same time.
+        :return: Catalog
+        """
+        catalog = Catalog()
+        rows = []
+        for feature in features:
+            properties = feature['properties']
+            coordinates = feature['geometry']['coordinates']
+            rows.append((int(image_id(feature)), coordinates[0], coordinates[1], captured_on(feature),
+                         properties.get('speed') or 0.0, properties.get('position') or 0,
+                         properties.get('camera') or 0))
+            if len(rows) >= batch:
+                catalog = catalog.add(Catalog.from_rows(rows))
+                rows = []
+        if rows:
+            catalog = catalog.add(Catalog.from_rows(rows))
+        return catalog
+
+    @staticmethod
+    def from_rows(rows):
+        """
+        :param rows: List of tuples (id, lon, lat, captured_on as text, speed, position, camera)
+        """
+        ids, lon, lat, captured, speed, position, camera = zip(*rows)
+        return Catalog(ids, lon, lat, timestamps(captured), speed, position, camera)
+
+    def add(self, other):
+        """
+        :param other: Catalog with new images, the images already in this one are replaced.
+        :return: New Catalog with the images of both.
+        """
+        if not len(self):
+            return other
+        if not len(other):
+            return self
+        return Catalog(*[np.concatenate([getattr(self, name), getattr(other, name)]) for name, _ in COLUMNS])
+
+    def contains(self, ids):
+        """
+        :param ids: Array of IDs.
+        :return: Numpy array of bool, True for the IDs in the catalog.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self):
+            return np.zeros(len(ids), dtype=bool)
+        i = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        return self.ids[i] == ids
+
+    def new(self, ids):
+        """
+        :param ids: Array of IDs, e.g. the IDs of a new search.
+        :return: Numpy array of the IDs not in the catalog, without duplicates.
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        return ids[~self.contains(ids)]
+
+    def positions(self, ids):
+        """
+        :param ids: Array of IDs in the catalog.
+        :return: Numpy array with the row of every ID.
+        """
+        return np.searchsorted(self.ids, np.asarray(ids, dtype=np.int64))
+
+    def mask(self, range=None, min_speed=None, max_speed=None, position=None, camera=None):
+        """
+        :param range: Time window 'start,end' like the 'range' search option.
+        :param position: Position of the camera, or list of positions.
+        :param camera: Camera, or list of cameras.
+        :return: Numpy array of bool, True for the rows that pass all the filters given.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if range is not None:
+            start, end = time_window(range)
+            mask &= (self.captured >= start) & (self.captured <= end)
+        if min_speed is not None:
+            mask &= self.speed >= min_speed
+        if max_speed is not None:
+            mask &= self.speed <= max_speed
+        if position is not None:
+            mask &= np.isin(self.position, position)
+        if camera is not None:
+            mask &= np.isin(self.camera, camera)
+        return mask
+
+    def select(self, rows):
+        """
+        :param rows: Numpy array of bool (see mask) or of rows.
+        :return: New Catalog with those rows.
+        """
+        return Catalog(*[getattr(self, name)[rows] for name, _ in COLUMNS], sort=False)
+
+    def spatial(self, cell=None):
+        """
+        :param cell: Size of the cells of the grid, in degrees. None, the default of SpatialIndex.
+        :return: SpatialIndex of the images of the catalog, for polygon and radius queries.
+        """
+        args = (self.ids, self.lon, self.lat, self.captured, self.speed)
+        return SpatialIndex(*args) if cell is None else SpatialIndex(*args, cell=cell)
+
+    def save(self, folder):
+        """
+        :param folder: Folder with one .npy file per column.
+        """
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        for name, _ in COLUMNS:
+            tmp = os.path.join(folder, name + '.tmp.npy')
+            np.save(tmp, getattr(self, name))
+            os.replace(tmp, os.path.join(folder, name + '.npy'))
+
+    @staticmethod
+    def load(folder, mmap=True):
+        """
+        :param folder: Folder of save.
+        :param mmap: Map the columns from disk instead of reading them, only the rows used are read.
+        :return: Catalog
+        """
+        mode = 'r' if mmap else None
+        columns = [np.load(os.path.join(folder, name + '.npy'), mmap_mode=mode) for name, _ in COLUMNS]
+        return Catalog(*columns, sort=False)
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import json
+import os
+import time
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+from source.Processing.Magic import Proccesing
+from source.Processing.Thumbnail import decode, read
+
+
+""" Fixed length vector of an image, float32:
+    color histogram: 3 channels x HIST_BINS, Proccesing.histograms normalized to sum 1 per channel.
+    pixels:          gray image resized to PIXELS x PIXELS, values 0 - 1.
+    hog:             HOG descriptor of the gray image resized to 64 x 64.
+"""
+WIDTH = 256             # Width of the decoded copy, the JPEG files are decoded reduced to it.
+HIST_BINS = 16
+PIXELS = 16
+HOG = cv2.HOGDescriptor((64, 64), (16, 16), (16, 16), (8, 8), 9)
+DIM = 3 * HIST_BINS + PIXELS * PIXELS + HOG.getDescriptorSize()
+
+
+def color_histogram(img, bins=HIST_BINS):
+    """
+    :param img: Numpy array, color image.
+    :param bins: Bins per channel.
+    :return: Numpy array of 3 x bins values.
+    """
+    hist = [hist_item.ravel() for hist_item in Proccesing().histograms(img, bins)]
+    return np.concatenate([hist_item / max(hist_item.sum(), 1.0) for hist_item in hist])
+
+
+def extract(img):
+    """
+    :param img: Numpy array, color image.
+    :return: Numpy array of DIM float32 values.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    pixels = cv2.resize(gray, dsize=(PIXELS, PIXELS), interpolation=cv2.INTER_AREA).ravel() / 255.0
+    hog = HOG.compute(cv2.resize(gray, dsize=(64, 64), interpolation=cv2.INTER_AREA)).ravel()
+    return np.concatenate([color_histogram(img), pixels, hog]).astype(np.float32)
+
+
+def extract_image(source):
+    """
+    :param source: Path of an image, or tuple (name, bytes). The image ID is the name without extension.
+    :return: (image ID, vector), the vector is None when the image can not be decoded.
+    """
+    name = source[0] if isinstance(source, tuple) else os.path.basename(source)
+    image_id = os.path.splitext(name)[0]
+    try:
+        name, buf = read(source)
+        img = decode(buf, WIDTH)
+        if img is None:
+            return image_id, None
+        return image_id, extract(img)
+    except Exception:
+        return image_id, None
+
+
+class FeatureStore(object):
+    """
+    Feature vectors on disk, one row per image ID, read as a memory mapped matrix. New images only append rows,
+    the images already extracted are never decoded again.
+        features.f32  rows of 'dim' float32 values.
+        ids.txt       one image ID per line, the line number is the row.
+    """
+    def __init__(self, folder, dim=DIM):
+        """
+        :param folder: Folder of the store, created when it does not exist.
+        :param dim: Length of the vectors.
+        """
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        self.folder = folder
+        self.data_path = os.path.join(folder, 'features.f32')
+        self.ids_path = os.path.join(folder, 'ids.txt')
+        meta_path = os.path.join(folder, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                dim = json.load(f)['dim']
+        else:
+            with open(meta_path, 'w') as f:
+                json.dump({'dim': dim}, f)
+        self.dim = dim
+        self.image_ids = []
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path) as f:
+                self.image_ids = [line.strip() for line in f if line.strip()]
+        # Rows are written before their IDs, a crash can only leave rows without ID (or half a row), they are removed.
+        size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        rows = min(size // (4 * dim), len(self.image_ids))
+        if rows != len(self.image_ids):
+            self.image_ids = self.image_ids[:rows]
+            with open(self.ids_path, 'w') as f:
+                f.writelines('{}\n'.format(image_id) for image_id in self.image_ids)
+        if size != rows * 4 * dim:
+            with open(self.data_path, 'r+b') as f:
+                f.truncate(rows * 4 * dim)
+        self.index = dict((image_id, row) for row, image_id in enumerate(self.image_ids))
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def __contains__(self, image_id):
+        return str(image_id) in self.index
+
+    def missing(self, image_ids):
+        """
+        :param image_ids: IDs of images.
+        :return: List of the IDs not in the store.
+        """
+        return [i for i in image_ids if str(i) not in self.index]
+
+    def append(self, image_ids, rows):
+        """
+        :param image_ids: IDs of the new images.
+        :param rows: Numpy array, one row of 'dim' values per image.
+        """
+        rows = np.ascontiguousarray(rows, dtype=np.float32).reshape(len(image_ids), self.dim)
+        with open(self.data_path, 'ab') as f:
+            f.write(rows.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.ids_path, 'a') as f:
+            for image_id in image_ids:
+                f.write('{}\n'.format(image_id))
+        for image_id in image_ids:
+            self.index[str(image_id)] = len(self.image_ids)
+            self.image_ids.append(str(image_id))
+
+    def matrix(self):
+        """
+        :return: Memory mapped matrix (images x dim), read only. It can be given to Net as it is.
+        """
+        if not self.image_ids:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(self.data_path, dtype=np.float32, mode='r', shape=(len(self.image_ids), self.dim))
+
+    def rows(self, image_ids):
+        """
+        :param image_ids: IDs of images in the store.
+        :return: Numpy array with their rows, in the same order.
+        """
+        return self.matrix()[[self.index[str(i)] for i in image_ids]]
+
+
+def extract_folder(folder, store, processes=None, chunksize=16, batch=1000):
+    """
+    Extract the features of the images of a folder not in the store yet, with a pool of processes.
+    :param folder: Folder with the images downloaded, the image ID is the file name without extension.
+    :param store: FeatureStore.
+    :param processes: Number of processes. None, one per core.
+    :param chunksize: Images sent to a process at once.
+    :param batch: Rows appended to the store at once.
+    :return: Dict with the speed of the run and the images that failed.
+    """
+    names = [f for f in sorted(os.listdir(folder)) if os.path.splitext(f)[0] not in store]
+    start = time.time()
+    ids, rows, failed = [], [], []
+    pool = Pool(processes=processes)
+    try:
+        sources = (os.path.join(folder, name) for name in names)
+        for image_id, vector in pool.imap(extract_image, sources, chunksize=chunksize):
+            if vector is None:
+                failed.append(image_id)
+                continue
+            ids.append(image_id)
+            rows.append(vector)
+            if len(ids) >= batch:
+                store.append(ids, np.vstack(rows))
+                ids, rows = [], []
+        if ids:
+            store.append(ids, np.vstack(rows))
+    finally:
+        pool.close()
+        pool.join()
+    seconds = time.time() - start
+    ok = len(names) - len(failed)
+    return {'ok': ok, 'failed': failed, 'seconds': seconds, 'images_per_sec': ok / seconds if seconds > 0 else 0.0}
@@ -20,13 +20,11 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
-from IPython.display import SVG
-from keras.layers.convolutional import Convolution2D, MaxPooling2D
-from keras.layers.core import Activation, Flatten, Dense, Dropout
-from keras.models import Sequential
-from keras.utils.visualize_util import model_to_dot
-from keras.utils.visualize_util import plot
-from keras.optimizers import SGD, Adagrad, Adadelta, Adam
+import os
+
+
+MODELS = {}     # folder -> model, every process loads a saved model only once.
+
 
 class NN:
     def __init__(self):
@@ -42,6 +40,11 @@ class NN:
         :param weights_path: URL of an already trained model.
         :return: a train model.
         """
+        from keras.layers.convolutional import Convolution2D, MaxPooling2D
+        from keras.layers.core import Activation, Flatten, Dense, Dropout
+        from keras.models import Sequential
+        from keras.optimizers import SGD
+
         # initialize the model..
         model = Sequential()
 
@@ -72,10 +75,6 @@ class NN:
         if weights_path is not None:
             model.load_weights(weights_path)
 
-        SVG(model_to_dot(model).create(prog='dot', format='svg'))
-        plot(model, to_file='/home/rainer85ah/Desktop/source/model.jpg', show_shapes=False, show_layer_names=True)
-        print("Check.. '/home/rainer85ah/Desktop/source/model.jpg' file.")
-
         """
         In my own experience, Adagrad / Adadelta are "safer" because they don't depend so strongly on setting of
         learning rates(with Adadelta being slightly better), but well - tuned SGD + Momentum almost always
@@ -89,3 +88,48 @@ class NN:
         model.compile(loss='categorical_crossentropy', optimizer=sgd, metrics=['accuracy'])
 
         return model
+
+    @staticmethod
+    def plot(model, to_file='model.png', show_shapes=False):
+        """
+        Draw the model to an image. It needs graphviz and pydot, so it is never called by build.
+        :param model: Model of NN.build
+        :param to_file: Image file.
+        :param show_shapes: Draw the shapes of the layers.
+        :return: Path of the image.
+        """
+        from keras.utils.visualize_util import plot
+        plot(model, to_file=to_file, show_shapes=show_shapes, show_layer_names=True)
+        return to_file
+
+    @staticmethod
+    def save(model, folder):
+        """
+        Save the architecture and the weights, ready to be loaded by the workers with NN.load
+        :param model: Model of NN.build, already trained.
+        :param folder: Folder for architecture.json and weights.h5
+        :return: folder
+        """
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        with open(os.path.join(folder, 'architecture.json'), 'w') as f:
+            f.write(model.to_json())
+        model.save_weights(os.path.join(folder, 'weights.h5'), overwrite=True)
+        return folder
+
+    @staticmethod
+    def load(folder):
+        """
+        Load a model saved with NN.save, only the first time it is asked in the process. The model is not compiled,
+        it is ready to predict, not to train.
+        :param folder: Folder of NN.save
+        :return: Model.
+        """
+        model = MODELS.get(folder)
+        if model is None:
+            from keras.models import model_from_json
+            with open(os.path.join(folder, 'architecture.json')) as f:
+                model = model_from_json(f.read())
+            model.load_weights(os.path.join(folder, 'weights.h5'))
+            MODELS[folder] = model
+        return model
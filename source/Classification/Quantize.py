@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import os
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+""" Reduced precision copy of a trained NN model, run with NumPy on CPU, without Keras.
+    float32: the weights as they are.
+    float16: weights saved in half precision, half of the size.
+    int8:    weights saved as int8 with one scale per output channel, a quarter of the size.
+    The weights are expanded to float32 when the model is loaded, so all the precisions use the same BLAS
+    matrix products: only the files are smaller, the memory and the speed of a loaded model are the ones of float32.
+    The gain in speed on CPU comes from running without Keras.
+"""
+PRECISIONS = ['float32', 'float16', 'int8']
+
+
+def quantize(w, precision):
+    """
+    :param w: Numpy array of weights, the output channel is the first axis.
+    :param precision: 'float32', 'float16' or 'int8'.
+    :return: (weights, scale), scale is None except for int8.
+    """
+    if precision == 'float32':
+        return w.astype(np.float32), None
+    if precision == 'float16':
+        return w.astype(np.float16), None
+    if precision == 'int8':
+        scale = np.abs(w.reshape(w.shape[0], -1)).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        q = np.round(w / scale.reshape((-1,) + (1,) * (w.ndim - 1)))
+        return np.clip(q, -127, 127).astype(np.int8), scale.astype(np.float32)
+    raise ValueError('Unknown precision {}'.format(precision))
+
+
+def dequantize(w, scale):
+    w = w.astype(np.float32)
+    if scale is not None:
+        w *= scale.reshape((-1,) + (1,) * (w.ndim - 1))
+    return w
+
+
+def export(model, path, precision='float16'):
+    """
+    Save a trained model of NN.build with reduced precision weights.
+    :param model: Keras model.
+    :param path: File, '.npz'
+    :param precision: 'float32', 'float16' or 'int8'.
+    :return: path
+    """
+    from keras import backend
+    flip = backend.backend() == 'theano'    # Theano convolves, it flips the kernels. TensorFlow correlates.
+    arrays = {}
+    ops = []
+    for i, layer in enumerate(model.layers):
+        kind = layer.__class__.__name__
+        if kind == 'Convolution2D':
+            w, b = layer.get_weights()
+            ordering = getattr(layer, 'dim_ordering', 'th')
+            if ordering == 'tf':
+                w = w.transpose(3, 2, 0, 1)     # (rows, cols, stack, filters) -> (filters, stack, rows, cols)
+            if flip:
+                w = w[:, :, ::-1, ::-1]
+            ops.append('conv:{}:{}'.format(layer.border_mode, ordering))
+        elif kind == 'Dense':
+            w, b = layer.get_weights()
+            w = w.T                             # (in, out) -> (out, in), the output channel first.
+            ops.append('dense')
+        elif kind == 'Activation':
+            ops.append(layer.activation.__name__)
+            continue
+        elif kind == 'MaxPooling2D':
+            ops.append('pool:{}:{}'.format(layer.pool_size[0], getattr(layer, 'dim_ordering', 'th')))
+            continue
+        elif kind == 'Flatten':
+            ops.append('flatten')
+            continue
+        elif kind == 'Dropout':
+            continue
+        else:
+            raise ValueError('Layer {} is not supported'.format(kind))
+        q, scale = quantize(w, precision)
+        arrays['w{}'.format(len(ops) - 1)] = q
+        arrays['b{}'.format(len(ops) - 1)] = b.astype(np.float32)
+        if scale is not None:
+            arrays['s{}'.format(len(ops) - 1)] = scale
+    np.savez(path, ops=np.array(ops), precision=np.array(precision), **arrays)
+    return path
+
+
+class CpuModel(object):
+    """
+    Model exported with export, predict with NumPy only. The weights are kept in float32, whatever the precision
+    of the file.
+    """
+    def __init__(self, path):
+        """
+        :param path: File of export.
+        """
+        with np.load(path) as data:
+            self.ops = [str(op) for op in data['ops']]
+            self.precision = str(data['precision'])
+            self.weights = {}
+            for i in range(len(self.ops)):
+                if 'w{}'.format(i) in data.files:
+                    scale = data['s{}'.format(i)] if 's{}'.format(i) in data.files else None
+                    self.weights[i] = (dequantize(data['w{}'.format(i)], scale), data['b{}'.format(i)])
+        self.ordering = 'th'
+        for op in self.ops:
+            if op.startswith('conv') or op.startswith('pool'):
+                self.ordering = op.split(':')[2]
+                break
+
+    @staticmethod
+    def conv(x, w, b, border_mode):
+        """
+        :param x: Numpy array (N, C, H, W).
+        :param w: Numpy array (F, C, kh, kw).
+        :return: Numpy array (N, F, H', W'), correlation of x and w plus b.
+        """
+        kh, kw = w.shape[2:]
+        if border_mode == 'same':
+            x = np.pad(x, ((0, 0), (0, 0), (kh // 2, (kh - 1) // 2), (kw // 2, (kw - 1) // 2)), mode='constant')
+        windows = sliding_window_view(x, (kh, kw), axis=(2, 3))          # (N, C, H', W', kh, kw)
+        n, c, h, wd = windows.shape[:4]
+        cols = windows.transpose(0, 2, 3, 1, 4, 5).reshape(n * h * wd, c * kh * kw)
+        out = cols.dot(w.reshape(w.shape[0], -1).T) + b
+        return out.reshape(n, h, wd, -1).transpose(0, 3, 1, 2)
+
+    @staticmethod
+    def pool(x, size):
+        n, c, h, w = x.shape
+        h, w = h - h % size, w - w % size
+        return x[:, :, :h, :w].reshape(n, c, h // size, size, w // size, size).max(axis=(3, 5))
+
+    def predict(self, x, batch_size=64):
+        """
+        :param x: Numpy array, the same input of the Keras model.
+        :param batch_size: Images per step.
+        :return: Numpy array of probabilities (N, classes).
+        """
+        x = np.asarray(x, dtype=np.float32)
+        if self.ordering == 'tf':
+            x = x.transpose(0, 3, 1, 2)
+        out = []
+        for first in range(0, len(x), batch_size):
+            out.append(self.predict_batch(x[first:first + batch_size]))
+        return np.concatenate(out)
+
+    def predict_batch(self, x):
+        for i, op in enumerate(self.ops):
+            name = op.split(':')
+            if name[0] == 'conv':
+                w, b = self.weights[i]
+                x = CpuModel.conv(x, w, b, name[1])
+            elif name[0] == 'pool':
+                x = CpuModel.pool(x, int(name[1]))
+            elif name[0] == 'relu':
+                x = np.maximum(x, 0)
+            elif name[0] == 'flatten':
+                if self.ordering == 'tf':
+                    x = x.transpose(0, 2, 3, 1)
+                x = x.reshape(len(x), -1)
+            elif name[0] == 'dense':
+                w, b = self.weights[i]
+                x = x.dot(w.T) + b
+            elif name[0] == 'softmax':
+                x = np.exp(x - x.max(axis=1, keepdims=True))
+                x /= x.sum(axis=1, keepdims=True)
+            elif name[0] != 'linear':
+                raise ValueError('Operation {} is not supported'.format(op))
+        return x
+
+    def predict_on_batch(self, x):
+        return self.predict(x)
+
+
+def compare(model, x_test, y_test, folder, precisions=PRECISIONS, batch_size=64):
+    """
+    Accuracy vs speed of the Keras model and its reduced precision copies on a held-out set.
+    :param model: Keras model, already trained.
+    :param x_test: Numpy array of images.
+    :param y_test: Integer labels, or one hot labels.
+    :param folder: Folder for the exported files.
+    :param precisions: Precisions to compare.
+    :param batch_size: Images per step.
+    :return: List of dicts: name, accuracy, agreement with Keras, seconds, images_per_sec and size in bytes.
+    """
+    y_test = np.asarray(y_test)
+    if y_test.ndim == 2:
+        y_test = y_test.argmax(axis=1)
+
+    def row(name, predict, size):
+        start = time.time()
+        prob = predict(x_test)
+        seconds = time.time() - start
+        labels = prob.argmax(axis=1)
+        return labels, {'name': name, 'accuracy': float((labels == y_test).mean()), 'seconds': seconds,
+                        'images_per_sec': len(x_test) / seconds if seconds > 0 else 0.0, 'size': size}
+
+    size = sum(w.nbytes for w in model.get_weights())
+    reference, keras_row = row('keras', lambda x: model.predict(x, batch_size=batch_size), size)
+    keras_row['agreement'] = 1.0
+    report = [keras_row]
+    for precision in precisions:
+        path = export(model, os.path.join(folder, 'model_{}.npz'.format(precision)), precision)
+        cpu = CpuModel(path)
+        labels, r = row(precision, lambda x: cpu.predict(x, batch_size=batch_size), os.path.getsize(path))
+        r['agreement'] = float((labels == reference).mean())
+        report.append(r)
+    return report
@@ -22,70 +22,347 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-from sklearn.metrics import accuracy_score, roc_curve
-from sklearn.linear_model import LogisticRegression
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.svm import SVC
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier, AdaBoostClassifier, GradientBoostingClassifier
-from sklearn.naive_bayes import GaussianNB
-from sklearn.lda import LDA
-from sklearn.qda import QDA
-from sklearn.decomposition.pca import PCA
+import os
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+import multiprocessing
+
 import numpy as np
-import pandas as pd
-from ggplot import *
+
+
+# Classifiers that only work with dense matrices, the others receive sparse matrices as they are. By name, so
+# sklearn is only imported when a Net is created.
+NEEDS_DENSE = ('GaussianNB', 'LinearDiscriminantAnalysis', 'QuadraticDiscriminantAnalysis')
+
+# A fork of a process with threads running (OpenMP of numpy/sklearn, OpenCV) can hang the child on a lock taken at
+# the time of the fork. The classifiers are started from a fork server, a clean process, where it exists.
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+
+
+def dense(x):
+    """
+    :param x: Sparse matrix, Numpy array or memmap.
+    :return: Dense array. Numpy arrays and memmaps are returned as they are, without a copy.
+    """
+    return x.toarray() if hasattr(x, 'toarray') else np.asarray(x)
+
+
+def _npy_file(x):
+    """
+    :return: Path of the .npy file when x is the whole array of it memory mapped, e.g. np.load(path, mmap_mode='r').
+             None otherwise.
+    """
+    filename = getattr(x, 'filename', None)
+    if not isinstance(x, np.memmap) or not filename or not filename.endswith('.npy'):
+        return None
+    try:
+        on_disk = np.load(filename, mmap_mode='r')
+    except (IOError, OSError, ValueError):
+        return None
+    if on_disk.offset != x.offset or on_disk.shape != x.shape or on_disk.dtype != x.dtype or \
+            on_disk.strides != x.strides:
+        return None
+    return filename
+
+
+def _save_matrix(folder, name, x):
+    """
+    Save a matrix to be memory mapped by other processes. Sparse matrices are saved as their 3 CSR arrays. A matrix
+    already memory mapped from a .npy file is not copied, only its path is saved.
+    """
+    path = _npy_file(x)
+    if path is not None:
+        with open(os.path.join(folder, name + '.path'), 'w') as f:
+            f.write(path)
+    elif hasattr(x, 'tocsr'):
+        x = x.tocsr()
+        np.save(os.path.join(folder, name + '.data.npy'), x.data)
+        np.save(os.path.join(folder, name + '.indices.npy'), x.indices)
+        np.save(os.path.join(folder, name + '.indptr.npy'), x.indptr)
+        np.save(os.path.join(folder, name + '.shape.npy'), np.asarray(x.shape))
+    else:
+        np.save(os.path.join(folder, name + '.npy'), np.asarray(x))
+
+
+def _load_matrix(folder, name):
+    """
+    :return: Memory mapped matrix saved with _save_matrix.
+    """
+    import scipy.sparse as sp
+    path = os.path.join(folder, name + '.path')
+    if os.path.exists(path):
+        with open(path) as f:
+            return np.load(f.read(), mmap_mode='r')
+    path = os.path.join(folder, name + '.npy')
+    if os.path.exists(path):
+        return np.load(path, mmap_mode='r')
+    arrays = [np.load(os.path.join(folder, '{}.{}.npy'.format(name, part)), mmap_mode='r')
+              for part in ('data', 'indices', 'indptr')]
+    shape = tuple(np.load(os.path.join(folder, name + '.shape.npy')))
+    return sp.csr_matrix(tuple(arrays), shape=shape, copy=False)
+
+
+def _row(clf, error=None):
+    """
+    :return: Row of the leaderboard of a classifier, empty.
+    """
+    return {'name': clf.__class__.__name__, 'fit_time': None, 'predict_time': None, 'accuracy': None, 'auc': None,
+            'error': error, 'peak_memory': None}
+
+
+def _score(clf, x_train, y_train, x_test, y_test):
+    """
+    Fit and score one classifier. The same for fit_train_clf_pred_prob and for the processes of fit_parallel.
+    :param clf: Classifier not fitted.
+    :return: (row of the leaderboard, fitted classifier, predictions, probabilities). The probabilities are the
+             decision_function when the classifier has no predict_proba, None when it has none of them. When the
+             classifier fails the row has the error and the rest is None.
+    """
+    from sklearn.metrics import accuracy_score, roc_auc_score
+    row = _row(clf)
+    try:
+        start = time.time()
+        fit = clf.fit(x_train, y_train)
+        row['fit_time'] = time.time() - start
+
+        start = time.time()
+        pred = fit.predict(x_test)
+        row['predict_time'] = time.time() - start
+        row['accuracy'] = accuracy_score(pred, y_test)
+
+        prob = None
+        if hasattr(fit, 'predict_proba'):
+            try:
+                prob = fit.predict_proba(x_test)[:, 1]
+            except Exception:
+                prob = None
+        if prob is None and hasattr(fit, 'decision_function'):
+            prob = fit.decision_function(x_test)
+        if prob is not None:
+            try:
+                row['auc'] = roc_auc_score(y_test, prob)
+            except ValueError:
+                pass
+        return row, fit, pred, prob
+    except Exception as e:
+        row['error'] = str(e)
+        return row, None, None, None
+
+
+STARTED = 'started'     # Sent by _evaluate when the data is loaded, the timeout of the classifier starts there.
+
+
+def _evaluate(clf, folder, conn):
+    """
+    Fit and score one classifier in its own process. The data is read from memory mapped files, not copied.
+    :param clf: Classifier not fitted.
+    :param folder: Folder with X_train, X_test (see _save_matrix), y_train.npy and y_test.npy
+    :param conn: Pipe to send STARTED, and then (row of the leaderboard, fitted classifier, predictions,
+                 probabilities). The peak_memory of the row is the growth of the process over its memory at the
+                 start: ru_maxrss also counts the memory of the parent copied by the fork.
+    """
+    import sklearn.metrics     # Imported before STARTED, the import is not counted in the timeout.
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        x_train = _load_matrix(folder, 'X_train')
+        x_test = _load_matrix(folder, 'X_test')
+        if clf.__class__.__name__ in NEEDS_DENSE:
+            x_train, x_test = dense(x_train), dense(x_test)
+        y_train = np.load(os.path.join(folder, 'y_train.npy'), mmap_mode='r')
+        y_test = np.load(os.path.join(folder, 'y_test.npy'), mmap_mode='r')
+        conn.send(STARTED)
+        row, fit, pred, prob = _score(clf, x_train, y_train, x_test, y_test)
+        if fit is not None:
+            row['peak_memory'] = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base) * 1024
+        conn.send((row, fit, pred, prob))
+    except Exception as e:
+        conn.send((_row(clf, str(e)), None, None, None))
+    finally:
+        conn.close()
 
 
 class Net:
     def __init__(self, x_train, x_test):
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.neighbors import KNeighborsClassifier
+        from sklearn.svm import SVC
+        from sklearn.tree import DecisionTreeClassifier
+        from sklearn.ensemble import RandomForestClassifier, AdaBoostClassifier, GradientBoostingClassifier
+        from sklearn.naive_bayes import GaussianNB
+        from sklearn.discriminant_analysis import LinearDiscriminantAnalysis, QuadraticDiscriminantAnalysis
         self.classifiers = [SVC(),
                             SVC(C=1.0, kernel='linear', degree=2, gamma='auto', coef0=0.015, shrinking=True,
                                 probability=False, tol=0.001, cache_size=512, class_weight=None, verbose=False,
-                                max_iter=-1, decision_function_shape=None, random_state=None), SVC(gamma=2, C=1),
+                                max_iter=-1, decision_function_shape='ovr', random_state=None), SVC(gamma=2, C=1),
                             DecisionTreeClassifier(criterion="entropy"),
                             RandomForestClassifier(max_depth=5, n_estimators=10, max_features=1),
                             GradientBoostingClassifier(),
                             AdaBoostClassifier(),
                             GaussianNB(),
-                            LDA(), QDA(),
+                            LinearDiscriminantAnalysis(), QuadraticDiscriminantAnalysis(),
                             LogisticRegression(), KNeighborsClassifier(5)
                            ]
 
+        # The matrices are kept as they are given: sparse, memmap, float32... The dense copies are only made when a
+        # classifier needs them, and only once.
         self.X_train = x_train
         self.X_test = x_test
-        self.X_train_dense = np.asarray(x_train)
-        self.X_test_dense = np.asarray(x_test)
+        self.dense_cache = {}
+        self.peak_memory = None
+        self.leaderboard = None
         self.clf_array = []
         self.pred_array = []
         self.prob_array = []
         self.accuracy_array = []
 
-    @staticmethod
-    def fit_train_clf_pred_prob(self, y_train, y_test):
+    @property
+    def X_train_dense(self):
+        if 'train' not in self.dense_cache:
+            self.dense_cache['train'] = dense(self.X_train)
+        return self.dense_cache['train']
 
-        for clf in self.classifiers:
-            try:
-                print('Clf Fit, Predict and Probability')
-                # fit = PCA.fit_transform(self.X_train, Y_train)
-                fit = clf.fit(self.X_train, y_train)
-                pred = fit.predict(self.X_test)
-                prob = fit.predict_proba(self.X_test)[:, 1]
-            except Exception:
-                # fit = PCA.fit_transform(self.X_train_dense, Y_train)
-                fit = clf.fit(self.X_train_dense, y_train)
-                pred = fit.predict(self.X_test_dense)
-                prob = fit.predict_proba(self.X_test_dense)[:, 1]
+    @property
+    def X_test_dense(self):
+        if 'test' not in self.dense_cache:
+            self.dense_cache['test'] = dense(self.X_test)
+        return self.dense_cache['test']
 
-            self.clf_array.append(clf)
-            self.pred_array.append(pred)
-            self.prob_array.append(prob)
-            self.accuracy_array.append(accuracy_score(pred, y_test))
+    @staticmethod
+    def fit_train_clf_pred_prob(self, y_train, y_test, trace_memory=False):
+        """
+        Fit and score all the classifiers one after the other, in this process. The same scores of fit_parallel.
+        :param self: Net object.
+        :param y_train: Labels of X_train.
+        :param y_test: Labels of X_test.
+        :param trace_memory: Keep the peak of the memory allocated by Python in peak_memory, in bytes. tracemalloc
+                             makes every allocation slower, so it is off by default.
+        :return: self. The leaderboard, like fit_parallel and without peak_memory, is in self.leaderboard: a
+                 classifier that fails has its error there. The fitted ones are in clf_array.
+        """
+        tracing = tracemalloc.is_tracing()
+        if trace_memory:
+            if not tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        leaderboard = []
+        for index, clf in enumerate(self.classifiers):
+            x_train, x_test = self.X_train, self.X_test
+            if clf.__class__.__name__ in NEEDS_DENSE:
+                x_train, x_test = self.X_train_dense, self.X_test_dense
+            row, fit, pred, prob = _score(clf, x_train, y_train, x_test, y_test)
+            row['index'] = index
+            leaderboard.append(row)
+            if fit is not None:
+                self.clf_array.append(fit)
+                self.pred_array.append(pred)
+                self.prob_array.append(prob)
+                self.accuracy_array.append(row['accuracy'])
+        leaderboard.sort(key=lambda r: -1 if r['accuracy'] is None else r['accuracy'], reverse=True)
+        self.leaderboard = leaderboard
 
+        if trace_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            if not tracing:
+                tracemalloc.stop()
+            print('Peak memory: {:.1f} MB'.format(self.peak_memory / 1048576.0))
         return self
 
+    @staticmethod
+    def fit_parallel(self, y_train, y_test, processes=None, timeout=600, startup=120):
+        """
+        Fit and score all the classifiers at the same time, each one in its own process. The matrices are saved
+        once to disk and memory mapped by every process, instead of a pickled copy per process.
+        :param self: Net object.
+        :param y_train: Labels of X_train.
+        :param y_test: Labels of X_test.
+        :param processes: Max classifiers running at the same time. None, one per core.
+        :param timeout: Max seconds for one classifier to fit and score, counted when its process has loaded the
+                        data. It is stopped after that.
+        :param startup: Max seconds for a process to start and load the data.
+        :return: Leaderboard, list of dicts with name, fit_time, predict_time, accuracy, auc, error and the
+                 peak_memory, bytes its process grew to fit and score, the best accuracy first. The fitted
+                 classifiers are in clf_array, like fit_train_clf_pred_prob.
+        """
+        processes = processes or os.cpu_count() or 1
+        context = multiprocessing.get_context(START_METHOD)
+        folder = tempfile.mkdtemp()
+        try:
+            _save_matrix(folder, 'X_train', self.X_train)
+            _save_matrix(folder, 'X_test', self.X_test)
+            np.save(os.path.join(folder, 'y_train.npy'), np.asarray(y_train))
+            np.save(os.path.join(folder, 'y_test.npy'), np.asarray(y_test))
+
+            pending = list(enumerate(self.classifiers))
+            running = {}     # index -> (process, pipe, time of the start, time of STARTED or None)
+            results = {}
+            while pending or running:
+                while pending and len(running) < processes:
+                    index, clf = pending.pop(0)
+                    parent, child = context.Pipe(duplex=False)
+                    process = context.Process(target=_evaluate, args=(clf, folder, child))
+                    process.daemon = True
+                    process.start()
+                    child.close()
+                    running[index] = (process, parent, time.time(), None)
+
+                for index, (process, parent, start, started) in list(running.items()):
+                    # is_alive before the poll: the result sent just before the end of the process is read.
+                    ended = not process.is_alive()
+                    message = None
+                    try:
+                        while message is None and parent.poll():
+                            message = parent.recv()
+                            if message == STARTED:
+                                started = time.time()
+                                running[index] = (process, parent, start, started)
+                                message = None
+                    except EOFError:
+                        ended = True
+                    clf = self.classifiers[index]
+                    if message is not None:
+                        results[index] = message
+                    elif ended:
+                        error = 'Process died with exit code {}'.format(process.exitcode)
+                        results[index] = (_row(clf, error), None, None, None)
+                    elif started is not None and time.time() - started > timeout:
+                        process.terminate()
+                        error = 'Timeout after {} seconds'.format(timeout)
+                        results[index] = (_row(clf, error), None, None, None)
+                    elif started is None and time.time() - start > startup:
+                        process.terminate()
+                        error = 'Not started after {} seconds'.format(startup)
+                        results[index] = (_row(clf, error), None, None, None)
+                    else:
+                        continue
+                    process.join()
+                    parent.close()
+                    del running[index]
+                time.sleep(0.05)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+        leaderboard = []
+        for index in sorted(results):
+            row, fit, pred, prob = results[index]
+            row['index'] = index
+            leaderboard.append(row)
+            if fit is not None:
+                self.clf_array.append(fit)
+                self.pred_array.append(pred)
+                self.prob_array.append(prob)
+                self.accuracy_array.append(row['accuracy'])
+        leaderboard.sort(key=lambda r: -1 if r['accuracy'] is None else r['accuracy'], reverse=True)
+        self.leaderboard = leaderboard
+        return leaderboard
+
     @staticmethod
     def show_results(self, y_test):
+        from sklearn.metrics import roc_curve
+        import pandas as pd
+        from ggplot import ggplot, aes, geom_line, geom_abline, ggtitle
         for i, e in enumerate(self.clf_array):
             print('Predict of ' + e.__class__.__name__ + ' is ' + str(self.pred_array[i]))
             print( 'Probability of ' + e.__class__.__name__ + ' is ' + str(self.prob_array[i]))
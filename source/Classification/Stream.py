@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import csv
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+
+import cv2
+import numpy as np
+
+from source.Processing.Thumbnail import decode, read
+
+
+STOP = object()     # End of the batches, when the generator does not loop.
+
+
+def load(source, width, height, depth=3):
+    """
+    Decode, resize and normalize an image for NN.build(width, height, depth, ...).
+    :param source: Path of an image, or tuple (name, bytes).
+    :param width: Width of the input of the model.
+    :param height: Height of the input of the model.
+    :param depth: 3 for color, 1 for gray scale.
+    :return: Numpy array float32 (depth, height, width) with values 0 - 1, None when it can not be decoded.
+    """
+    try:
+        name, buf = read(source)
+        img = decode(buf, width, gray=depth == 1)
+        if img is None:
+            return None
+        img = cv2.resize(img, dsize=(width, height), interpolation=cv2.INTER_AREA)
+        img = img.astype(np.float32) / 255.0
+        if depth == 1:
+            return img[np.newaxis, :, :]
+        return img.transpose(2, 0, 1)
+    except Exception:
+        return None
+
+
+class ImageBatchGenerator(object):
+    """
+    Batches of images ready for the NN model. The images are decoded by a pool of threads in background (OpenCV
+    does not hold the GIL), and up to 'prefetch' batches wait in a queue, so the model never waits for the disk.
+    It is a generator for model.fit_generator / model.predict_generator.
+    """
+    def __init__(self, sources, labels=None, classes=None, width=32, height=32, depth=3, batch_size=32, workers=4,
+                 prefetch=8, shuffle=True, loop=True):
+        """
+        :param sources: List of paths, or tuples (name, bytes).
+        :param labels: List of integer labels of the sources, None to predict.
+        :param classes: Number of classes, for the one hot labels.
+        :param width: Width of the input of the model.
+        :param height: Height of the input of the model.
+        :param depth: 3 for color, 1 for gray scale.
+        :param batch_size: Images per batch.
+        :param workers: Threads decoding images.
+        :param prefetch: Max batches ready in the queue.
+        :param shuffle: Shuffle the images every epoch.
+        :param loop: Start again after the last batch, Keras needs it to train more than one epoch.
+        """
+        self.sources = list(sources)
+        self.labels = None if labels is None else np.asarray(labels)
+        self.classes = classes if classes is not None or self.labels is None else int(self.labels.max()) + 1
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.loop = loop
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.queue = Queue(maxsize=prefetch)
+        self.stopping = threading.Event()
+        self.images = 0
+        self.start = None
+        self.error = None       # Exception of the feed thread, raised by next_batch after the last batch.
+        self.thread = threading.Thread(target=self.feed)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __len__(self):
+        return (len(self.sources) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        return self
+
+    def feed(self):
+        """
+        Thread that decodes the batches. STOP is always the last item of the queue, after an error too.
+        """
+        try:
+            order = list(range(len(self.sources)))
+            while not self.stopping.is_set():
+                if self.shuffle:
+                    random.shuffle(order)
+                batches = 0
+                for first in range(0, len(order), self.batch_size):
+                    if self.stopping.is_set():
+                        return
+                    index = order[first:first + self.batch_size]
+                    images = list(self.pool.map(lambda i: load(self.sources[i], self.width, self.height, self.depth),
+                                                index))
+                    ok = [i for i, img in zip(index, images) if img is not None]
+                    if not ok:
+                        continue
+                    x = np.stack([img for img in images if img is not None])
+                    y = None
+                    if self.labels is not None:
+                        y = np.zeros((len(ok), self.classes), dtype=np.float32)
+                        y[np.arange(len(ok)), self.labels[ok]] = 1.0
+                    self.queue.put((ok, x, y))
+                    batches += 1
+                if not self.loop:
+                    break
+                if not batches:
+                    # Looping again would never give a batch.
+                    raise ValueError('None of the {} images can be decoded'.format(len(self.sources)))
+        except Exception as e:
+            self.error = e
+        finally:
+            self.queue.put(STOP)
+
+    def next_batch(self):
+        """
+        :return: (index of the sources, X, Y), Y is None without labels. Images that can not be decoded are skipped.
+                 After the last batch, StopIteration, or the exception that stopped the feed thread.
+        """
+        if self.start is None:
+            self.start = time.time()
+        batch = self.queue.get()
+        if batch is STOP:
+            self.queue.put(STOP)
+            if self.error is not None:
+                raise self.error
+            raise StopIteration
+        self.images += len(batch[0])
+        return batch
+
+    def __next__(self):
+        index, x, y = self.next_batch()
+        return x if y is None else (x, y)
+
+    next = __next__
+
+    def images_per_sec(self):
+        """
+        :return: Images delivered per second since the first batch.
+        """
+        seconds = time.time() - self.start if self.start else 0.0
+        return self.images / seconds if seconds > 0 else 0.0
+
+    def close(self):
+        self.stopping.set()
+        while self.thread.is_alive():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.thread.join(0.1)
+        self.pool.shutdown()
+
+
+def predict_folder(model, folder, out_path, width=32, height=32, depth=3, batch_size=64, workers=4):
+    """
+    Tag all the images of a folder with the model, on CPU, and save the predictions.
+    :param model: Model of NN.build, already trained.
+    :param folder: Folder with the images, the image ID is the file name without extension.
+    :param out_path: CSV file, one row per image: image_id, class, probability.
+    :param width: Width of the input of the model.
+    :param height: Height of the input of the model.
+    :param depth: 3 for color, 1 for gray scale.
+    :param batch_size: Images per call to the model.
+    :param workers: Threads decoding images.
+    :return: Dict with the number of images tagged and the images/sec.
+    """
+    names = sorted(os.listdir(folder))
+    sources = [os.path.join(folder, name) for name in names]
+    generator = ImageBatchGenerator(sources, width=width, height=height, depth=depth, batch_size=batch_size,
+                                    workers=workers, shuffle=False, loop=False)
+    start = time.time()
+    images = 0
+    try:
+        with open(out_path, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(['image_id', 'class', 'probability'])
+            while True:
+                try:
+                    index, x, _ = generator.next_batch()
+                except StopIteration:
+                    break
+                prob = model.predict_on_batch(x)
+                labels = prob.argmax(axis=1)
+                for i, label, p in zip(index, labels, prob[np.arange(len(labels)), labels]):
+                    writer.writerow([os.path.splitext(names[i])[0], int(label), float(p)])
+                images += len(index)
+    finally:
+        generator.close()
+    seconds = time.time() - start
+    return {'images': images, 'failed': len(names) - images, 'seconds': seconds,
+            'images_per_sec': images / seconds if seconds > 0 else 0.0}
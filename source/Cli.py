@@ -0,0 +1,504 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+
+from source.Downloader import Downloader
+from source.Paginator import image_id
+
+
+""" Command line, no display needed. e.g.
+    python -m source.Cli search --address "20 Jay St, Brooklyn, NY 11211" --radius 300 --format json
+    python -m source.Cli index --aoi aoi.json --index east_village.npz
+    python -m source.Cli catalog --aoi aoi.json --catalog east_village/
+    python -m source.Cli search --index east_village.npz --aoi small_aoi.json --range "2017-01-17,2017-01-18"
+    python -m source.Cli download --aoi aoi.json --range "2017-01-17,2017-01-18" --out images/ --workers 16
+    python -m source.Cli download --aoi aoi.json --sample 10 --out images/
+    python -m source.Cli thumbnail --aoi aoi.json --out thumbnail/ --width 640 --dedup 6
+    python -m source.Cli thumbnail --source images/ --out thumbnail/ --processes 8
+    python -m source.Cli thumbnail --aoi aoi.json --out packed/ --packed
+    python -m source.Cli compact --store packed/
+    python -m source.Cli quality --source thumbnail/ --output quality.npz
+    python -m source.Cli detect --source thumbnail/ --cascade haarcascade_eye.xml --output boxes.csv
+    python -m source.Cli classify --source thumbnail/ --model model/ --output tags.csv
+    The API key is read from --key or the environment variable CARMERA_API_KEY.
+    The results are written to --output (default stdout), the speed of the run to stderr.
+"""
+
+ENV_KEY = 'CARMERA_API_KEY'
+
+
+def api_key(args):
+    """
+    :param args: Parsed arguments.
+    :return: API key of --key or the environment, exit when there is none.
+    """
+    key = args.key or os.environ.get(ENV_KEY)
+    if not key:
+        sys.exit('An API key is needed, use --key or the environment variable {}'.format(ENV_KEY))
+    return key
+
+
+def json_arg(value):
+    """
+    :param value: JSON text or the path of a JSON file.
+    :return: The value decoded.
+    """
+    if os.path.isfile(value):
+        with open(value) as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def search_options(args):
+    """
+    :param args: Parsed arguments.
+    :return: Dict with the search options given, the ones not given are left out.
+    """
+    options = {
+        'aoi': args.aoi,
+        'points': args.points,
+        'address': args.address,
+        'radius': args.radius,
+        'range': args.range,
+        'filter': args.filter,
+        'tags': args.tags,
+        'sort': args.sort,
+        'order': args.order,
+    }
+    return dict((k, v) for k, v in options.items() if v is not None)
+
+
+def scheduler(args):
+    """
+    :param args: Parsed arguments.
+    :return: Scheduler shared by the searches and the downloads of the command.
+    """
+    if getattr(args, 'scheduler', None) is None:
+        from source.Scheduler import Scheduler
+        args.scheduler = Scheduler(rate=args.rate or None, concurrency=args.concurrency, retries=args.retries)
+    return args.scheduler
+
+
+def search(args):
+    """
+    :param args: Parsed arguments.
+    :return: The image features of stream, only one every --sample meters of travel per camera when it is given.
+    """
+    if args.sample is None:
+        return stream(args)
+    from source.Sampling import sample
+    return sample(stream(args), meters=args.sample, min_speed=args.min_speed)
+
+
+def stream(args):
+    """
+    :param args: Parsed arguments.
+    :return: Generator of image features, all the pages are walked. An AOI search with --aoi, else an image search.
+    """
+    cache = None
+    if args.cache:
+        from source.Cache import Cache
+        cache = Cache(args.cache, search_ttl=args.cache_ttl)
+    options = search_options(args)
+    if 'aoi' in options:
+        from source.AOI import AOI
+        service = AOI(api_key(args), cache=cache, url=args.url, scheduler=scheduler(args))
+        return AOI.stream(service, options, limit=args.page_size, prefetch=not args.no_prefetch)
+    if 'points' not in options and 'address' not in options:
+        sys.exit('Search for images with --aoi, --points or --address')
+    from source.Image import Image
+    service = Image(api_key(args), cache=cache, url=args.url, scheduler=scheduler(args))
+    return Image.stream_images(service, options, limit=args.page_size, prefetch=not args.no_prefetch)
+
+
+def sources(folder):
+    """
+    :param folder: Folder of images, or a ThumbnailStore folder.
+    :return: Paths of the files of the folder, sorted. Tuples (name, bytes) for a store.
+    """
+    from source.Store import sources as folder_sources
+    return folder_sources(folder)
+
+
+def store(args):
+    """
+    :return: Context manager of the ThumbnailStore of --out with --packed, closed at the end of the command. Without
+             --packed the context is None.
+    """
+    if not args.packed:
+        return contextlib.nullcontext()
+    from source.Store import ThumbnailStore
+    return ThumbnailStore(args.out)
+
+
+def write(rows, columns, output=None, fmt='csv'):
+    """
+    Write the rows one at a time, so a long search is never kept in memory.
+    :param rows: Iterable of tuples, one value per column.
+    :param columns: Names of the columns.
+    :param output: File, None or '-' for stdout.
+    :param fmt: 'csv' or 'json', one JSON object per line.
+    :return: Number of rows written.
+    """
+    f = sys.stdout if output in (None, '-') else open(output, 'w', newline='')
+    count = 0
+    try:
+        writer = None
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(columns)
+        for row in rows:
+            if writer is None:
+                f.write(json.dumps(dict(zip(columns, row))) + '\n')
+            else:
+                writer.writerow(row)
+            count += 1
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return count
+
+
+def report(stats):
+    """
+    Print the speed of the run to stderr, stdout is left for the results.
+    :param stats: Dict.
+    """
+    sys.stderr.write(json.dumps(stats, sort_keys=True, default=str) + '\n')
+
+
+def batches(items, size):
+    """
+    :return: Generator of lists of 'size' items, the last one can be smaller.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def local_search(args):
+    """
+    Answer the search with a SpatialIndex file, no request to the API.
+    :return: Generator of rows (image_id, captured_on, lon, lat)
+    """
+    from source.Spatial import SpatialIndex, iso
+    index = SpatialIndex.load(args.index)
+    points = args.points
+    if args.aoi is not None or (points is not None and isinstance(points[0], list)):
+        ids = index.polygon(args.aoi or points, range=args.range)
+    elif points is not None:
+        if args.radius is None:
+            sys.exit('A local search around a point needs --radius')
+        ids = index.radius(points[0], points[1], args.radius, range=args.range)
+    elif args.range is not None:
+        ids = index.window(args.range)
+    else:
+        sys.exit('Search the index with --aoi, --points or --range')
+    for i in index.positions(ids):
+        yield (int(index.ids[i]), iso(index.captured[i]), float(index.lon[i]), float(index.lat[i]))
+
+
+def cmd_search(args):
+    if args.index:
+        count = write(local_search(args), ['image_id', 'captured_on', 'lon', 'lat'], args.output, args.format)
+        return {'images': count}
+
+    def rows():
+        for image in search(args):
+            properties = image.get('properties', {})
+            coordinates = (image.get('geometry') or {}).get('coordinates') or [None, None]
+            yield (image_id(image), properties.get('captured_on'), coordinates[0], coordinates[1])
+    count = write(rows(), ['image_id', 'captured_on', 'lon', 'lat'], args.output, args.format)
+    return {'images': count}
+
+
+def cmd_index(args):
+    from source.Spatial import SpatialIndex
+    index = SpatialIndex.from_features(search(args))
+    found = len(index)
+    if os.path.exists(args.index):
+        index = SpatialIndex.load(args.index).add(index)
+    index.save(args.index)
+    return {'images': found, 'indexed': len(index)}
+
+
+def cmd_catalog(args):
+    from source.Catalog import Catalog
+    catalog = Catalog.from_features(search(args))
+    found = len(catalog)
+    if os.path.isdir(args.catalog):
+        catalog = Catalog.load(args.catalog, mmap=False).add(catalog)
+    catalog.save(args.catalog)
+    return {'images': found, 'cataloged': len(catalog), 'bytes': catalog.nbytes}
+
+
+def cmd_download(args):
+    if args.sync:
+        if args.aoi is None:
+            sys.exit('--sync needs an AOI search, use --aoi')
+        # The watermark of the sync needs the oldest images first.
+        args.sort, args.order = args.sort or 'captured_on', args.order or 'ASC'
+    downloader = Downloader(api_key(args), url=args.url or Downloader.URL, workers=args.workers,
+                            per_host=args.per_host, timeout=args.timeout, scheduler=scheduler(args))
+    images = search(args)
+    if args.sync:
+        from source.Sync import Sync
+        sync = Sync(args.sync)
+        try:
+            sync.run(Sync.aoi_key(args.aoi), images, downloader, args.out, batch=args.batch, width=args.width)
+        finally:
+            sync.close()
+    else:
+        seen = set()
+        ids = (i for i in (image_id(image) for image in images) if not (i in seen or seen.add(i)))
+        for batch in batches(ids, args.batch):
+            downloader.download_all(batch, args.out, width=args.width)
+    stats = dict(downloader.stats)
+    stats['scheduler'] = scheduler(args).metrics()
+    return stats
+
+
+def cmd_thumbnail(args):
+    if args.source:
+        from source.Processing.Thumbnail import thumbnails
+        with store(args) as packed:
+            results, stats = thumbnails(sources(args.source), args.out, width=args.width, quality=args.quality,
+                                        processes=args.processes, chunksize=args.chunksize, store=packed)
+        for name, error in results:
+            if error is not None:
+                sys.stderr.write('{} failed: {}\n'.format(name, error))
+        return stats
+
+    from source.Pipeline import Pipeline
+    notifier = None
+    ping = None
+    if args.no_ping:
+        ping = lambda image_id: None
+    elif args.ping_url or args.outbox:
+        from source.Notifier import Notifier
+        notifier = Notifier(url=args.ping_url or Notifier.URL, outbox=args.outbox, workers=args.ping_workers).start()
+        ping = notifier.notify
+    dedup = None
+    if args.dedup is not None:
+        from source.Processing.Duplicates import Deduplicator
+        dedup = Deduplicator(radius=args.dedup)
+    downloader = Downloader(api_key(args), url=args.url or Downloader.URL, workers=args.workers,
+                            per_host=args.per_host, timeout=args.timeout, scheduler=scheduler(args))
+    with store(args) as packed:
+        pipeline = Pipeline(downloader, args.out, width=args.width, ping=ping, download_workers=args.workers,
+                            thumbnail_workers=args.thumbnail_workers, ping_workers=args.ping_workers,
+                            queue_size=args.queue_size, quality=args.quality, dedup=dedup, store=packed)
+        metrics = pipeline.run(search(args))
+    if notifier is not None:
+        notifier.close()
+        metrics['notifier'] = dict(notifier.stats)
+    for stage, image, error in pipeline.errors:
+        sys.stderr.write('{} {} failed: {}\n'.format(stage, image, error))
+    metrics['scheduler'] = scheduler(args).metrics()
+    return metrics
+
+
+def cmd_compact(args):
+    from source.Store import ThumbnailStore
+    with ThumbnailStore(args.store) as packed:
+        return packed.compact()
+
+
+def cmd_quality(args):
+    from source.Processing import Quality
+    columns, stats = Quality.score_batch(args.source, width=args.width, processes=args.processes,
+                                         chunksize=args.chunksize)
+    for name, error in zip(columns['name'].tolist(), columns['error'].tolist()):
+        if error:
+            sys.stderr.write('{} failed: {}\n'.format(name, error))
+    if args.output and args.output.endswith('.npz'):
+        Quality.save(args.output, columns)
+    else:
+        rows = zip(columns['name'].tolist(), *[columns[c].tolist() for c in Quality.COLUMNS])
+        write(rows, ['name'] + Quality.COLUMNS, args.output, args.format)
+    return stats
+
+
+def cmd_detect(args):
+    from source.Processing.Detection import detect_batch
+    results, stats = detect_batch(args.source, args.cascade, width=args.width, processes=args.processes,
+                                  chunksize=args.chunksize)
+    results.sort(key=lambda r: r[0])
+    for name, boxes, error in results:
+        if error:
+            sys.stderr.write('{} failed: {}\n'.format(name, error))
+    rows = ((name, None if boxes is None else len(boxes), json.dumps(boxes), error or '')
+            for name, boxes, error in results)
+    write(rows, ['name', 'detections', 'boxes', 'error'], args.output, args.format)
+    return stats
+
+
+def cmd_classify(args):
+    if os.path.isdir(args.model):
+        from source.Classification.NN import NN
+        model = NN.load(args.model)
+    else:
+        from source.Classification.Quantize import CpuModel
+        model = CpuModel(args.model)
+    from source.Classification.Stream import predict_folder
+    return predict_folder(model, args.source, args.output, width=args.width, height=args.height, depth=args.depth,
+                          batch_size=args.batch_size, workers=args.workers)
+
+
+def parser():
+    """
+    :return: ArgumentParser with a subcommand per step: search, download, thumbnail, quality, detect, classify.
+    """
+    main_parser = argparse.ArgumentParser(prog='python -m source.Cli', description='Carmera images, no display needed.')
+    main_parser.add_argument('--key', help='API key, default the environment variable {}'.format(ENV_KEY))
+    commands = main_parser.add_subparsers(dest='command')
+    commands.required = True
+
+    searching = argparse.ArgumentParser(add_help=False)
+    group = searching.add_argument_group('search')
+    group.add_argument('--aoi', type=json_arg, help='Polygon [[[lon,lat],...]], JSON or JSON file. AOI search.')
+    group.add_argument('--points', type=json_arg, help='[lon,lat] or polygon, JSON or JSON file.')
+    group.add_argument('--address', help='e.g. "20 Jay St, Brooklyn, NY 11211"')
+    group.add_argument('--radius', type=int, help='Meters.')
+    group.add_argument('--range', help='e.g. "2017-01-17 00:00:00,2017-01-17 23:59:59"')
+    group.add_argument('--filter', help='e.g. "position=1|4,speed>=20"')
+    group.add_argument('--tags', help='e.g. "car.make=bmw"')
+    group.add_argument('--sort', help='e.g. captured_on or distance')
+    group.add_argument('--order', choices=['ASC', 'DESC'])
+    group.add_argument('--page-size', type=int, default=1000, help='Images per page of the search.')
+    group.add_argument('--sample', type=float, metavar='METERS',
+                       help='Keep one image every METERS of travel per camera and position, e.g. 10.')
+    group.add_argument('--min-speed', type=float, default=0.5, help='Meters/sec, slower is stopped for --sample.')
+    group.add_argument('--no-prefetch', action='store_true', help='Do not request the next page in background.')
+    group.add_argument('--cache', help='SQLite file caching the searches.')
+    group.add_argument('--cache-ttl', type=float, help='Seconds a cached search is valid. Default, one day.')
+    group.add_argument('--url', help='Base URL of the API, e.g. a local MockCarmera. Default the carmera client.')
+    group.add_argument('--rate', type=float, default=100.0, help='Max requests per second to the API, 0 no limit.')
+    group.add_argument('--concurrency', type=int, default=16, help='Max requests at the same time to the API.')
+    group.add_argument('--retries', type=int, default=5, help='Attempts after a 429, a 5xx or a connection error.')
+
+    downloading = argparse.ArgumentParser(add_help=False)
+    group = downloading.add_argument_group('download')
+    group.add_argument('--workers', type=int, default=8, help='Images downloading at the same time.')
+    group.add_argument('--per-host', type=int, default=4, help='Max connections to the same host.')
+    group.add_argument('--timeout', type=float, default=30, help='Seconds to wait for one image.')
+
+    pooling = argparse.ArgumentParser(add_help=False)
+    group = pooling.add_argument_group('processes')
+    group.add_argument('--processes', type=int, help='Worker processes, default one per core.')
+    group.add_argument('--chunksize', type=int, default=16, help='Images sent to a process at once.')
+
+    output = argparse.ArgumentParser(add_help=False)
+    group = output.add_argument_group('output')
+    group.add_argument('--output', help='File of the results, default stdout.')
+    group.add_argument('--format', choices=['csv', 'json'], default='csv', help='json is one object per line.')
+
+    command = commands.add_parser('search', parents=[searching, output], help='Search for images.')
+    command.add_argument('--index', help='Answer with a local index file (see index), no request to the API.')
+    command.set_defaults(func=cmd_search)
+
+    command = commands.add_parser('index', parents=[searching], help='Add the images of a search to a local index.')
+    command.add_argument('--index', required=True, help='Index file, .npz')
+    command.set_defaults(func=cmd_index)
+
+    command = commands.add_parser('catalog', parents=[searching], help='Add the metadata of a search to a catalog.')
+    command.add_argument('--catalog', required=True, help='Folder of the catalog, one .npy file per column.')
+    command.set_defaults(func=cmd_catalog)
+
+    command = commands.add_parser('download', parents=[searching, downloading], help='Search and download images.')
+    command.add_argument('--out', required=True, help='Folder of the images.')
+    command.add_argument('--width', type=int, help='Width of the images saved, default the native size.')
+    command.add_argument('--batch', type=int, default=500, help='Images per batch of downloads.')
+    command.add_argument('--sync', help='SQLite file of the incremental sync, only the new images are downloaded.')
+    command.set_defaults(func=cmd_download)
+
+    command = commands.add_parser('thumbnail', parents=[searching, downloading, pooling],
+                                  help='Thumbnails of a folder (--source), or search, download, thumbnail and ping.')
+    command.add_argument('--source', help='Folder of images. Without it the images are searched and downloaded.')
+    command.add_argument('--out', required=True, help='Folder of the thumbnails.')
+    command.add_argument('--packed', action='store_true',
+                         help='--out is a ThumbnailStore: a few big files and an index, not one file per image.')
+    command.add_argument('--width', type=int, default=640)
+    command.add_argument('--quality', type=int, default=85, help='JPEG quality, 0 - 100.')
+    command.add_argument('--thumbnail-workers', type=int, default=2, help='Threads resizing downloaded images.')
+    command.add_argument('--queue-size', type=int, default=64, help='Max images waiting between two steps.')
+    command.add_argument('--ping-url', help='URL of the completion ping.')
+    command.add_argument('--ping-workers', type=int, default=4, help='Pings sent at the same time.')
+    command.add_argument('--outbox', help='SQLite file keeping the pings not sent yet.')
+    command.add_argument('--no-ping', action='store_true', help='Do not send the completion pings.')
+    command.add_argument('--dedup', type=int, metavar='BITS',
+                         help='Drop the near duplicates of an image of the same place, max bits of 64 different.')
+    command.set_defaults(func=cmd_thumbnail)
+
+    command = commands.add_parser('compact', help='Free the space of the thumbnails replaced in a ThumbnailStore.')
+    command.add_argument('--store', required=True, help='Folder of the ThumbnailStore.')
+    command.set_defaults(func=cmd_compact)
+
+    command = commands.add_parser('quality', parents=[pooling, output], help='Blur, brightness and occlusion scores.')
+    command.add_argument('--source', required=True, help='Folder of images.')
+    command.add_argument('--width', type=int, default=320, help='Width of the copy scored.')
+    command.set_defaults(func=cmd_quality, chunksize=32)
+
+    command = commands.add_parser('detect', parents=[pooling, output], help='Run a cascade over a folder.')
+    command.add_argument('--source', required=True, help='Folder of images.')
+    command.add_argument('--cascade', required=True, help='XML file of the cascade.')
+    command.add_argument('--width', type=int, default=640, help='Width of the copy used for the detection.')
+    command.set_defaults(func=cmd_detect)
+
+    command = commands.add_parser('classify', help='Tag a folder of images with a trained model, on CPU.')
+    command.add_argument('--source', required=True, help='Folder of images.')
+    command.add_argument('--model', required=True, help='Folder of NN.save, or file of Quantize.export')
+    command.add_argument('--output', required=True, help='CSV file: image_id, class, probability.')
+    command.add_argument('--width', type=int, default=32)
+    command.add_argument('--height', type=int, default=32)
+    command.add_argument('--depth', type=int, default=3)
+    command.add_argument('--batch-size', type=int, default=64, help='Images per call to the model.')
+    command.add_argument('--workers', type=int, default=4, help='Threads decoding images.')
+    command.set_defaults(func=cmd_classify)
+    return main_parser
+
+
+def main(argv=None):
+    """
+    :param argv: Arguments, default sys.argv
+    :return: Exit code.
+    """
+    args = parser().parse_args(argv)
+    report(args.func(args))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
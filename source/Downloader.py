@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+""" Download endpoint...
+    GET https://api.carmera.com/v1/images/{image_id}/download/?apikey={your-api-key}&size=small
+    Sizes 5: tiny 360 x 272, small 640 x 480, medium 960 x 720, large 1280 x 960,
+        Native:
+        Forward Facing Cameras 1280 x 960,
+        Side Facing Cameras    3264 x 2448.
+"""
+
+# One entry per image. 'ok' is False when 'error' explains why the image was not saved.
+DownloadResult = namedtuple('DownloadResult', ['image_id', 'ok', 'path', 'size', 'elapsed', 'error'])
+
+
+class Downloader(object):
+    """
+    Download many images at the same time with a bounded pool of worker threads.
+    Every image returns a DownloadResult, one failure never stops the rest of the images.
+    """
+    URL = 'https://api.carmera.com/v1/'
+    SIZES = [('tiny', 360), ('small', 640), ('medium', 960), ('large', 1280)]
+
+    def __init__(self, key, url=URL, workers=8, per_host=4, timeout=30, scheduler=None):
+        """
+        :param key: API key.
+        :param url: Base URL of the API, change it to point to a local server.
+        :param workers: Number of images downloading at the same time.
+        :param per_host: Max number of open connections to the same host.
+        :param timeout: Seconds to wait for the server before give up with one image.
+        :param scheduler: Scheduler shared with the searches, for the rate limit and the retries. None, no retry.
+        """
+        self.key = str(key)
+        self.url = url if url.endswith('/') else url + '/'
+        self.workers = max(1, int(workers))
+        self.per_host = max(1, int(per_host))
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self.session = requests.Session()
+        # pool_maxsize is per host, like the semaphore of the host. pool_connections (hosts cached) is the default.
+        adapter = HTTPAdapter(pool_maxsize=self.per_host)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.hosts = {}                 # host -> Semaphore, to limit the connections per host.
+        self.hosts_lock = threading.Lock()
+        self.stats = {'ok': 0, 'failed': 0, 'bytes': 0, 'seconds': 0.0, 'images_per_sec': 0.0}
+
+    def image_url(self, image_id):
+        """
+        :param image_id: ID of the image.
+        :return: URL to download the image.
+        """
+        return '{}images/{}/download/'.format(self.url, image_id)
+
+    @staticmethod
+    def size_for_width(width):
+        """
+        :param width: Width needed, None for the native size.
+        :return: Name of the smallest size of the server at least that wide, None for the native size.
+        """
+        if width is not None:
+            for name, size in Downloader.SIZES:
+                if size >= width:
+                    return name
+        return None
+
+    def host_semaphore(self, url):
+        """
+        :param url: URL to request.
+        :return: The Semaphore shared by all the requests to the host of the URL.
+        """
+        host = urlparse(url).netloc
+        with self.hosts_lock:
+            if host not in self.hosts:
+                self.hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self.hosts[host]
+
+    def fetch(self, image_id, size=None):
+        """
+        Download one image into memory.
+        :param image_id: ID of the image.
+        :param size: 'tiny', 'small', 'medium', 'large' or None for the native size.
+        :return: bytes of the image. Raise requests.HTTPError when the server answer with an error.
+        """
+        if self.scheduler is None:
+            return self.get(image_id, size)
+        return self.scheduler.call(self.get, image_id, size)
+
+    def get(self, image_id, size=None):
+        url = self.image_url(image_id)
+        params = {'apikey': self.key}
+        if size is not None:
+            params['size'] = size
+        with self.host_semaphore(url):
+            res = self.session.get(url, params=params, timeout=self.timeout)
+            res.raise_for_status()
+            return res.content
+
+    def save(self, image_id, url_save, width=None):
+        """
+        Download one image to disk. The file is written to a temporal name first, so a failed download never
+        leaves half an image on disk.
+        :param image_id: ID of the image.
+        :param url_save: Folder to save the image.
+        :param width: Width of the image saved. The smallest size of the server at least that wide is downloaded,
+                      and resized when it is still wider. None for the native size.
+        :return: DownloadResult
+        """
+        start = time.time()
+        path = os.path.join(url_save, '{}.jpg'.format(image_id))
+        try:
+            content = self.fetch(image_id, size=Downloader.size_for_width(width))
+            if width is not None:
+                from source.Processing.Thumbnail import fit_width
+                content = fit_width(content, width)
+            tmp = path + '.part'
+            with open(tmp, 'wb') as f:
+                f.write(content)
+            os.replace(tmp, path)
+            return DownloadResult(image_id, True, path, len(content), time.time() - start, None)
+        except Exception as e:
+            return DownloadResult(image_id, False, None, 0, time.time() - start, str(e))
+
+    def download_all(self, img_id_set, url_save, width=None):
+        """
+        Download all the images with the pool of workers.
+        :param img_id_set: IDs of the images.
+        :param url_save: Folder to save the images.
+        :param width: Width of the images saved, None for the native size.
+        :return: List of DownloadResult, one per image.
+        """
+        if not os.path.isdir(url_save):
+            os.makedirs(url_save)
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = list(pool.map(lambda image_id: self.save(image_id, url_save, width), img_id_set))
+        seconds = time.time() - start
+
+        ok = [r for r in results if r.ok]
+        self.stats['ok'] += len(ok)
+        self.stats['failed'] += len(results) - len(ok)
+        self.stats['bytes'] += sum(r.size for r in ok)
+        self.stats['seconds'] += seconds
+        if self.stats['seconds'] > 0:
+            self.stats['images_per_sec'] = self.stats['ok'] / self.stats['seconds']
+        return results
@@ -1,5 +1,8 @@
-from carmera import Carmera
-from carmera.core import errors
+from source.Api import get_scheduler, get_service
+from source.Cache import Cache
+from source.Downloader import Downloader
+from source.Paginator import paginate
+from source.Sync import Sync
 # -*- coding: utf-8 -*-
 __author__ = 'Rainer Arencibia'
 
@@ -32,10 +35,20 @@ class Image(object):
     # We add some methods for basic pre-processing images.
     Image queries default sort by distance Ascending.
     """
-    def __init__(self, key):
-        cm = Carmera(api_key=str(key))
-        self.img = cm.Image()       # Image Service
+    def __init__(self, key, cache=None, url=None, scheduler=None):
+        """
+        :param key: API key.
+        :param cache: Optional Cache object, images and searches already requested are read from it.
+        :param url: Base URL of the API, e.g. a local MockCarmera. None, the carmera client.
+        :param scheduler: Scheduler of the requests. None, the one shared by all the services of the same API.
+        """
+        self.scheduler = scheduler or get_scheduler(url)
+        self.key = str(key)
+        self.url = url or Downloader.URL
+        self.img = get_service(key, 'Image', url=url, scheduler=self.scheduler)  # Image Service
         self.img_id_set = set()     # A set for IDs, to avoid duplicate images in any search. Efficient in space & time.
+        self.catalog = None         # Catalog of the images of catalog_images, typed columns. Millions of images.
+        self.cache = cache
 
     @staticmethod
     def speed_of_image(img):
@@ -70,14 +83,51 @@ class Image(object):
         :return: An image in Json format.
         """
         try:
+            if self.cache is not None:
+                image = self.cache.get(Cache.image_key(id))
+                if image is not None:
+                    return image
             res = self.img.get_by_id(id)
             image = res.json()
+            if self.cache is not None:
+                self.cache.set(Cache.image_key(id), image)
             return image
         except Exception as e:
             print(e.code)   # 404
             print(e.error)  # "Not found"
         return None
 
+    @staticmethod
+    def stream_images(self, options, offset=0, limit=5000, prefetch=True):
+        """
+        Search for images walking all the pages, the next page is requested while the current one is consumed.
+        :param self: Image object.
+        :param options: Dict with the search options. e.g. {'address': '20 Jay St, Brooklyn, NY 11211', 'radius': 300}
+        :param offset: Offset of the first page.
+        :param limit: Integer that indicate the results page size. 1 - 5000
+        :param prefetch: Request the next page in background.
+        :return: Generator of images, one image feature at a time.
+        """
+        search = self.img.search if self.cache is None else self.cache.cached_search('image', self.img.search)
+        return paginate(search, options, offset=offset, limit=limit, prefetch=prefetch)
+
+    @staticmethod
+    def catalog_images(self, options, offset=0, limit=5000, batch=100000):
+        """
+        Search for images and keep only their metadata, in the columns of self.catalog. No dict and no set entry per
+        image, for searches of millions of images.
+        :param self: Image object.
+        :param options: Dict with the search options, see stream_images.
+        :param offset: Offset of the first page.
+        :param limit: Integer that indicate the results page size. 1 - 5000
+        :param batch: Images kept as dicts before they are added to the catalog.
+        :return: Catalog with the images of all the searches, without duplicates.
+        """
+        from source.Catalog import Catalog
+        found = Catalog.from_features(Image.stream_images(self, options, offset=offset, limit=limit), batch=batch)
+        self.catalog = found if self.catalog is None else self.catalog.add(found)
+        return self.catalog
+
     @staticmethod
     def search_images_address(self, address=None, radius=None, sort='distance', order='ASC', tags=None, filt=None,
                               range=None, offset=0, limit=5000):
@@ -91,7 +141,7 @@ class Image(object):
         :param tags: Look for image with a specific tag
         :param filt: Special setting for look for better quality pictures, like speed=0, position, etc.
         :param range: Range of dates to look  for pictures
-        :param offset: Integer that indicate tha max number of pages.
+        :param offset: Offset of the first page. All the pages after it are walked.
         :param limit: Integer that indicate the results page size.
         :return: A set of the pictures ID.
         """
@@ -104,11 +154,8 @@ class Image(object):
                 'range': range,       # '2017-01-17 00:00:00, 2017-01-17 23:59:59',
                 'order': order,       # 'ASC' or 'DESC',
                 'tags': tags,         # tags=car.make=bmw,
-                'offset': offset,     # {} The pagination offset.
-                'limit': limit        # 1 - 5000
             }
-            feature_collection = self.img.search(options).json()
-            for image in feature_collection['features']:
+            for image in Image.stream_images(self, options, offset=offset, limit=limit):
                 self.img_id_set.add(image['properties']['id'])
             return self.img_id_set
         except Exception as e:
@@ -129,7 +176,7 @@ class Image(object):
         :param tags: Look for image with a specific tag
         :param filt: Special setting for look for better quality pictures, like speed=0, position, etc.
         :param range: Range of dates to look  for pictures.
-        :param offset: Integer that indicate tha max number of pages.
+        :param offset: Offset of the first page. All the pages after it are walked.
         :param limit: Integer that indicate the results page size.
         :return: A set of the pictures ID.
         """
@@ -142,11 +189,8 @@ class Image(object):
                 'sort': sort,         # 'distance&order=ASC',
                 'order': order,       # 'ASC' or 'DESC'
                 'tags': tags,         # tags=safety.score>=8,
-                'offset': offset,     # {} The pagination offset.0 Default value
-                'limit': limit        # 1 - 5000
             }
-            feature_collection = self.img.search(options).json()
-            for image in feature_collection['features']:
+            for image in Image.stream_images(self, options, offset=offset, limit=limit):
                 self.img_id_set.add(image['properties']['image_id'])
             return self.img_id_set
         except Exception as e:
@@ -155,75 +199,119 @@ class Image(object):
         return None
 
     @staticmethod
-    def download_images(self, url_save):
+    def download_images(self, url_save, workers=8, per_host=4, width=None):
         """
         This method save all the images that are already search.
         :param self: Image Object.
         :param url_save: Location to save all the images searched
-        :return: set of images saved, -1 when there is nothing to save.
+        :param workers: Number of images downloading at the same time.
+        :param per_host: Max number of open connections to the same host.
+        :param width: Width of the images saved. The smallest size of the server at least that wide is downloaded.
+                      None for the native size.
+        :return: set of images saved, None when there is nothing to save.
         """
         if len(self.img_id_set) == 0:
             print("There is nothing to save. Search for some images first.")
             return None
-        else:
-            try:
-                for id in self.img_id_set:
-                    # img = Image.get_image_id(image['properties']['image_id'])
-                    self.img.download(id, url_save)
-                return self.img_id_set
-            except Exception as e:
-                print(e.code)
-                print(e.error)
-        return None
+        results = Image.download_images_concurrent(self, url_save, workers=workers, per_host=per_host, width=width)
+        return set(r.image_id for r in results if r.ok)
+
+    @staticmethod
+    def download_images_concurrent(self, url_save, workers=8, per_host=4, url=None, width=None):
+        """
+        Download all the images already search with a pool of workers. A failed image does not stop the others.
+        :param self: Image Object.
+        :param url_save: Location to save all the images searched
+        :param workers: Number of images downloading at the same time.
+        :param per_host: Max number of open connections to the same host.
+        :param url: Base URL of the API. None, the one of the Image object.
+        :param width: Width of the images saved. The smallest size of the server at least that wide is downloaded.
+                      None for the native size.
+        :return: List of DownloadResult, one per image. The speed of the run is in self.download_stats.
+        """
+        downloader = Downloader(self.key, url=url or self.url, workers=workers, per_host=per_host,
+                                scheduler=self.scheduler)
+        results = downloader.download_all(self.img_id_set, url_save, width=width)
+        for r in results:
+            if not r.ok:
+                print("Image {} failed: {}".format(r.image_id, r.error))
+        self.download_stats = downloader.stats
+        print("Downloaded {ok} images, {failed} failed, {images_per_sec:.2f} images/sec".format(**downloader.stats))
+        return results
 
     @staticmethod
-    def download_images_address(self, address, radius, url_save):
+    def download_images_address(self, address, radius, url_save, workers=8, per_host=4, width=None):
         """
         This method save all the images that are already search.
         :param self: Image Object.
         :param address: Search first for images in that address.
         :param radius: Distance in meters.
         :param url_save: Location to save all the images searched
-        :return: set of images saved, -1 when there is nothing to save.
+        :param workers: Number of images downloading at the same time.
+        :param per_host: Max number of open connections to the same host.
+        :param width: Width of the images saved. The smallest size of the server at least that wide is downloaded.
+                      None for the native size.
+        :return: set of images saved, None when there is nothing to save.
         """
         Image.search_images_address(self, address, radius=radius)
-        if len(self.img_id_set) == 0:
-            print("There is nothing to save. Search for some images first.")
-            return None
-        else:
-            try:
-                for image in self.img_id_set:
-                    # img = Image.get_image_id(image['properties']['image_id'])
-                    self.img.download(id['properties']['image_id'], url_save)
-                return self.img_id_set
-            except Exception as e:
-                print(e.code)
-                print(e.error)
-        return None
+        return Image.download_images(self, url_save, workers=workers, per_host=per_host, width=width)
 
     @staticmethod
-    def download_images_coordinates(self, points, radius, url_save):
+    def download_images_coordinates(self, points, radius, url_save, workers=8, per_host=4, width=None):
         """
         This method save all the images that are already search.
         :param self: Image Object.
         :param points: Polygon area type [[[lon,lat],[lon,lat],[lon,lat],[lon,lat]]].
         :param radius: Distance in meters.
         :param url_save: Location to save all the images searched
-        :return: set of images saved, -1 when there is nothing to save.
+        :param workers: Number of images downloading at the same time.
+        :param per_host: Max number of open connections to the same host.
+        :param width: Width of the images saved. The smallest size of the server at least that wide is downloaded.
+                      None for the native size.
+        :return: set of images saved, None when there is nothing to save.
         """
-        Image.search_images_address(self, points, radius=radius)
-        if len(self.img_id_set) == 0:
-            print("There is nothing to save. Search for some images first.")
-            return None
-        else:
-            try:
-                for id in self.img_id_set:
-                    # img = Image.get_image_id(id['properties']['image_id'])
-                    self.img.download(id['properties']['image_id'], url_save)
-                return self.img_id_set
-            except Exception as e:
-                print(e.code)
-                print(e.error)
+        Image.search_images_coordinates(self, points, radius=radius)
+        return Image.download_images(self, url_save, workers=workers, per_host=per_host, width=width)
+
+    @staticmethod
+    def sync_images_coordinates(self, points, url_save, sync, radius=None, workers=8, per_host=4, batch=500,
+                                url=None, width=None):
+        """
+        Incremental download of an area. Only the images captured after the last run are searched, and the images
+        already downloaded are skipped. A run that crashed starts again from the first image it did not save.
+        :param self: Image Object.
+        :param points: Polygon area type [[[lon,lat],[lon,lat],[lon,lat],[lon,lat]]].
+        :param url_save: Location to save the images.
+        :param sync: Sync object with the state of the previous runs.
+        :param radius: Distance in meters.
+        :param workers: Number of images downloading at the same time.
+        :param per_host: Max number of open connections to the same host.
+        :param batch: Number of images between two checkpoints of the state.
+        :param url: Base URL of the API. None, the one of the Image object.
+        :param width: Width of the images saved. The smallest size of the server at least that wide is downloaded.
+                      None for the native size.
+        :return: set of images saved on this run, None when the search failed.
+        """
+        aoi = Sync.aoi_key(points)
+        options = {
+            'points': points,
+            'radius': radius,
+            'range': sync.range(aoi),
+            'sort': 'captured_on',
+            'order': 'ASC',
+        }
+        try:
+            downloader = Downloader(self.key, url=url or self.url, workers=workers, per_host=per_host,
+                                    scheduler=self.scheduler)
+            results = sync.run(aoi, Image.stream_images(self, options), downloader, url_save, batch=batch,
+                               width=width)
+            self.download_stats = downloader.stats
+            saved = set(r.image_id for r in results if r.ok)
+            self.img_id_set.update(saved)
+            return saved
+        except Exception as e:
+            print(e.code)
+            print(e.error)
         return None
 
 
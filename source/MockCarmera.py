@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import argparse
+import datetime
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+
+""" Local stand-in of the Carmera API, the same endpoints as source.Api plus the download and the ping.
+    GET  /v1/images/search/      points + radius, address + radius (every address is the CENTER), range, sort, order
+    GET  /v1/images/{id}/
+    GET  /v1/images/{id}/download/?size=tiny|small|medium|large   Synthetic JPEG.
+    GET  /v1/aois/search/        aoi polygon, range, sort, order. The FeatureCollection has the 'id' of the AOI.
+    GET  /v1/aois/{id}/          AOI created with POST.
+    POST /v1/aois/   PUT /v1/aois/{id}/
+    GET  /v1/tags/search/
+    GET  /ping/?image_id=1       POST /ping/batch/ {"image_ids": [...]}
+    python -m source.MockCarmera --port 8000 --images 10000 --latency 0.02 --error-rate 0.01
+"""
+
+CENTER = (-73.9865, 40.7280)     # East Village.
+SIZES = {'tiny': (360, 272), 'small': (640, 480), 'medium': (960, 720), 'large': (1280, 960), None: (1280, 960)}
+EARTH_RADIUS = 6371000.0
+
+
+def haversine(lon1, lat1, lon2, lat2):
+    """
+    :return: Distance in meters between two points.
+    """
+    lon1, lat1, lon2, lat2 = map(math.radians, (lon1, lat1, lon2, lat2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+def inside(lon, lat, polygon):
+    """
+    :param polygon: [[[lon,lat],[lon,lat],...]], only the outer ring is used.
+    :return: True when the point is inside the polygon.
+    """
+    ring = polygon[0]
+    result = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            result = not result
+        j = i
+    return result
+
+
+def day_range(value):
+    """
+    :param value: 'YYYY-MM-DD[ HH:MM:SS],YYYY-MM-DD[ HH:MM:SS]'
+    :return: (start, end) as 'YYYY-MM-DD HH:MM:SS', a day alone is the whole day.
+    """
+    start, end = [v.strip() for v in value.split(',')]
+    if len(start) == 10:
+        start += ' 00:00:00'
+    if len(end) == 10:
+        end += ' 23:59:59'
+    return start, end
+
+
+def catalog(images, seed=0, start='2017-01-01 00:00:00', spread=0.01):
+    """
+    Synthetic images around CENTER, captured one every few seconds by a few cameras.
+    :param images: Number of images.
+    :param seed: Same seed, same images.
+    :param start: Capture time of the first image.
+    :param spread: Max distance to CENTER, in degrees.
+    :return: List of image features, ID 1 first.
+    """
+    rnd = random.Random(seed)
+    when = datetime.datetime.strptime(start, '%Y-%m-%d %H:%M:%S')
+    features = []
+    for i in range(1, images + 1):
+        when += datetime.timedelta(seconds=rnd.randint(1, 10))
+        lon = CENTER[0] + rnd.uniform(-spread, spread)
+        lat = CENTER[1] + rnd.uniform(-spread, spread)
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+            'properties': {
+                'id': i,
+                'image_id': i,
+                'captured_on': when.strftime('%Y-%m-%d %H:%M:%S'),
+                'speed': round(rnd.uniform(0, 20), 2),
+                'position': rnd.randint(1, 4),
+                'camera': rnd.randint(1, 8),
+                'url': 'images/{}/download/'.format(i),
+            },
+        })
+    return features
+
+
+def jpeg(width, height, variant=0, quality=85):
+    """
+    :return: bytes of a JPEG with some texture, different for every variant.
+    """
+    import cv2
+    import numpy as np
+    rnd = np.random.RandomState(variant)
+    small = rnd.randint(0, 255, (height // 16 + 1, width // 16 + 1, 3)).astype(np.uint8)
+    img = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    cv2.putText(img, str(variant), (width // 4, height // 2), cv2.FONT_HERSHEY_SIMPLEX, width / 200.0,
+                (255, 255, 255), max(1, width // 200))
+    return cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'     # Keep-alive, like the real API.
+    disable_nagle_algorithm = True    # The headers and the body are two writes, do not wait for the ACK between them.
+
+    def do_GET(self):
+        self.server.mock.handle(self, 'GET')
+
+    def do_POST(self):
+        self.server.mock.handle(self, 'POST')
+
+    def do_PUT(self):
+        self.server.mock.handle(self, 'PUT')
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MockCarmera(object):
+    """
+    Local server answering like the Carmera API, with a fixed latency and a rate of errors to test the clients.
+    """
+    def __init__(self, images=1000, latency=0.0, error_rate=0.0, error_codes=(500, 503, 429), page_size=5000,
+                 key=None, variants=16, seed=0, host='127.0.0.1', port=0):
+        """
+        :param images: Number of images of the catalog.
+        :param latency: Seconds added to every answer.
+        :param error_rate: Part of the requests answered with one of error_codes, 0 - 1.
+        :param error_codes: HTTP codes of the errors.
+        :param page_size: Max 'limit' of a search, bigger limits are cut to it.
+        :param key: API key accepted, None any key.
+        :param variants: Number of different JPEGs, image N gets the variant N % variants.
+        :param seed: Same seed, same catalog and same errors.
+        :param host: Address to listen.
+        :param port: Port to listen, 0 any free port.
+        """
+        self.features = catalog(images, seed=seed)
+        self.by_id = dict((f['properties']['id'], f) for f in self.features)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_codes = error_codes
+        self.page_size = page_size
+        self.key = key
+        self.variants = max(1, variants)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.jpegs = {}
+        self.queries = OrderedDict()     # Results of the last searches, the pages of a search are not filtered again.
+        self.aois = {}
+        self.pings = []
+        self.stats = {'requests': 0, 'errors': 0, 'search': 0, 'get': 0, 'download': 0, 'aoi': 0, 'tag': 0,
+                      'ping': 0, 'bytes': 0}
+        self.server = Server((host, port), Handler)
+        self.server.mock = self
+        self.thread = None
+
+    @property
+    def url(self):
+        """
+        :return: Base URL of the API, e.g. http://127.0.0.1:8000/v1/
+        """
+        return 'http://{}:{}/v1/'.format(self.server.server_address[0], self.server.server_port)
+
+    @property
+    def ping_url(self):
+        return 'http://{}:{}/ping/'.format(self.server.server_address[0], self.server.server_port)
+
+    @property
+    def batch_url(self):
+        return self.ping_url + 'batch/'
+
+    def start(self):
+        """
+        Serve in a background thread.
+        :return: self
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def count(self, name, size=0):
+        with self.lock:
+            self.stats[name] += 1
+            self.stats['bytes'] += size
+
+    def image(self, image_id, size=None):
+        """
+        :return: bytes of the JPEG of an image, made only once per variant and size.
+        """
+        key = (int(image_id) % self.variants, size)
+        if key not in self.jpegs:
+            width, height = SIZES[size]
+            self.jpegs[key] = jpeg(width, height, key[0])
+        return self.jpegs[key]
+
+    def search(self, options, polygon=None):
+        """
+        :param options: Dict of the URL parameters, JSON values already decoded.
+        :param polygon: Area of an AOI search.
+        :return: (Features of the page, total number of features)
+        """
+        query = json.dumps(dict((k, v) for k, v in options.items() if k not in ('offset', 'limit', 'apikey')),
+                           sort_keys=True) + json.dumps(polygon)
+        with self.lock:
+            found = self.queries.get(query)
+        if found is None:
+            found = self.filter(options, polygon)
+            with self.lock:
+                self.queries[query] = found
+                while len(self.queries) > 64:
+                    self.queries.popitem(last=False)
+        offset = int(options.get('offset', 0))
+        limit = min(int(options.get('limit', self.page_size)), self.page_size)
+        return found[offset:offset + limit], len(found)
+
+    def filter(self, options, polygon=None):
+        features = self.features
+        points = options.get('points')
+        radius = options.get('radius')
+        if points is not None and len(points) == 2 and not isinstance(points[0], list):
+            center = points
+        elif points is not None:
+            polygon = points
+            center = None
+        else:
+            center = CENTER if 'address' in options else None
+        if polygon is not None:
+            features = [f for f in features if inside(f['geometry']['coordinates'][0],
+                                                      f['geometry']['coordinates'][1], polygon)]
+        if center is not None:
+            distance = lambda f: haversine(center[0], center[1], *f['geometry']['coordinates'])
+            if radius is not None:
+                features = [f for f in features if distance(f) <= float(radius)]
+        if options.get('range'):
+            start, end = day_range(options['range'])
+            features = [f for f in features if start <= f['properties']['captured_on'] <= end]
+        sort = options.get('sort')
+        if sort == 'distance' and center is not None:
+            features = sorted(features, key=distance)
+        elif sort in ('captured_on', 'speed', 'position', 'camera', 'id'):
+            features = sorted(features, key=lambda f: f['properties'][sort])
+        if str(options.get('order', 'ASC')).upper() == 'DESC':
+            features = features[::-1]
+        return features
+
+    def handle(self, request, method):
+        """
+        Answer one request of the Handler.
+        """
+        url = urlparse(request.path)
+        options = {}
+        for k, v in parse_qs(url.query).items():
+            try:
+                options[k] = json.loads(v[-1])
+            except ValueError:
+                options[k] = v[-1]
+        body = None
+        length = int(request.headers.get('Content-Length') or 0)
+        if length:
+            body = json.loads(request.rfile.read(length).decode('utf-8'))
+
+        with self.lock:
+            self.stats['requests'] += 1
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+            code = self.random.choice(self.error_codes) if failed else None
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            self.count('errors')
+            return self.send(request, code, {'error': 'Mock error'})
+
+        parts = [p for p in url.path.split('/') if p]
+        if parts and parts[0] == 'ping':
+            ids = body['image_ids'] if body is not None else [options.get('image_id')]
+            with self.lock:
+                self.pings.extend(str(i) for i in ids)
+            self.count('ping')
+            return self.send(request, 200, {'ok': len(ids)})
+        if self.key is not None and str(options.get('apikey')) != self.key:
+            return self.send(request, 401, {'error': 'Unauthorized'})
+        parts = parts[1:] if parts and parts[0] == 'v1' else parts
+        if len(parts) < 2:
+            return self.send(request, 404, {'error': 'Not found'})
+        resource, what = parts[0], parts[1]
+
+        if resource in ('images', 'aois', 'tags') and what == 'search':
+            polygon = options.get('aoi') if resource == 'aois' else None
+            page, total = self.search(options, polygon)
+            if resource == 'tags':
+                page = [{'tag': 'car', 'image_id': f['properties']['id'], 'confidence': 0.9,
+                         'properties': {'make': 'jeep'}} for f in page if f['properties']['id'] % 5 == 0]
+            collection = {'type': 'FeatureCollection', 'features': page, 'total': total}
+            if resource == 'aois':
+                collection['id'] = 'aoi-{}'.format(zlib.crc32(json.dumps(polygon).encode('utf-8')))
+            self.count('tag' if resource == 'tags' else 'search')
+            return self.send(request, 200, collection)
+
+        if resource == 'aois':
+            self.count('aoi')
+            if method == 'POST':
+                with self.lock:
+                    aoi_id = len(self.aois) + 1
+                    self.aois[aoi_id] = body
+                return self.send(request, 200, {'id': aoi_id, 'name': body.get('name')})
+            aoi_id = int(what) if what.isdigit() else what
+            if aoi_id not in self.aois:
+                return self.send(request, 404, {'error': 'Not found'})
+            if method == 'PUT':
+                self.aois[aoi_id] = body
+                return self.send(request, 200, {'id': aoi_id, 'name': body.get('name')})
+            page, total = self.search(options, self.aois[aoi_id]['aoi'])
+            return self.send(request, 200, {'type': 'FeatureCollection', 'id': aoi_id, 'features': page,
+                                            'total': total, 'properties': {'id': aoi_id,
+                                                                           'name': self.aois[aoi_id]['name']}})
+
+        if resource == 'images' and what.isdigit() and int(what) in self.by_id:
+            if len(parts) > 2 and parts[2] == 'download':
+                size = options.get('size')
+                if size not in SIZES:
+                    return self.send(request, 400, {'error': 'Bad size'})
+                content = self.image(what, size)
+                self.count('download', len(content))
+                return self.send(request, 200, content, 'image/jpeg')
+            self.count('get')
+            return self.send(request, 200, self.by_id[int(what)])
+        return self.send(request, 404, {'error': 'Not found'})
+
+    @staticmethod
+    def send(request, code, content, content_type='application/json'):
+        if not isinstance(content, bytes):
+            content = json.dumps(content).encode('utf-8')
+        request.send_response(code)
+        request.send_header('Content-Type', content_type)
+        request.send_header('Content-Length', str(len(content)))
+        request.end_headers()
+        request.wfile.write(content)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m source.MockCarmera', description='Local Carmera API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--images', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every answer.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Part of the requests failed, 0 - 1.')
+    parser.add_argument('--page-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    mock = MockCarmera(images=args.images, latency=args.latency, error_rate=args.error_rate,
+                       page_size=args.page_size, seed=args.seed, host=args.host, port=args.port)
+    print('Serving {} images on {}'.format(args.images, mock.url))
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        mock.server.server_close()
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import json
+import random
+import sqlite3
+import threading
+import time
+from queue import Empty, Full, Queue
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Notifier(object):
+    """
+    Send the HTTP ping signaling the completion of every image, in background threads sharing a keep-alive session.
+    notify() never waits for the network nor the disk. The pings are saved on an outbox file (optional) by a
+    background thread, many at once, so the ones not sent yet survive a restart of the application and are sent by
+    the next Notifier on the same outbox. A ping refused by the server (a 4xx other than 429) is never sent again.
+    """
+    URL = 'http://www.carmera.co/'
+
+    def __init__(self, url=URL, outbox=None, workers=4, batch_url=None, batch_size=50, retries=5, backoff=0.5,
+                 max_backoff=30.0, timeout=10, queue_size=10000, flush_interval=0.2):
+        """
+        :param url: URL of the ping, GET with the parameter image_id.
+        :param outbox: SQLite file with the pings not sent yet. None, the pings only live in memory.
+        :param workers: Number of pings sent at the same time.
+        :param batch_url: URL that receives many pings at once, POST {"image_ids": [...]}. None, one GET per image.
+        :param batch_size: Max pings in one POST to batch_url.
+        :param retries: Attempts before a ping is left on the outbox for the next run.
+        :param backoff: Seconds of the first wait between attempts, it doubles every attempt, with random jitter.
+        :param max_backoff: Max seconds to wait between attempts.
+        :param timeout: Seconds to wait for the server.
+        :param queue_size: Max pings waiting in memory, the others wait on the outbox.
+        :param flush_interval: Seconds between two writes of the new and the finished pings to the outbox.
+        """
+        self.url = url
+        self.batch_url = batch_url
+        self.batch_size = batch_size if batch_url else 1
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.flush_interval = flush_interval
+        self.queue = Queue(maxsize=queue_size)
+        self.queued = set()         # IDs in the queue or being sent.
+        self.deferred = False       # True when there are pings on the outbox that did not fit in the queue.
+        self.pending = {}           # ID -> time of notify, not written to the outbox yet.
+        self.finished = []          # IDs sent or refused, not removed from the outbox yet.
+        self.abandoned = set()      # IDs failed in this run, on the outbox for the next one.
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.threads = []
+        self.writer = None
+        self.stats = {'sent': 0, 'failed': 0, 'rejected': 0, 'retries': 0, 'requests': 0, 'dropped': 0}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.db = None
+        if outbox is not None:
+            self.db = sqlite3.connect(outbox, check_same_thread=False)
+            self.db.execute('CREATE TABLE IF NOT EXISTS outbox (image_id TEXT PRIMARY KEY, created REAL)')
+            self.db.commit()
+            self.deferred = True    # Pings left by a previous run.
+
+    def start(self):
+        """
+        Start the threads sending the pings.
+        :return: self
+        """
+        self.stopping.clear()
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self.worker)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+        if self.db is not None and self.writer is None:
+            self.writer = threading.Thread(target=self.write)
+            self.writer.daemon = True
+            self.writer.start()
+        return self
+
+    def notify(self, image_id):
+        """
+        Ask for the ping of an image. It returns at once, the ping is sent in background.
+        :param image_id: ID of the image.
+        """
+        image_id = str(image_id)
+        with self.lock:
+            if image_id in self.queued:
+                return
+            if self.db is not None:
+                self.pending[image_id] = time.time()
+            try:
+                self.queue.put_nowait(image_id)
+                self.queued.add(image_id)
+            except Full:
+                if self.db is not None:
+                    self.deferred = True
+                else:
+                    self.stats['dropped'] += 1
+
+    def flush(self):
+        """
+        Write the new pings to the outbox and remove the finished ones, in one transaction.
+        """
+        with self.db_lock:
+            if self.db is None:
+                return
+            with self.lock:
+                pending, self.pending = self.pending, {}
+                finished, self.finished = self.finished, []
+            if not pending and not finished:
+                return
+            # A ping notified and finished since the last flush never touches the disk.
+            done = set(finished)
+            self.db.executemany('INSERT OR IGNORE INTO outbox (image_id, created) VALUES (?, ?)',
+                                [(i, created) for i, created in pending.items() if i not in done])
+            self.db.executemany('DELETE FROM outbox WHERE image_id = ?', [(i,) for i in done if i not in pending])
+            self.db.commit()
+
+    def write(self):
+        """
+        Thread writing the outbox every flush_interval seconds, until close.
+        """
+        while not self.stopping.wait(self.flush_interval):
+            self.flush()
+
+    def reload(self):
+        """
+        Move to the queue the pings waiting on the outbox.
+        """
+        self.flush()
+        with self.db_lock, self.lock:
+            if self.db is None or not self.deferred:
+                return
+            rows = self.db.execute('SELECT image_id FROM outbox ORDER BY created').fetchall()
+            self.deferred = False
+            finished = set(self.finished)   # Sent after the flush, still on the outbox.
+            for (image_id,) in rows:
+                if image_id in self.queued or image_id in finished or image_id in self.abandoned:
+                    continue
+                try:
+                    self.queue.put_nowait(image_id)
+                    self.queued.add(image_id)
+                except Full:
+                    self.deferred = True
+                    break
+
+    def worker(self):
+        while True:
+            try:
+                image_ids = [self.queue.get(timeout=0.2)]
+            except Empty:
+                if self.deferred:
+                    self.reload()
+                elif self.stopping.is_set():
+                    return
+                continue
+            while len(image_ids) < self.batch_size:
+                try:
+                    image_ids.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            ok = self.send(image_ids)
+            with self.lock:
+                if ok is None:
+                    # Left on the outbox for the next run.
+                    self.stats['failed'] += len(image_ids)
+                    self.abandoned.update(image_ids)
+                else:
+                    self.stats['sent' if ok else 'rejected'] += len(image_ids)
+                    if self.db is not None:
+                        self.finished.extend(image_ids)
+                self.queued.difference_update(image_ids)
+            for _ in image_ids:
+                self.queue.task_done()
+
+    def send(self, image_ids):
+        """
+        Send the pings, retrying with exponential backoff and random jitter.
+        :param image_ids: List of IDs, more than one only when there is a batch_url.
+        :return: True when the server received the pings. False when it refused them with a 4xx other than 429, they
+                 are never sent again. None when all the attempts failed.
+        """
+        for attempt in range(self.retries):
+            if attempt > 0:
+                with self.lock:
+                    self.stats['retries'] += 1
+                time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+            try:
+                with self.lock:
+                    self.stats['requests'] += 1
+                if self.batch_url is not None:
+                    res = self.session.post(self.batch_url, data=json.dumps({'image_ids': image_ids}),
+                                            headers={'Content-Type': 'application/json'}, timeout=self.timeout)
+                else:
+                    res = self.session.get(self.url, params={'image_id': image_ids[0]}, timeout=self.timeout)
+                if res.status_code < 500 and res.status_code != 429:
+                    return res.ok
+            except requests.RequestException:
+                pass
+        return None
+
+    def close(self):
+        """
+        Wait until every ping is sent or failed, and stop the threads.
+        """
+        if not self.threads:
+            self.start()
+        self.reload()
+        while True:
+            self.queue.join()
+            if not self.deferred:
+                break
+            self.reload()
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+        self.flush()
+        with self.db_lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import copy
+from concurrent.futures import ThreadPoolExecutor
+
+
+def image_id(image):
+    """
+    Image searches return the ID as 'image_id' or as 'id'.
+    :param image: An image feature
+    :return: ID of the image.
+    """
+    properties = image['properties']
+    return properties['image_id'] if 'image_id' in properties else properties['id']
+
+
+def paginate(search, options, offset=0, limit=1000, prefetch=True, on_page=None):
+    """
+    Walk all the pages of a search and yield the image features one at a time.
+    Only the current page (and the next one, when prefetch is on) is in memory, no matter how many images match.
+    :param search: Function of the API that receive the options and return a response with the FeatureCollection.
+                   e.g. Carmera().Image().search or Carmera().Aoi().search
+    :param options: Dict with the search options, 'offset' and 'limit' are set by this function.
+    :param offset: Offset of the first page.
+    :param limit: Page size asked, the server can answer smaller pages.
+    :param prefetch: Ask for the next page while the caller consumes the current one.
+    :param on_page: Optional function called with each FeatureCollection, useful to read its other properties.
+    :return: Generator of image features.
+    """
+    def fetch(page_offset):
+        page_options = copy.copy(options)
+        page_options['offset'] = page_offset
+        page_options['limit'] = limit
+        feature_collection = search(page_options).json()
+        if on_page is not None:
+            on_page(feature_collection)
+        return feature_collection.get('features') or [], feature_collection.get('total')
+
+    def last(page_offset, features, total):
+        # A server can cap the page size under 'limit', a short page is not the end: only an empty page, or the
+        # total of the collection when it is given.
+        return not features or (total is not None and page_offset + len(features) >= total)
+
+    if not prefetch:
+        while True:
+            features, total = fetch(offset)
+            for feature in features:
+                yield feature
+            if last(offset, features, total):
+                return
+            offset += len(features)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        page = pool.submit(fetch, offset)
+        while True:
+            features, total = page.result()
+            if last(offset, features, total):
+                for feature in features:
+                    yield feature
+                return
+            offset += len(features)
+            page = pool.submit(fetch, offset)
+            for feature in features:
+                yield feature
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import os
+import threading
+import time
+from queue import Queue
+
+import cv2
+
+from source.Notifier import Notifier
+from source.Paginator import image_id
+from source.Processing.Magic import Proccesing
+from source.Processing.Thumbnail import decode
+
+
+STOP = object()     # Sentinel sent down the queues when a stage has no more work.
+
+
+class Stage(object):
+    """
+    A step of the pipeline. A set of threads reading from the queue of the previous step, writing to its own queue.
+    """
+    def __init__(self, name, work, workers, queue_size):
+        """
+        :param name: Name of the stage for the metrics.
+        :param work: Function applied to every item, it returns the item for the next stage.
+        :param workers: Number of threads of the stage.
+        :param queue_size: Max number of items waiting in the output queue. A full queue blocks the stage.
+        """
+        self.name = name
+        self.work = work
+        self.workers = workers
+        self.queue = Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.alive = workers
+        self.items = 0
+        self.failed = 0
+        self.dropped = 0
+        self.busy = 0.0
+        self.max_depth = 0
+        self.start = None
+        self.end = None
+
+    def put(self, item):
+        self.queue.put(item)
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def count(self, ok, seconds=0.0, dropped=False):
+        with self.lock:
+            if ok:
+                self.items += 1
+            else:
+                self.failed += 1
+            if dropped:
+                self.dropped += 1
+            self.busy += seconds
+
+    def metrics(self):
+        """
+        :return: Dict with the throughput of the stage and the depth of its output queue.
+        """
+        seconds = ((self.end or time.time()) - self.start) if self.start else 0.0
+        return {
+            'items': self.items,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'busy_seconds': self.busy,
+            'items_per_sec': self.items / seconds if seconds > 0 else 0.0,
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_depth,
+        }
+
+
+class Pipeline(object):
+    """
+    Search -> Download -> [Duplicates] -> Thumbnail -> Ping, all the stages run at the same time.
+    The images go from one stage to the next through bounded queues, so a slow stage slows down the ones before it
+    instead of filling the memory. Images are decoded from the downloaded bytes, they never touch the disk before
+    the thumbnail is saved.
+    """
+    def __init__(self, downloader, thumbnail_dir, width=640, ping=None, download_workers=8, thumbnail_workers=2,
+                 ping_workers=4, queue_size=64, quality=85, dedup=None, store=None):
+        """
+        :param downloader: Downloader object used to get the bytes of every image. The smallest size of the
+                           server at least 'width' wide is requested.
+        :param thumbnail_dir: Folder to save the thumbnails.
+        :param width: Width of the thumbnails, the aspect ratio is kept.
+        :param ping: Function called with the ID of every finished image, it should not block.
+                     Default, Notifier().notify
+        :param download_workers: Threads downloading images.
+        :param thumbnail_workers: Threads decoding and resizing images.
+        :param ping_workers: Threads of the default Notifier sending the completion pings.
+        :param queue_size: Max items waiting between two stages.
+        :param quality: JPEG quality of the thumbnails, 0 - 100.
+        :param dedup: Optional Deduplicator. The near duplicates of an image already seen around the same place are
+                      dropped after the download, no thumbnail and no ping for them.
+        :param store: Optional ThumbnailStore, the thumbnails are appended to it instead of one file each in
+                      thumbnail_dir.
+        """
+        self.downloader = downloader
+        self.thumbnail_dir = thumbnail_dir
+        self.width = width
+        self.quality = quality
+        self.processing = Proccesing()
+        self.notifier = None
+        if ping is None:
+            self.notifier = Notifier(workers=ping_workers)
+            ping = self.notifier.notify
+        self.ping = ping
+        self.errors = []
+        self.dedup = dedup
+        self.store = store
+        self.locations = {}     # Image ID -> (lon, lat), only while the image is between search and dedup.
+        self.duplicates = []    # (image ID, ID of the image it duplicates)
+        self.stages = [
+            Stage('search', None, 1, queue_size),
+            Stage('download', self.download, download_workers, queue_size),
+            Stage('thumbnail', self.thumbnail, thumbnail_workers, queue_size),
+            Stage('ping', self.done, 1, queue_size),
+        ]
+        if dedup is not None:
+            self.stages.insert(2, Stage('dedup', self.deduplicate, 1, queue_size))
+        self.threads = []
+
+    def download(self, image_id):
+        try:
+            return image_id, self.downloader.fetch(image_id, size=self.downloader.size_for_width(self.width))
+        except Exception:
+            self.locations.pop(image_id, None)
+            raise
+
+    def deduplicate(self, item):
+        """
+        :return: The item, None when the image is a near duplicate.
+        """
+        image_id, content = item
+        lon, lat = self.locations.pop(image_id)
+        original = self.dedup.check_bytes(image_id, content, lon, lat)
+        if original is None:
+            return item
+        self.duplicates.append((image_id, original))
+        return None
+
+    def thumbnail(self, item):
+        image_id, content = item
+        img = decode(content, self.width)
+        if img is None:
+            raise ValueError('Image {} can not be decoded'.format(image_id))
+        if img.shape[1] != self.width:
+            img = self.processing.resize_width(img, self.width)
+        name = '{}.jpg'.format(image_id)
+        if self.store is not None:
+            ok, jpg = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+            if not ok:
+                raise ValueError('Image {} can not be encoded'.format(image_id))
+            self.store.put(name, jpg.tobytes())
+        elif not cv2.imwrite(os.path.join(self.thumbnail_dir, name), img,
+                             [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)]):
+            raise IOError('Image {} can not be written to {}'.format(image_id, self.thumbnail_dir))
+        return image_id
+
+    def done(self, image_id):
+        self.ping(image_id)
+        return None
+
+    def search(self, images):
+        stage = self.stages[0]
+        seen = set()
+        try:
+            for image in images:
+                i = image_id(image)
+                if i in seen:
+                    continue
+                seen.add(i)
+                if self.dedup is not None:
+                    self.locations[i] = tuple(image['geometry']['coordinates'][:2])
+                stage.put(i)
+                stage.count(True)
+        except Exception as e:
+            stage.count(False)
+            self.errors.append((stage.name, None, str(e)))
+        finally:
+            self.finish(0)
+
+    def finish(self, index):
+        """
+        Called by every thread of a stage when it ends. The last one tells the next stage to stop.
+        :param index: Position of the stage.
+        """
+        stage = self.stages[index]
+        with stage.lock:
+            stage.alive -= 1
+            if stage.alive > 0:
+                return
+            stage.end = time.time()
+        if index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1].workers):
+                stage.queue.put(STOP)
+
+    def worker(self, index):
+        stage = self.stages[index]
+        inbox = self.stages[index - 1].queue
+        last = index + 1 == len(self.stages)
+        while True:
+            item = inbox.get()
+            if item is STOP:
+                break
+            start = time.time()
+            try:
+                result = stage.work(item)
+                if not last and result is not None:
+                    stage.put(result)
+                stage.count(True, time.time() - start, dropped=result is None and not last)
+            except Exception as e:
+                stage.count(False, time.time() - start)
+                self.errors.append((stage.name, item[0] if isinstance(item, tuple) else item, str(e)))
+        self.finish(index)
+
+    def start(self, images):
+        """
+        Start all the stages in background.
+        :param images: Iterable of image features, e.g. Image.stream_images(...) or AOI.stream(...)
+        """
+        if self.store is None and not os.path.isdir(self.thumbnail_dir):
+            os.makedirs(self.thumbnail_dir)
+        if self.notifier is not None:
+            self.notifier.start()
+        now = time.time()
+        for stage in self.stages:
+            stage.start = now
+        self.threads = [threading.Thread(target=self.search, args=(images,))]
+        for index, stage in enumerate(self.stages[1:], 1):
+            for _ in range(stage.workers):
+                self.threads.append(threading.Thread(target=self.worker, args=(index,)))
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+
+    def run(self, images):
+        """
+        Process all the images and wait until the last ping.
+        :param images: Iterable of image features.
+        :return: Dict of metrics per stage.
+        """
+        self.start(images)
+        self.join()
+        if self.notifier is not None:
+            self.notifier.close()
+        return self.metrics()
+
+    def metrics(self):
+        """
+        It can be called while the pipeline is running.
+        :return: Dict with the metrics of every stage.
+        """
+        metrics = dict((stage.name, stage.metrics()) for stage in self.stages)
+        if self.notifier is not None:
+            metrics['notifier'] = dict(self.notifier.stats)
+        if self.dedup is not None:
+            metrics['duplicates'] = dict(self.dedup.stats)
+        return metrics
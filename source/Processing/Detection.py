@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import os
+import time
+from multiprocessing import Pool
+
+import cv2
+
+from source.Processing.Thumbnail import decode, jpeg_size, read
+
+
+DETECTORS = {}      # path -> CascadeClassifier, every process loads each cascade only once.
+
+
+def get_detector(path):
+    """
+    :param path: XML file of an OpenCV cascade. e.g. haarcascade_eye.xml
+    :return: CascadeClassifier of the file, loaded the first time it is asked in this process.
+    """
+    detector = DETECTORS.get(path)
+    if detector is None:
+        detector = cv2.CascadeClassifier(path)
+        if detector.empty():
+            raise IOError('Cascade {} can not be loaded'.format(path))
+        DETECTORS[path] = detector
+    return detector
+
+
+def detect(img, path, width=640, scale_factor=1.3, min_neighbors=5, min_size=(30, 30)):
+    """
+    Run a cascade on a copy of the image 'width' pixels wide. The boxes are in pixels of the original image.
+    :param img: Numpy array, color or gray image.
+    :param path: XML file of the cascade.
+    :param width: Width of the copy used for the detection, None for the full image.
+    :param min_size: Min size of an object in pixels of the copy.
+    :return: List of boxes (x, y, w, h).
+    """
+    gray = img if len(img.shape) == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    scale = 1.0
+    if width is not None and gray.shape[1] > width:
+        scale = float(gray.shape[1]) / width
+        gray = cv2.resize(gray, dsize=(width, int(gray.shape[0] / scale)), interpolation=cv2.INTER_AREA)
+    detections = get_detector(path).detectMultiScale(gray, scaleFactor=scale_factor, minNeighbors=min_neighbors,
+                                                    minSize=min_size, flags=cv2.CASCADE_SCALE_IMAGE)
+    return [tuple(int(round(v * scale)) for v in box) for box in detections]
+
+
+def annotate(img, boxes, color=(0, 255, 0)):
+    """
+    Draw the boxes on the image.
+    :param img: Numpy array, it is modified.
+    :param boxes: List of boxes (x, y, w, h).
+    :return: Numpy array with the boxes.
+    """
+    for (x, y, w, h) in boxes:
+        cv2.rectangle(img, (x, y), (x + w, y + h), color, 2)
+    return img
+
+
+def detect_image(source, path, width=640):
+    """
+    :param source: Path of an image, or tuple (name, bytes).
+    :param path: XML file of the cascade.
+    :param width: Width of the copy used for the detection.
+    :return: (name, boxes, seconds, error), boxes in pixels of the original image. boxes is None and error the
+             reason when the image can not be decoded or the detection fails, error is None otherwise.
+    """
+    start = time.time()
+    name = source[0] if isinstance(source, tuple) else os.path.basename(source)
+    try:
+        name, buf = read(source)
+        gray = decode(buf, width, gray=True)
+        if gray is None:
+            return name, None, time.time() - start, 'Image can not be decoded'
+        boxes = detect(gray, path, width=width)
+        # The reduced decode is smaller than the original image, the boxes are mapped to the original size.
+        size = jpeg_size(buf)
+        if size is not None and size[0] != gray.shape[1]:
+            scale = float(size[0]) / gray.shape[1]
+            boxes = [tuple(int(round(v * scale)) for v in box) for box in boxes]
+        return name, boxes, time.time() - start, None
+    except Exception as e:
+        return name, None, time.time() - start, str(e)
+
+
+def _load(path):
+    get_detector(path)
+
+
+def _detect_image(args):
+    return detect_image(*args)
+
+
+def detect_batch(sources, path, width=640, processes=None, chunksize=16):
+    """
+    Run a cascade over many images with a pool of processes. Each process loads the cascade once when it starts.
+    :param sources: List or iterator of paths, or tuples (name, bytes). A folder, or the folder of a
+                    ThumbnailStore, is read completely.
+    :param path: XML file of the cascade.
+    :param width: Width of the copy used for the detection.
+    :param processes: Number of processes. None, one per core.
+    :param chunksize: Images sent to a process at once.
+    :return: (List of (name, boxes, error), dict with the latency per image and the images/sec of the run)
+    """
+    if isinstance(sources, str):
+        from source.Store import sources as folder_sources
+        sources = folder_sources(sources)
+    get_detector(path)      # Fail here when the cascade can not be loaded, not in every process of the pool.
+    start = time.time()
+    results = []
+    latency = 0.0
+    pool = Pool(processes=processes, initializer=_load, initargs=(path,))
+    try:
+        jobs = ((source, path, width) for source in sources)
+        for name, boxes, seconds, error in pool.imap_unordered(_detect_image, jobs, chunksize=chunksize):
+            results.append((name, boxes, error))
+            latency += seconds
+    finally:
+        pool.close()
+        pool.join()
+    seconds = time.time() - start
+    ok = sum(1 for _, boxes, _ in results if boxes is not None)
+    stats = {'ok': ok, 'failed': len(results) - ok, 'seconds': seconds,
+             'latency': latency / len(results) if results else 0.0,
+             'images_per_sec': len(results) / seconds if seconds > 0 else 0.0}
+    return results, stats
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import math
+import threading
+
+import cv2
+
+from source.Processing.Thumbnail import decode
+
+
+""" Near duplicate images, e.g. a car stopped at a red light taking the same picture again and again.
+    dHash: the image reduced to 9 x 8 gray pixels, one bit per pair of neighbour pixels (left brighter than right).
+    64 bits that change little with JPEG noise, small changes of light or a small resize. Two images are near
+    duplicates when their hashes differ in a few bits (Hamming distance).
+    The hashes are kept in one BK-tree per cell of a lon/lat grid, an image is only compared with the images taken
+    around the same place.
+"""
+
+HASH_SIZE = 8
+RADIUS = 6          # Bits of 64.
+CELL = 0.0005       # Degrees, about 55 meters of latitude.
+
+
+def dhash(img, size=HASH_SIZE):
+    """
+    :param img: Numpy array, color or gray.
+    :param size: Side of the hash, size * size bits.
+    :return: Integer with the hash.
+    """
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(img, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash_bytes(buf, size=HASH_SIZE):
+    """
+    :param buf: bytes of an image. A JPEG is decoded at 1/8 of its size, in gray, enough for a 9 x 8 hash.
+    :return: Integer with the hash, None when the image can not be decoded.
+    """
+    img = decode(buf, width=size * 8, gray=True)
+    if img is None:
+        return None
+    return dhash(img, size)
+
+
+def hamming(a, b):
+    """
+    :return: Number of bits different between two hashes.
+    """
+    return bin(a ^ b).count('1')
+
+
+class BKTree(object):
+    """
+    Burkhard-Keller tree of hashes. Every child of a node is at a different distance of it, so a search for the
+    hashes at 'radius' or less of a hash only walks the children at distance d - radius ... d + radius.
+    """
+    def __init__(self):
+        self.root = None    # [hash, item, {distance: child}]
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, value, item):
+        """
+        :param value: Hash.
+        :param item: Object kept with the hash, e.g. the image ID.
+        """
+        self.size += 1
+        if self.root is None:
+            self.root = [value, item, {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(value, node[0])
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, item, {}]
+                return
+            node = child
+
+    def search(self, value, radius):
+        """
+        :param value: Hash.
+        :param radius: Max distance.
+        :return: List of (distance, item) of the hashes at 'radius' or less, the closest first.
+        """
+        found = []
+        nodes = [self.root] if self.root is not None else []
+        while nodes:
+            node = nodes.pop()
+            d = hamming(value, node[0])
+            if d <= radius:
+                found.append((d, node[1]))
+            for distance, child in node[2].items():
+                if d - radius <= distance <= d + radius:
+                    nodes.append(child)
+        found.sort(key=lambda x: x[0])
+        return found
+
+
+class Deduplicator(object):
+    """
+    Decide if an image is a near duplicate of an image already seen around the same place. Thread safe.
+    """
+    def __init__(self, radius=RADIUS, cell=CELL):
+        """
+        :param radius: Max Hamming distance between the hashes of two near duplicates, 0 - 64. 0, only the same hash.
+        :param cell: Size of the cells of the grid, in degrees. The images of the 8 neighbour cells are compared too.
+        """
+        self.radius = radius
+        self.cell = float(cell)
+        self.trees = {}     # (col, row) -> BKTree
+        self.lock = threading.Lock()
+        self.stats = {'checked': 0, 'duplicates': 0, 'failed': 0}
+
+    def key(self, lon, lat):
+        return int(math.floor(lon / self.cell)), int(math.floor(lat / self.cell))
+
+    def check(self, image_id, value, lon, lat):
+        """
+        :param image_id: ID of the image.
+        :param value: Hash of the image, see dhash_bytes.
+        :param lon: Longitude of the image.
+        :param lat: Latitude of the image.
+        :return: ID of the image it duplicates. None when it is new, then it is kept for the next ones.
+        """
+        col, row = self.key(lon, lat)
+        with self.lock:
+            self.stats['checked'] += 1
+            for dc in (-1, 0, 1):
+                for dr in (-1, 0, 1):
+                    tree = self.trees.get((col + dc, row + dr))
+                    if tree is None:
+                        continue
+                    found = tree.search(value, self.radius)
+                    if found:
+                        self.stats['duplicates'] += 1
+                        return found[0][1]
+            tree = self.trees.get((col, row))
+            if tree is None:
+                tree = self.trees[(col, row)] = BKTree()
+            tree.add(value, image_id)
+        return None
+
+    def check_bytes(self, image_id, buf, lon, lat):
+        """
+        :param buf: bytes of the image.
+        :return: ID of the image it duplicates, None when it is new or it can not be decoded.
+        """
+        value = dhash_bytes(buf)
+        if value is None:
+            with self.lock:
+                self.stats['failed'] += 1
+            return None
+        return self.check(image_id, value, lon, lat)
@@ -84,22 +84,34 @@ class Proccesing(object):
         :return: variance of the Laplacian
         """
         if len(img.shape) == 3:
-            img = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         return cv2.Laplacian(img, cv2.CV_64F).var()
 
     def detection(self, img, detector):
         """
         Detect and Count how many faces are in the image
         :param image: Numpy array
-        :return: Integer
+        :param detector: CascadeClassifier or path of its XML file, see Detection.get_detector.
+        :return: Integer and the image with the detections drawn.
         """
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        detections = detector.detectMultiScale(gray, scaleFactor=1.3, minNeighbors=5, minSize=(30, 30),
-                                                flags=cv2.CASCADE_SCALE_IMAGE)
-        for (x, y, w, h) in detections:
-            cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        from source.Processing.Detection import annotate, detect
+        if isinstance(detector, str):
+            boxes = detect(img, detector)
+        else:
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            boxes = detector.detectMultiScale(gray, scaleFactor=1.3, minNeighbors=5, minSize=(30, 30),
+                                              flags=cv2.CASCADE_SCALE_IMAGE)
+        return len(boxes), annotate(img, boxes)
 
-        return len(detections), img
+    def histograms(self, img, bins=256):
+        """
+        Histogram of every channel of the image.
+        :param img: Numpy array, gray or color image.
+        :param bins: Bins per channel.
+        :return: List of Numpy arrays (bins x 1) of float32, one per channel.
+        """
+        channels = 1 if len(img.shape) == 2 else img.shape[2]
+        return [cv2.calcHist([img], [ch], None, [bins], [0, 256]) for ch in range(channels)]
 
     def hist_curve(self, img, gray_color=False):
         bins = np.arange(256).reshape(256, 1)
@@ -113,8 +125,7 @@ class Proccesing(object):
         elif img.shape[2] == 3:
             color = [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
 
-        for ch, col in enumerate(color):
-            hist_item = cv2.calcHist([img], [ch], None, [256], [0, 256])
+        for hist_item, col in zip(self.histograms(img), color):
             cv2.normalize(hist_item, hist_item, 0, 255, cv2.NORM_MINMAX)
             hist = np.int32(np.around(hist_item))
             pts = np.int32(np.column_stack((bins, hist)))
@@ -148,33 +159,32 @@ class Proccesing(object):
         return y, img
 
 if __name__ == '__main__':
-
-    os.chdir('/home/rainer85ah/Desktop/source/data/')
-    thumbnail_url = '/home/rainer85ah/Desktop/source/thumbnail/'
+    """
+    No display needed: python -m source.Processing.Magic images/ annotated/ [cascade.xml]
+    Every image is saved to the output folder with its blur value, and the detections when it is not blurry.
+    For big folders see: python -m source.Cli quality / detect
+    """
+    import sys
+    folder = sys.argv[1] if len(sys.argv) > 1 else '/home/rainer85ah/Desktop/source/thumbnail/'
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else '/home/rainer85ah/Desktop/source/annotated/'
+    url = sys.argv[3] if len(sys.argv) > 3 else '/home/rainer85ah/Software/opencv-3.1.0/data/haarcascades/haarcascade_eye.xml'
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
     processing = Proccesing()
     # ext = [".jpg", ".png"]
     # images_list = [os.path.join(path,f) for f in os.listdir(path) if f.endswith(ext)]
-    """
-    for i, img in enumerate(os.listdir(os.getcwd())):
-        name = img.title()
-        img = cv2.imread(img)
-        img = processing.resize_width(img, 640)
-        cv2.imwrite(thumbnail_url+name, img)
-    """
-    os.chdir(thumbnail_url)
     # This value is high with the intention of not allow images with a bad quality. "Blur, Dark, etc."
     threshold = 600.0
-    url = '/home/rainer85ah/Software/opencv-3.1.0/data/haarcascades/haarcascade_eye.xml'
-    for i, img in enumerate(os.listdir(os.getcwd())):
-        image = cv2.imread(img)
+    for i, name in enumerate(sorted(os.listdir(folder))):
+        image = cv2.imread(os.path.join(folder, name))
+        if image is None:
+            continue
         variance = processing.variance_of_laplacian(image)
         text = 'Not Blurry: '
         if variance < threshold:
             text = 'Blurry: '
 
         cv2.putText(image, "{} {:.2f}".format(text, variance), (10, 30), cv2.QT_FONT_NORMAL, 0.8, (0, 255, 0), 1)
-        cv2.imshow("Image", image)
-        key = cv2.waitKey(0)
 
         """
         We are going to code inside the for loop to filter and only apply the classification to good quality images.
@@ -182,11 +192,10 @@ if __name__ == '__main__':
         We can create a new detector with much more accuracy for faces, cars, tags, street signals, etc..
         """
         if variance > threshold:
-            detector = cv2.CascadeClassifier(url)
-            number, img = processing.detection(image, detector)
-            cv2.putText(img, "{} {:}".format('Detections: ', number), (10, 60), cv2.QT_FONT_NORMAL, 0.8, (0, 255, 0), 1)
-            cv2.imshow("Image", img)
-            key = cv2.waitKey(0)
+            number, image = processing.detection(image, url)
+            cv2.putText(image, "{} {:}".format('Detections: ', number), (10, 60), cv2.QT_FONT_NORMAL, 0.8, (0, 255, 0), 1)
+        cv2.imwrite(os.path.join(out_dir, name), image)
+        print('{} {} {:.2f}'.format(name, text, variance))
 
         """
         Some basic images operations. Rotate, Crop and Resize with width and height.
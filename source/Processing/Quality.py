@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import os
+import time
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+from source.Processing.Thumbnail import decode, read
+
+
+""" Quality of an image, all the values are computed on a gray copy 'width' pixels wide.
+    blur:       Variance of the Laplacian. Low values, blurry image. It depends on the width of the copy, so
+                thresholds have to be chosen for the same width.
+    brightness: Mean gray value, 0 - 255. Low values, dark image.
+    p5, p50, p95: Percentiles of the gray values.
+    occlusion:  Fraction of the image covered by flat tiles (almost no texture), e.g. something in front of the
+                camera, a dirty lens or a saturated area.
+"""
+COLUMNS = ['blur', 'brightness', 'p5', 'p50', 'p95', 'occlusion']
+
+
+def score(gray, tiles=8, flat=6.0):
+    """
+    :param gray: Numpy array, gray scale image.
+    :param tiles: The image is divided in tiles x tiles for the occlusion, less for images smaller than that.
+    :param flat: Max standard deviation of a tile without texture.
+    :return: Tuple with the values of COLUMNS.
+    """
+    blur = cv2.Laplacian(gray, cv2.CV_32F).var()
+
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    cdf = np.cumsum(hist) / hist.sum()
+    p5, p50, p95 = np.searchsorted(cdf, [0.05, 0.5, 0.95])
+    brightness = np.dot(hist, np.arange(256)) / hist.sum()
+
+    tiles = max(1, min(tiles, gray.shape[0], gray.shape[1]))
+    h = gray.shape[0] - gray.shape[0] % tiles
+    w = gray.shape[1] - gray.shape[1] % tiles
+    blocks = gray[:h, :w].reshape(tiles, h // tiles, tiles, w // tiles).astype(np.float32)
+    occlusion = (blocks.std(axis=(1, 3)) < flat).mean()
+
+    return blur, brightness, p5, p50, p95, occlusion
+
+
+def score_image(source, width=320):
+    """
+    :param source: Path of an image, or tuple (name, bytes).
+    :param width: Width of the gray copy used for the scores.
+    :return: (name, tuple with the values of COLUMNS, error), the values are None and error is not when the image
+             can not be scored.
+    """
+    name = source[0] if isinstance(source, tuple) else os.path.basename(source)
+    try:
+        name, buf = read(source)
+        gray = decode(buf, width, gray=True)
+        if gray is None:
+            return name, None, 'Image can not be decoded'
+        if gray.shape[1] > width:
+            height = max(1, int(gray.shape[0] * float(width) / gray.shape[1]))
+            gray = cv2.resize(gray, dsize=(width, height), interpolation=cv2.INTER_AREA)
+        return name, score(gray), None
+    except Exception as e:
+        return name, None, str(e)
+
+
+def _score_image(args):
+    return score_image(*args)
+
+
+def score_batch(sources, width=320, processes=None, chunksize=32):
+    """
+    Score many images with a pool of processes, one per core by default.
+    :param sources: List or iterator of paths, or tuples (name, bytes). A folder, or the folder of a
+                    ThumbnailStore, is read completely.
+    :param width: Width of the gray copy used for the scores.
+    :param processes: Number of processes. None, one per core.
+    :param chunksize: Images sent to a process at once.
+    :return: (Dict of columns: 'name', COLUMNS and 'error', dict with the speed of the run). The values of an image
+             that can not be scored are NaN, and its 'error' says why. '' for the images scored.
+    """
+    if isinstance(sources, str):
+        from source.Store import sources as folder_sources
+        sources = folder_sources(sources)
+    start = time.time()
+    names = []
+    rows = []
+    errors = []
+    pool = Pool(processes=processes)
+    try:
+        jobs = ((source, width) for source in sources)
+        for name, values, error in pool.imap(_score_image, jobs, chunksize=chunksize):
+            names.append(name)
+            rows.append(values if values is not None else (np.nan,) * len(COLUMNS))
+            errors.append(error or '')
+    finally:
+        pool.close()
+        pool.join()
+    seconds = time.time() - start
+
+    table = np.array(rows, dtype=np.float32).reshape(len(rows), len(COLUMNS))
+    columns = {'name': np.array(names)}
+    for i, column in enumerate(COLUMNS):
+        columns[column] = table[:, i].copy()
+    columns['error'] = np.array(errors)
+    failed = sum(1 for error in errors if error)
+    ok = len(rows) - failed
+    stats = {'ok': ok, 'failed': failed, 'seconds': seconds, 'images_per_sec': ok / seconds if seconds > 0 else 0.0}
+    return columns, stats
+
+
+def save(path, columns):
+    """
+    Save the scores as a compressed columnar file, each column is read on its own without decoding images again.
+    :param path: File, '.npz'
+    :param columns: Dict of columns from score_batch.
+    """
+    np.savez_compressed(path, **columns)
+
+
+def load(path):
+    """
+    :param path: File saved with save.
+    :return: Dict of columns. e.g. columns['name'][(columns['blur'] > 100) & (columns['brightness'] > 60)]
+    """
+    with np.load(path) as data:
+        return dict((column, data[column]) for column in data.files)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import os
+import struct
+import time
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+from source.Processing.Magic import Proccesing
+
+
+""" JPEG files can be decoded at 1/2, 1/4 or 1/8 of their size, much faster than a full decode.
+    Side Facing Cameras 3264 x 2448 -> IMREAD_REDUCED_COLOR_4 -> 816 x 612 -> resize -> 640 x 480
+"""
+REDUCED = [(8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)]
+REDUCED_GRAY = [(8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)]
+
+# Start Of Frame markers of the JPEG format, they have the size of the image.
+SOF = set([0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF])
+
+
+def jpeg_size(buf):
+    """
+    Read the size of a JPEG image from its header, without decoding it.
+    :param buf: bytes of the image.
+    :return: (width, height), None when it is not a JPEG image.
+    """
+    if buf[:2] != b'\xff\xd8':
+        return None
+    i = 2
+    while i + 9 < len(buf):
+        if buf[i] != 0xFF:
+            return None
+        marker = buf[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        length = struct.unpack('>H', buf[i + 2:i + 4])[0]
+        if marker in SOF:
+            height, width = struct.unpack('>HH', buf[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def reduced_flag(src_width, width, gray=False):
+    """
+    :param src_width: Width of the image on the file.
+    :param width: Width needed after decode.
+    :param gray: Decode to gray scale.
+    :return: Flag for cv2.imdecode with the biggest reduction that keeps at least 'width' pixels.
+    """
+    if src_width is not None and width is not None:
+        for factor, flag in (REDUCED_GRAY if gray else REDUCED):
+            if src_width // factor >= width:
+                return flag
+    return cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_COLOR
+
+
+def decode(buf, width=None, gray=False):
+    """
+    Decode an image with the smallest size that still has 'width' pixels.
+    :param buf: bytes of the image.
+    :param width: Width needed, None for the full image.
+    :param gray: Decode to gray scale.
+    :return: Numpy array, None when the image can not be decoded.
+    """
+    size = jpeg_size(buf)
+    flag = reduced_flag(size[0] if size else None, width, gray=gray)
+    return cv2.imdecode(np.frombuffer(buf, dtype=np.uint8), flag)
+
+
+def fit_width(buf, width, quality=85):
+    """
+    Make an image no wider than 'width', keeping the aspect ratio. Images already small enough are not touched.
+    :param buf: bytes of a JPEG image.
+    :param width: Max width.
+    :param quality: JPEG quality when the image is resized, 0 - 100.
+    :return: bytes of the image.
+    """
+    size = jpeg_size(buf)
+    if size is not None and size[0] <= width:
+        return buf
+    img = decode(buf, width)
+    if img is None:
+        raise ValueError('Image can not be decoded')
+    if img.shape[1] > width:
+        img = Proccesing().resize_width(img, width)
+    ok, jpg = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError('Image can not be encoded')
+    return jpg.tobytes()
+
+
+def read(source):
+    """
+    :param source: Path of an image, or tuple (name, bytes).
+    :return: (name, bytes)
+    """
+    if isinstance(source, tuple):
+        return source
+    with open(source, 'rb') as f:
+        return os.path.basename(source), f.read()
+
+
+def thumbnail_bytes(source, width=640, quality=85):
+    """
+    Make the thumbnail of one image in memory, keeping the aspect ratio.
+    :param source: Path of an image, or tuple (name, bytes).
+    :param width: Width of the thumbnail.
+    :param quality: JPEG quality of the thumbnail, 0 - 100.
+    :return: (name, error, bytes of the JPEG), error is None and bytes is not when the thumbnail is made.
+    """
+    name = source[0] if isinstance(source, tuple) else os.path.basename(source)
+    try:
+        name, buf = read(source)
+        img = decode(buf, width)
+        if img is None:
+            return name, 'Image can not be decoded', None
+        if img.shape[1] != width:
+            img = Proccesing().resize_width(img, width)
+        ok, jpg = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+        if not ok:
+            return name, 'Image can not be encoded', None
+        return name, None, jpg.tobytes()
+    except Exception as e:
+        return name, str(e), None
+
+
+def thumbnail_name(name):
+    """
+    :return: Name of the thumbnail of an image, the same name with '.jpg' extension.
+    """
+    return os.path.splitext(name)[0] + '.jpg'
+
+
+def thumbnail(source, out_dir, width=640, quality=85):
+    """
+    Make the thumbnail of one image, keeping the aspect ratio.
+    :param source: Path of an image, or tuple (name, bytes).
+    :param out_dir: Folder to save the thumbnail, with the same name of the image and '.jpg' extension.
+    :param width: Width of the thumbnail.
+    :param quality: JPEG quality of the thumbnail, 0 - 100.
+    :return: (name, error), error is None when the thumbnail is saved.
+    """
+    name, error, jpg = thumbnail_bytes(source, width, quality)
+    if error is not None:
+        return name, error
+    try:
+        with open(os.path.join(out_dir, thumbnail_name(name)), 'wb') as f:
+            f.write(jpg)
+        return name, None
+    except Exception as e:
+        return name, str(e)
+
+
+def _thumbnail(args):
+    return thumbnail(*args)
+
+
+def _thumbnail_bytes(args):
+    return thumbnail_bytes(*args)
+
+
+def thumbnails(sources, out_dir, width=640, quality=85, processes=None, chunksize=16, store=None):
+    """
+    Make the thumbnails of many images with a pool of processes, one per core by default.
+    :param sources: List or iterator of paths, or tuples (name, bytes).
+    :param out_dir: Folder to save the thumbnails. Not used with a store.
+    :param width: Width of the thumbnails.
+    :param quality: JPEG quality of the thumbnails, 0 - 100.
+    :param processes: Number of processes. None, one per core.
+    :param chunksize: Images sent to a process at once.
+    :param store: Optional ThumbnailStore. The thumbnails are appended to it, by the main process, instead of one
+                  file per image.
+    :return: (List of (name, error), dict with the speed of the run)
+    """
+    if store is None and not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    start = time.time()
+    pool = Pool(processes=processes)
+    try:
+        if store is None:
+            jobs = ((source, out_dir, width, quality) for source in sources)
+            results = list(pool.imap_unordered(_thumbnail, jobs, chunksize=chunksize))
+        else:
+            results = []
+            done = []
+            jobs = ((source, width, quality) for source in sources)
+            for name, error, jpg in pool.imap_unordered(_thumbnail_bytes, jobs, chunksize=chunksize):
+                results.append((name, error))
+                if error is None:
+                    done.append((thumbnail_name(name), jpg))
+                if len(done) >= chunksize * 4:
+                    store.put_many(done)
+                    done = []
+            store.put_many(done)
+    finally:
+        pool.close()
+        pool.join()
+    seconds = time.time() - start
+    ok = sum(1 for _, error in results if error is None)
+    stats = {'ok': ok, 'failed': len(results) - ok, 'seconds': seconds,
+             'images_per_sec': ok / seconds if seconds > 0 else 0.0}
+    return results, stats
@@ -1,19 +1,19 @@
-from carmera import Carmera
-import requests
-from source.Image import Image
+import datetime
+import json
+import sys
+
+from source.Cli import main
 
 # -*- coding: utf-8 -*-
 __author__ = 'Rainer Arencibia'
 
 """Parameter or settings from the app"""
-DISK = '/home/rainer85ah/Desktop/source/data/'
-AOI = [[[-73.987084387429, 40.7330731785852], [-73.9806062564698, 40.7303859498055],
-        [-73.9862746210592, 40.7225563969032], [-73.9922222154312, 40.7243339978445]]]
+KEY = '00bc11acbd9c2690eb453a51b335bbcdd8652ba9'
+THUMBNAIL = '/home/rainer85ah/Desktop/source/thumbnail/'
+EAST_VILLAGE = [[[-73.987084387429, 40.7330731785852], [-73.9806062564698, 40.7303859498055],
+                 [-73.9862746210592, 40.7225563969032], [-73.9922222154312, 40.7243339978445]]]
 AOI_NAME = "East Village"
 URL = 'https://api.carmera.com/v1/'
-headers = {'Authorization': 'api-key {00bc11acbd9c2690eb453a51b335bbcdd8652ba9}'}
-FORMAT = 'Content-Type: application/vnd.geo+json'
-AUTH = {'api-key': '00bc11acbd9c2690eb453a51b335bbcdd8652ba9'}
 """
 Download Images. Sizes 5: tiny 360 x 272, small 640 x 480, medium 960 x 720, large 1280 x 960,
         Native:
@@ -22,15 +22,14 @@ Download Images. Sizes 5: tiny 360 x 272, small 640 x 480, medium 960 x 720, lar
 
 GET https://api.carmera.com/v1/images/{image_id}/download/?apikey={your-api-key}&size=small
 """
-image_object = Image('00bc11acbd9c2690eb453a51b335bbcdd8652ba9')
-image_object.download_images_coordinates(points=AOI, radius=1000, url_save=DISK)
 
-url = 'https://api.carmera.com/v1/images/{image_id}/download/?apikey={your-api-key}&size=small'
-try:
-        connection = requests.get(URL, headers=headers)
-        print('Test:', connection.status_code)
-        print('Test:', connection.content)
-        print('Test:', connection.url)
-        print('Test:', connection.status_code)
-except Exception as e:
-        print(e.__str__())
\ No newline at end of file
+if __name__ == '__main__':
+    """
+    Images captured 7 days ago in the East Village -> Download -> Resize to 640 width -> Ping for each image.
+    All the steps run at the same time, see Pipeline. The same as:
+    python -m source.Cli --key KEY thumbnail --aoi '[[[lon,lat],...]]' --range '...' --out THUMBNAIL --width 640
+    """
+    day = datetime.date.today() - datetime.timedelta(days=7)
+    sys.exit(main(['--key', KEY, 'thumbnail', '--aoi', json.dumps(EAST_VILLAGE),
+                   '--range', '{0} 00:00:00,{0} 23:59:59'.format(day.isoformat()),
+                   '--out', THUMBNAIL, '--width', '640', '--url', URL]))
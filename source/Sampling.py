@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import numpy as np
+
+from source.Catalog import Catalog
+from source.Spatial import haversine, iso
+
+
+""" Choose the images to download from the results of a search, before any download.
+    A camera stopped in traffic takes the same picture every second, a camera on a highway one every 30 meters.
+    Every drive (the frames of one camera and one position, without a long pause) is walked by capture time and one
+    frame is kept every 'meters' of travel, so the images kept grow with the ground covered, not with the time.
+    The distance run while the speed is under 'min_speed' does not count, the GPS noise of a stopped car is not a
+    drive. All the work is done with NumPy over the whole result set, no loop per image. The search is streamed into
+    the typed columns of a Catalog, the feature dicts are never kept.
+    ids = plan(Catalog.from_features(images), meters=10)
+    for image in sample(images, meters=10): ...
+"""
+
+METERS = 10.0
+MIN_SPEED = 0.5     # Meters/sec, slower is stopped.
+MAX_GAP = 300       # Seconds without a frame that end a drive.
+
+
+def drives(catalog, order, max_gap=MAX_GAP):
+    """
+    :param catalog: Catalog of the images.
+    :param order: Rows of the catalog sorted by camera, position and capture time.
+    :param max_gap: Seconds without a frame that end a drive.
+    :return: Numpy array of bool, True for the first frame of every drive, in the same order.
+    """
+    first = np.ones(len(order), dtype=bool)
+    if len(order) > 1:
+        camera, position, captured = catalog.camera[order], catalog.position[order], catalog.captured[order]
+        first[1:] = ((camera[1:] != camera[:-1]) | (position[1:] != position[:-1]) |
+                     (captured[1:] - captured[:-1] > max_gap))
+    return first
+
+
+def plan(catalog, meters=METERS, min_speed=MIN_SPEED, max_gap=MAX_GAP):
+    """
+    :param catalog: Catalog of the images found, e.g. Catalog.from_features(images)
+    :param meters: One frame every 'meters' of travel, per camera and position.
+    :param min_speed: Meters/sec. The travel under it is not counted. None, count all the travel.
+    :param max_gap: Seconds without a frame that end a drive.
+    :return: Numpy array of the IDs of the frames kept, sorted by camera, position and capture time.
+    """
+    if not len(catalog):
+        return np.zeros(0, dtype=np.int64)
+    order = np.lexsort((catalog.captured, catalog.position, catalog.camera))
+    first = drives(catalog, order, max_gap)
+    lon = catalog.lon[order].astype(np.float64)
+    lat = catalog.lat[order].astype(np.float64)
+    step = np.zeros(len(order))
+    step[1:] = haversine(lon[1:], lat[1:], lon[:-1], lat[:-1])
+    if min_speed is not None:
+        step[catalog.speed[order] < min_speed] = 0.0
+    step[first] = 0.0
+    travel = np.cumsum(step)
+    # Travel since the start of the drive: subtract the travel at its first frame.
+    start = np.maximum.accumulate(np.where(first, np.arange(len(order)), 0))
+    bucket = np.floor((travel - travel[start]) / meters).astype(np.int64)
+    # The travel never goes back inside a drive, so the first frame of every bucket is where the bucket changes.
+    keep = first.copy()
+    keep[1:] |= bucket[1:] != bucket[:-1]
+    return catalog.ids[order[keep]]
+
+
+def sample(images, meters=METERS, min_speed=MIN_SPEED, max_gap=MAX_GAP):
+    """
+    :param images: Iterable of image features, e.g. Image.stream_images(...) or AOI.stream(...). Consumed in batches
+                   into a Catalog, only its columns are kept.
+    :return: Generator of the images kept by plan, in its order. Small features rebuilt from the columns: id,
+             coordinates, captured_on, speed, position and camera.
+    """
+    catalog = Catalog.from_features(images)
+    kept = plan(catalog, meters, min_speed, max_gap)
+    for row in catalog.positions(kept):
+        yield {'type': 'Feature',
+               'geometry': {'type': 'Point', 'coordinates': [float(catalog.lon[row]), float(catalog.lat[row])]},
+               'properties': {'id': int(catalog.ids[row]), 'captured_on': iso(catalog.captured[row]),
+                              'speed': float(catalog.speed[row]), 'position': int(catalog.position[row]),
+                              'camera': int(catalog.camera[row])}}
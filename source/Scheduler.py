@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import random
+import threading
+import time
+
+import requests
+
+
+class TokenBucket(object):
+    """
+    Allow 'rate' requests per second on average, and bursts of 'burst' requests after a quiet time.
+    """
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: Requests per second. None, no limit.
+        :param burst: Max requests at once. None, one second of requests.
+        """
+        self.rate = rate
+        self.burst = burst or max(1.0, rate or 1.0)
+        self.tokens = self.burst
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Wait until there is a token and take it.
+        :return: Seconds waited.
+        """
+        waited = 0.0
+        while self.rate:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+        return waited
+
+
+class Scheduler(object):
+    """
+    Every request to the API goes through one Scheduler: a token bucket for the rate, a limit of requests at the
+    same time that grows slowly while the server answers well and halves on a 429 or a 5xx (the rate too), and
+    retries with exponential backoff and random jitter. Share it between all the services of the same API.
+    """
+    def __init__(self, rate=100.0, burst=None, concurrency=16, min_concurrency=1, retries=5, backoff=0.5,
+                 max_backoff=30.0):
+        """
+        :param rate: Max requests per second. None, no limit.
+        :param burst: Max requests at once after a quiet time. None, one second of requests.
+        :param concurrency: Max requests at the same time.
+        :param min_concurrency: The limit never goes under it.
+        :param retries: Attempts after the first one, for a 429, a 5xx or a connection error.
+        :param backoff: Seconds of the first wait between attempts, it doubles every attempt, with random jitter.
+        :param max_backoff: Max seconds to wait between attempts.
+        """
+        self.max_rate = rate
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max(1, concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.active = 0
+        self.condition = threading.Condition()
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = {'requests': 0, 'ok': 0, 'failed': 0, 'retries': 0, 'throttled': 0, 'waited': 0.0}
+
+    @staticmethod
+    def status(e):
+        """
+        :param e: Exception of a request.
+        :return: HTTP code of the error, None when there is no answer from the server.
+        """
+        code = getattr(e, 'code', None)
+        if code is None and getattr(e, 'response', None) is not None:
+            code = e.response.status_code
+        return code
+
+    @staticmethod
+    def retryable(e):
+        """
+        :return: True for a 429, a 5xx, a timeout or a connection error. The other errors never change on retry.
+        """
+        code = Scheduler.status(e)
+        if code is None:
+            return isinstance(e, (requests.ConnectionError, requests.Timeout))
+        return code == 429 or code >= 500
+
+    def enter(self):
+        with self.condition:
+            while self.active >= int(self.limit):
+                self.condition.wait()
+            self.active += 1
+
+    def leave(self, ok):
+        """
+        :param ok: False when the server asked to slow down.
+        """
+        with self.condition:
+            self.active -= 1
+            if ok:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+                if self.max_rate and self.bucket.rate < self.max_rate:
+                    self.bucket.rate = min(self.max_rate, self.bucket.rate * 1.05)
+            else:
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                if self.max_rate:
+                    self.bucket.rate = max(self.max_rate / 100.0, self.bucket.rate / 2)
+            self.condition.notify_all()
+
+    def wait(self, attempt, e):
+        """
+        Sleep before the next attempt, the time asked by the server in Retry-After when there is one.
+        """
+        try:
+            delay = min(self.max_backoff, float(getattr(e, 'retry_after', None)))
+        except (TypeError, ValueError):
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+            delay = random.uniform(delay / 2, delay)
+        with self.condition:
+            self.stats['waited'] += delay
+        time.sleep(delay)
+
+    def call(self, function, *args, **kwargs):
+        """
+        Run a request when the rate and the concurrency allow it, and again while it fails with a 429, a 5xx or a
+        connection error.
+        :param function: Function making the request.
+        :return: What the function returns. Raise the last error when all the attempts fail.
+        """
+        attempt = 0
+        while True:
+            waited = self.bucket.acquire()
+            self.enter()
+            with self.condition:
+                self.stats['requests'] += 1
+                self.stats['waited'] += waited
+            try:
+                result = function(*args, **kwargs)
+            except Exception as e:
+                retry = Scheduler.retryable(e)
+                throttled = retry and Scheduler.status(e) is not None
+                self.leave(not retry)
+                with self.condition:
+                    if throttled:
+                        self.stats['throttled'] += 1
+                    if retry and attempt < self.retries:
+                        self.stats['retries'] += 1
+                    else:
+                        self.stats['failed'] += 1
+                if not retry or attempt >= self.retries:
+                    raise
+                self.wait(attempt, e)
+                attempt += 1
+                continue
+            self.leave(True)
+            with self.condition:
+                self.stats['ok'] += 1
+            return result
+
+    def metrics(self):
+        """
+        :return: Dict with the stats, the current limit of requests at the same time and the current rate.
+        """
+        with self.condition:
+            metrics = dict(self.stats)
+            metrics['concurrency'] = self.limit
+            metrics['rate'] = self.bucket.rate
+        return metrics
+
+
+class Throttled(object):
+    """
+    Service of the carmera client with every method going through a Scheduler.
+    """
+    def __init__(self, service, scheduler):
+        self.service = service
+        self.scheduler = scheduler
+
+    def __getattr__(self, name):
+        attr = getattr(self.service, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self.scheduler.call(attr, *args, **kwargs)
+        return call
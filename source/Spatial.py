@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import numpy as np
+
+from source.Paginator import image_id
+from source.Sync import captured_on
+
+
+""" Offline queries over the metadata of the images already harvested, no request to the API.
+    index = SpatialIndex.from_features(Image.stream_images(image, options))
+    index.save('east_village.npz')
+    index = SpatialIndex.load('east_village.npz')
+    index.polygon([[[lon,lat],[lon,lat],[lon,lat],[lon,lat]]], range='2017-01-17,2017-01-18')  -> array of IDs
+    index.radius(-73.9865, 40.728, 300)                                                       -> array of IDs
+    The points are kept sorted by the cell of a regular lon/lat grid, so a query only tests the points of the cells
+    that touch its bounding box. The tests are vectorized with NumPy.
+"""
+
+EARTH_RADIUS = 6371000.0
+CELL = 0.001        # Degrees, about 110 meters of latitude.
+
+
+def timestamps(values):
+    """
+    :param values: Capture times 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DDTHH:MM:SS...'
+    :return: Numpy array of int64, seconds since 1970.
+    """
+    values = [str(v).replace('T', ' ')[:19] for v in values]
+    return np.array(values, dtype='datetime64[s]').astype(np.int64)
+
+
+def time_window(range):
+    """
+    :param range: 'start,end' like the 'range' search option. A day alone is the whole day.
+    :return: (start, end) in seconds since 1970, both included.
+    """
+    start, end = [v.strip() for v in range.split(',')]
+    if len(start) == 10:
+        start += ' 00:00:00'
+    if len(end) == 10:
+        end += ' 23:59:59'
+    return tuple(timestamps([start, end]))
+
+
+def iso(seconds):
+    """
+    :param seconds: Seconds since 1970.
+    :return: 'YYYY-MM-DD HH:MM:SS'
+    """
+    return str(np.datetime64(int(seconds), 's')).replace('T', ' ')
+
+
+def haversine(lon, lat, lon0, lat0):
+    """
+    :param lon: Numpy array of longitudes.
+    :param lat: Numpy array of latitudes.
+    :return: Numpy array of the distances in meters to (lon0, lat0).
+    """
+    lon, lat = np.radians(lon), np.radians(lat)
+    lon0, lat0 = np.radians(lon0), np.radians(lat0)
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat) * np.cos(lat0) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def inside(lon, lat, polygon):
+    """
+    Ray casting, all the points at once, one edge at a time.
+    :param lon: Numpy array of longitudes.
+    :param lat: Numpy array of latitudes.
+    :param polygon: [[[lon,lat],[lon,lat],...]] GeoJSON Polygon, the holes after the outer ring are excluded.
+    :return: Numpy array of bool, True for the points inside the polygon.
+    """
+    result = np.zeros(len(lon), dtype=bool)
+    for n, ring in enumerate(polygon):
+        ring = np.asarray(ring, dtype=np.float64)
+        x1, y1 = ring[:, 0], ring[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        crossing = np.zeros(len(lon), dtype=bool)
+        for i in range(len(ring)):
+            if y1[i] == y2[i]:
+                continue
+            x = (x2[i] - x1[i]) * (lat - y1[i]) / (y2[i] - y1[i]) + x1[i]
+            crossing ^= ((y1[i] > lat) != (y2[i] > lat)) & (lon < x)
+        result = crossing if n == 0 else result & ~crossing
+    return result
+
+
+class SpatialIndex(object):
+    """
+    Longitude, latitude, capture time and speed of every image, in NumPy arrays sorted by grid cell.
+    """
+    def __init__(self, ids, lon, lat, captured, speed, cell=CELL):
+        """
+        :param ids: Image IDs, integers.
+        :param lon: Longitudes.
+        :param lat: Latitudes.
+        :param captured: Capture times in seconds since 1970, see timestamps.
+        :param speed: Speeds in meters/sec.
+        :param cell: Size of the cells of the grid, in degrees.
+        """
+        self.cell = float(cell)
+        self.columns = int(np.ceil(360.0 / self.cell)) + 1
+        ids = np.asarray(ids, dtype=np.int64)
+        # The last copy of an ID wins, so the metadata of a later harvest replaces the old one.
+        _, last = np.unique(ids[::-1], return_index=True)
+        keep = len(ids) - 1 - last
+        lon = np.asarray(lon, dtype=np.float64)[keep]
+        lat = np.asarray(lat, dtype=np.float64)[keep]
+        keys = self.keys(lon, lat)
+        order = np.argsort(keys, kind='stable')
+        self.keys_sorted = keys[order]
+        self.ids = ids[keep][order]
+        self.lon = lon[order]
+        self.lat = lat[order]
+        self.captured = np.asarray(captured, dtype=np.int64)[keep][order]
+        self.speed = np.asarray(speed, dtype=np.float32)[keep][order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def keys(self, lon, lat):
+        """
+        :return: Numpy array with the grid cell of every point.
+        """
+        col = np.floor((np.asarray(lon) + 180.0) / self.cell).astype(np.int64)
+        row = np.floor((np.asarray(lat) + 90.0) / self.cell).astype(np.int64)
+        return row * self.columns + col
+
+    @staticmethod
+    def from_features(features, cell=CELL):
+        """
+        :param features: Iterable of image features, e.g. Image.stream_images(...) or a page of a search.
+        :param cell: Size of the cells of the grid, in degrees.
+        :return: SpatialIndex
+        """
+        ids, lon, lat, captured, speed = [], [], [], [], []
+        for feature in features:
+            ids.append(int(image_id(feature)))
+            coordinates = feature['geometry']['coordinates']
+            lon.append(coordinates[0])
+            lat.append(coordinates[1])
+            captured.append(captured_on(feature))
+            speed.append(feature['properties'].get('speed') or 0.0)
+        return SpatialIndex(ids, lon, lat, timestamps(captured), speed, cell=cell)
+
+    def add(self, other):
+        """
+        :param other: SpatialIndex with new images, the images already indexed are replaced.
+        :return: New SpatialIndex with the images of both.
+        """
+        return SpatialIndex(np.concatenate([self.ids, other.ids]), np.concatenate([self.lon, other.lon]),
+                            np.concatenate([self.lat, other.lat]), np.concatenate([self.captured, other.captured]),
+                            np.concatenate([self.speed, other.speed]), cell=self.cell)
+
+    def candidates(self, west, south, east, north):
+        """
+        :return: Numpy array with the positions of the points in the cells touching the bounding box. A box that
+                 crosses the antimeridian (west > east, or a side out of -180 ... 180) is split in two.
+        """
+        if east - west >= 360.0:
+            west, east = -180.0, 180.0
+        elif west < -180.0 or east > 180.0:
+            west, east = (west + 180.0) % 360.0 - 180.0, (east + 180.0) % 360.0 - 180.0
+        if west > east:
+            return np.concatenate([self.candidates(west, south, 180.0, north),
+                                   self.candidates(-180.0, south, east, north)])
+        south, north = max(south, -90.0), min(north, 90.0)
+        col0, row0 = [int(v) for v in np.floor((np.array([west, south]) + [180.0, 90.0]) / self.cell)]
+        col1, row1 = [int(v) for v in np.floor((np.array([east, north]) + [180.0, 90.0]) / self.cell)]
+        rows = np.arange(row0, row1 + 1, dtype=np.int64) * self.columns
+        # One contiguous run of keys per row of cells.
+        starts = np.searchsorted(self.keys_sorted, rows + col0, side='left')
+        ends = np.searchsorted(self.keys_sorted, rows + col1, side='right')
+        lengths = ends - starts
+        if lengths.sum() == 0:
+            return np.zeros(0, dtype=np.int64)
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(lengths.sum())
+
+    def filter(self, positions, range=None, min_speed=None, max_speed=None):
+        """
+        :return: Positions of the points in the time window and the speeds given.
+        """
+        mask = np.ones(len(positions), dtype=bool)
+        if range is not None:
+            start, end = time_window(range)
+            captured = self.captured[positions]
+            mask &= (captured >= start) & (captured <= end)
+        if min_speed is not None:
+            mask &= self.speed[positions] >= min_speed
+        if max_speed is not None:
+            mask &= self.speed[positions] <= max_speed
+        return positions[mask]
+
+    def result(self, positions):
+        """
+        :return: IDs of the points, ordered by capture time.
+        """
+        return self.ids[positions[np.argsort(self.captured[positions], kind='stable')]]
+
+    def polygon(self, polygon, range=None, min_speed=None, max_speed=None):
+        """
+        :param polygon: [[[lon,lat],[lon,lat],...]]
+        :param range: Optional time window 'start,end'
+        :param min_speed: Optional min speed.
+        :param max_speed: Optional max speed.
+        :return: Numpy array of the IDs of the images inside the polygon, ordered by capture time.
+        """
+        ring = np.asarray(polygon[0], dtype=np.float64)
+        positions = self.candidates(ring[:, 0].min(), ring[:, 1].min(), ring[:, 0].max(), ring[:, 1].max())
+        positions = self.filter(positions, range, min_speed, max_speed)
+        positions = positions[inside(self.lon[positions], self.lat[positions], polygon)]
+        return self.result(positions)
+
+    def radius(self, lon, lat, meters, range=None, min_speed=None, max_speed=None):
+        """
+        :param lon: Longitude of the center.
+        :param lat: Latitude of the center.
+        :param meters: Radius in meters.
+        :return: Numpy array of the IDs of the images in the circle, ordered by capture time.
+        """
+        dlat = np.degrees(meters / EARTH_RADIUS)
+        dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+        positions = self.candidates(lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+        positions = self.filter(positions, range, min_speed, max_speed)
+        positions = positions[haversine(self.lon[positions], self.lat[positions], lon, lat) <= meters]
+        return self.result(positions)
+
+    def window(self, range, min_speed=None, max_speed=None):
+        """
+        :param range: Time window 'start,end'
+        :return: Numpy array of the IDs of all the images in the time window, ordered by capture time.
+        """
+        positions = self.filter(np.arange(len(self.ids)), range, min_speed, max_speed)
+        return self.result(positions)
+
+    def positions(self, ids):
+        """
+        :param ids: IDs of images indexed.
+        :return: Numpy array with the position of every ID in the arrays of the index. KeyError when an ID is not
+                 indexed.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        order = np.argsort(self.ids, kind='stable')
+        i = np.minimum(np.searchsorted(self.ids[order], ids), max(len(self.ids) - 1, 0))
+        if not len(self.ids) or not np.all(self.ids[order][i] == ids):
+            missing = np.setdiff1d(ids, self.ids)
+            if len(missing):
+                raise KeyError('Images not indexed: {}'.format(', '.join(str(v) for v in missing[:10])))
+        return order[i]
+
+    def save(self, path):
+        """
+        :param path: File, '.npz'
+        """
+        np.savez(path, ids=self.ids, lon=self.lon, lat=self.lat, captured=self.captured, speed=self.speed,
+                 cell=np.float64(self.cell))
+
+    @staticmethod
+    def load(path):
+        """
+        :param path: File saved with save.
+        :return: SpatialIndex
+        """
+        with np.load(path) as data:
+            return SpatialIndex(data['ids'], data['lon'], data['lat'], data['captured'], data['speed'],
+                                cell=float(data['cell']))
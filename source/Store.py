@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import mmap
+import os
+import re
+import sqlite3
+import threading
+
+try:
+    import fcntl
+except ImportError:     # Windows, only one process may write to a store.
+    fcntl = None
+
+
+""" Thumbnails packed in a few big files instead of one file per image.
+    thumbnails/index.db             SQLite, name -> (segment, offset, length)
+    thumbnails/segment-000000.dat   The JPEG files one after the other, only appended.
+    A thumbnail is written to the end of the last segment first, and added to the index after, in one transaction:
+    a reader finds all of it or nothing. The segments are read with mmap, get() answers a memoryview of the mapped
+    file, no copy, and cv2.imdecode reads it as it is. A thumbnail written again, or deleted, leaves its old bytes in
+    the segment until compact() rewrites the live thumbnails to new segments.
+    Many processes can read and write the same store: the index is SQLite in WAL mode and the appends are done
+    under a file lock.
+"""
+
+INDEX = 'index.db'
+LOCK = 'lock'
+SEGMENT = 'segment-{:06d}.dat'
+SEGMENT_RE = re.compile(r'^segment-(\d{6})\.dat$')
+SEGMENT_SIZE = 256 * 1024 * 1024
+
+
+def is_store(folder):
+    """
+    :return: True when the folder is a ThumbnailStore.
+    """
+    return os.path.isfile(os.path.join(folder, INDEX))
+
+
+def sources(folder):
+    """
+    :param folder: Folder of images, or of a ThumbnailStore.
+    :return: Paths of the files of the folder, sorted. Tuples (name, bytes) for a store, in the order of the segments.
+    """
+    if is_store(folder):
+        return _items(folder)
+    return (os.path.join(folder, f) for f in sorted(os.listdir(folder)))
+
+
+def _items(folder):
+    """
+    :return: Generator of the items of the store of the folder. The store is closed when the generator ends, or when
+             it is closed or collected before the end.
+    """
+    with ThumbnailStore(folder) as store:
+        for item in store.items():
+            yield item
+
+
+class ThumbnailStore(object):
+    """
+    Append only segments of images plus a SQLite index of name -> (segment, offset, length). Thread safe.
+    """
+    def __init__(self, folder, segment_size=SEGMENT_SIZE, sync=False):
+        """
+        :param folder: Folder of the store, created when it does not exist.
+        :param segment_size: Bytes of a segment before a new one is started.
+        :param sync: fsync every append, the thumbnails survive a power failure. Slower.
+        """
+        self.folder = folder
+        self.segment_size = segment_size
+        self.sync = sync
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        self.lock = threading.RLock()
+        self.maps = {}          # segment -> mmap, remapped when the segment grows.
+        self.db = sqlite3.connect(os.path.join(folder, INDEX), check_same_thread=False, timeout=60)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous={}'.format('FULL' if sync else 'NORMAL'))
+        self.db.execute('CREATE TABLE IF NOT EXISTS thumbnails '
+                        '(name TEXT PRIMARY KEY, segment INTEGER, offset INTEGER, length INTEGER)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS thumbnails_position ON thumbnails (segment, offset)')
+        self.db.commit()
+        self.stats = {'put': 0, 'get': 0, 'missing': 0, 'bytes_written': 0}
+
+    def path(self, segment):
+        return os.path.join(self.folder, SEGMENT.format(segment))
+
+    def segments(self):
+        """
+        :return: Numbers of the segment files, sorted.
+        """
+        found = (SEGMENT_RE.match(f) for f in os.listdir(self.folder))
+        return sorted(int(m.group(1)) for m in found if m)
+
+    def writing(self):
+        """
+        Context manager for the appends: the lock of the threads and the file lock of the processes.
+        """
+        return WriteLock(self)
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM thumbnails').fetchone()[0]
+
+    def __contains__(self, name):
+        with self.lock:
+            return self.db.execute('SELECT 1 FROM thumbnails WHERE name = ?', (name,)).fetchone() is not None
+
+    def append(self, items):
+        """
+        Write the images at the end of the last segment. Called with the write lock.
+        :param items: List of (name, bytes).
+        :return: List of rows (name, segment, offset, length) for the index.
+        """
+        segments = self.segments()
+        segment = segments[-1] if segments else 0
+        rows = []
+        f = open(self.path(segment), 'ab')
+        try:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            for name, data in items:
+                if offset > 0 and offset + len(data) > self.segment_size:
+                    self.flush(f)
+                    f.close()
+                    segment += 1
+                    f = open(self.path(segment), 'ab')
+                    offset = 0
+                f.write(data)
+                rows.append((name, segment, offset, len(data)))
+                offset += len(data)
+            self.flush(f)
+        finally:
+            f.close()
+        return rows
+
+    def flush(self, f):
+        f.flush()
+        if self.sync:
+            os.fsync(f.fileno())
+
+    def put(self, name, data):
+        """
+        :param name: Name of the image, e.g. '1234.jpg'. An image with the same name is replaced.
+        :param data: bytes of the image.
+        """
+        self.put_many([(name, data)])
+
+    def put_many(self, items):
+        """
+        Append many images with one transaction of the index, much faster than put for every image.
+        :param items: Iterable of (name, bytes). ValueError for an empty image, nothing is written then.
+        """
+        items = [(name, bytes(data)) for name, data in items]
+        if not items:
+            return
+        empty = [name for name, data in items if not data]
+        if empty:
+            raise ValueError('Image {} is empty'.format(empty[0]))
+        with self.writing():
+            rows = self.append(items)
+            self.db.executemany('INSERT OR REPLACE INTO thumbnails (name, segment, offset, length) '
+                                'VALUES (?, ?, ?, ?)', rows)
+            self.db.commit()
+            self.stats['put'] += len(rows)
+            self.stats['bytes_written'] += sum(row[3] for row in rows)
+
+    def delete(self, name):
+        """
+        Remove an image from the index. Its bytes are freed by compact().
+        """
+        with self.writing():
+            self.db.execute('DELETE FROM thumbnails WHERE name = ?', (name,))
+            self.db.commit()
+
+    def view(self, segment, offset, length):
+        """
+        :return: memoryview of the bytes of the segment, no copy.
+        """
+        mm = self.maps.get(segment)
+        if mm is None or len(mm) < offset + length:
+            # The views already given keep the old map alive, it is closed when the last one is released.
+            with open(self.path(segment), 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[segment] = mm
+        return memoryview(mm)[offset:offset + length]
+
+    def get(self, name):
+        """
+        :param name: Name of the image.
+        :return: memoryview of the bytes of the image, None when it is not in the store.
+        """
+        for attempt in range(2):
+            with self.lock:
+                row = self.db.execute('SELECT segment, offset, length FROM thumbnails WHERE name = ?',
+                                      (name,)).fetchone()
+                if row is None:
+                    self.stats['missing'] += 1
+                    return None
+                try:
+                    view = self.view(*row)
+                    self.stats['get'] += 1
+                    return view
+                except (IOError, OSError, ValueError):
+                    # The segment was removed by a compaction of other process, the index has the new place.
+                    self.maps.pop(row[0], None)
+                    if attempt:
+                        raise
+        return None
+
+    def decode(self, name, width=None, gray=False):
+        """
+        :param name: Name of the image.
+        :param width: Width needed, a JPEG is decoded at 1/2, 1/4 or 1/8 when it is enough. None, the full image.
+        :param gray: Decode to gray scale.
+        :return: Numpy array, None when the image is not in the store or it can not be decoded.
+        """
+        from source.Processing.Thumbnail import decode
+        view = self.get(name)
+        return None if view is None else decode(view, width, gray=gray)
+
+    def scan(self, batch=1000):
+        """
+        All the images in the order of the segments, a sequential read of the files.
+        :param batch: Rows of the index read at once.
+        :return: Generator of (name, memoryview).
+        """
+        last = (-1, -1)
+        while True:
+            with self.lock:
+                rows = self.db.execute('SELECT name, segment, offset, length FROM thumbnails '
+                                       'WHERE segment > ? OR (segment = ? AND offset > ?) ORDER BY segment, offset '
+                                       'LIMIT ?', (last[0], last[0], last[1], batch)).fetchall()
+            if not rows:
+                return
+            for name, segment, offset, length in rows:
+                yield name, self.view(segment, offset, length)
+            last = rows[-1][1:3]
+
+    def items(self):
+        """
+        :return: Generator of (name, bytes), for the pools of processes. See scan for no copy.
+        """
+        for name, view in self.scan():
+            yield name, view.tobytes()
+
+    def names(self):
+        with self.lock:
+            return [row[0] for row in self.db.execute('SELECT name FROM thumbnails ORDER BY segment, offset')]
+
+    def size(self):
+        """
+        :return: Dict with the bytes of the segments, the bytes of the live images and the rest, free on compact.
+        """
+        with self.lock:
+            live = self.db.execute('SELECT COALESCE(SUM(length), 0) FROM thumbnails').fetchone()[0]
+        total = sum(os.path.getsize(self.path(s)) for s in self.segments())
+        return {'images': len(self), 'bytes': total, 'live_bytes': live, 'garbage_bytes': total - live}
+
+    def compact(self):
+        """
+        Copy the live images to new segments, and remove the old ones. The readers see the old place or the new one,
+        never a mix: the index is updated in one transaction, after the copy.
+        :return: Dict with the bytes before and after.
+        """
+        with self.writing():
+            before = self.size()
+            old = self.segments()
+            rows = self.db.execute('SELECT name, segment, offset, length FROM thumbnails '
+                                   'ORDER BY segment, offset').fetchall()
+            segment = old[-1] + 1 if old else 0
+            offset = 0
+            f = open(self.path(segment), 'ab')
+            moved = []
+            try:
+                for name, src, src_offset, length in rows:
+                    if offset > 0 and offset + length > self.segment_size:
+                        self.flush(f)
+                        f.close()
+                        segment += 1
+                        f = open(self.path(segment), 'ab')
+                        offset = 0
+                    f.write(self.view(src, src_offset, length))
+                    moved.append((segment, offset, name))
+                    offset += length
+                self.flush(f)
+            finally:
+                f.close()
+            self.db.executemany('UPDATE thumbnails SET segment = ?, offset = ? WHERE name = ?', moved)
+            self.db.commit()
+            for s in old:
+                self.maps.pop(s, None)
+                os.remove(self.path(s))
+            after = self.size()
+        return {'images': after['images'], 'bytes_before': before['bytes'], 'bytes_after': after['bytes']}
+
+    def close(self):
+        with self.lock:
+            self.maps.clear()
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class WriteLock(object):
+    """
+    Lock of the threads of the store, and lock file of the folder for the other processes.
+    """
+    def __init__(self, store):
+        self.store = store
+        self.f = None
+
+    def __enter__(self):
+        self.store.lock.acquire()
+        if fcntl is not None:
+            self.f = open(os.path.join(self.store.folder, LOCK), 'a')
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        if self.f is not None:
+            fcntl.flock(self.f.fileno(), fcntl.LOCK_UN)
+            self.f.close()
+            self.f = None
+        self.store.lock.release()
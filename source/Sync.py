@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+__author__ = 'Rainer Arencibia'
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+import datetime
+import json
+import sqlite3
+
+from source.Paginator import image_id
+
+
+def captured_on(image):
+    """
+    :param image: An image feature
+    :return: Capture time as 'YYYY-MM-DD HH:MM:SS', the format of the 'range' search option.
+    """
+    return str(image['properties']['captured_on']).replace('T', ' ')[:19]
+
+
+class Sync(object):
+    """
+    Keep, for every AOI, the last capture time already harvested (watermark) and the IDs already downloaded, on a
+    local SQLite file. Later runs only ask for the images captured after the watermark, and skip the images already
+    on disk. The watermark only moves over images that are all downloaded, so a crashed or failed run is repeated
+    from the first image it did not save.
+    """
+    def __init__(self, path):
+        """
+        :param path: SQLite file with the state of the AOIs.
+        """
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS watermark (aoi TEXT PRIMARY KEY, captured_on TEXT)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS downloaded '
+                        '(aoi TEXT, image_id TEXT, PRIMARY KEY (aoi, image_id))')
+        self.db.commit()
+
+    @staticmethod
+    def aoi_key(aoi):
+        """
+        :param aoi: Name of the AOI or the polygon [[[lon,lat],[lon,lat],[lon,lat],[lon,lat]]]
+        :return: Key of the AOI on the state file.
+        """
+        if isinstance(aoi, str):
+            return aoi
+        return json.dumps(aoi, separators=(',', ':'))
+
+    def watermark(self, aoi):
+        """
+        :param aoi: Key of the AOI.
+        :return: Last capture time harvested, None for a new AOI.
+        """
+        row = self.db.execute('SELECT captured_on FROM watermark WHERE aoi = ?', (aoi,)).fetchone()
+        return row[0] if row else None
+
+    def range(self, aoi, until=None):
+        """
+        :param aoi: Key of the AOI.
+        :param until: End of the range, datetime. Default now in UTC.
+        :return: Value for the 'range' search option with the images not harvested yet, None for a new AOI.
+        """
+        start = self.watermark(aoi)
+        if start is None:
+            return None
+        until = until or datetime.datetime.utcnow()
+        return '{},{}'.format(start, until.strftime('%Y-%m-%d %H:%M:%S'))
+
+    def downloaded(self, aoi):
+        """
+        :param aoi: Key of the AOI.
+        :return: Set with the IDs already downloaded.
+        """
+        return set(row[0] for row in self.db.execute('SELECT image_id FROM downloaded WHERE aoi = ?', (aoi,)))
+
+    def checkpoint(self, aoi, image_ids, watermark):
+        """
+        Save the IDs downloaded and move the watermark, in one transaction.
+        :param aoi: Key of the AOI.
+        :param image_ids: IDs downloaded since the last checkpoint.
+        :param watermark: New watermark, None to keep the current one.
+        """
+        with self.db:
+            self.db.executemany('INSERT OR IGNORE INTO downloaded (aoi, image_id) VALUES (?, ?)',
+                                [(aoi, str(i)) for i in image_ids])
+            if watermark is not None:
+                self.db.execute('INSERT OR REPLACE INTO watermark (aoi, captured_on) VALUES (?, ?)',
+                                (aoi, watermark))
+
+    def run(self, aoi, images, downloader, url_save, batch=500, width=None):
+        """
+        Download the images not downloaded yet, saving the state after every batch.
+        :param aoi: Key of the AOI.
+        :param images: Image features sorted by 'captured_on' ascending, e.g. Image.stream_images(...)
+        :param downloader: Downloader object.
+        :param url_save: Location to save the images.
+        :param batch: Number of images between two checkpoints.
+        :param width: Width of the images saved, None for the native size.
+        :return: List of DownloadResult of the images downloaded on this run.
+        """
+        done = self.downloaded(aoi)
+        results = []
+        pending = []
+        complete = True     # False after the first failed image, the watermark can not move over it.
+
+        def flush():
+            new = [image_id(image) for image in pending if str(image_id(image)) not in done]
+            saved = downloader.download_all(new, url_save, width=width)
+            failed = set(r.image_id for r in saved if not r.ok)
+            results.extend(saved)
+            watermark = None
+            for image in pending:
+                if image_id(image) in failed:
+                    return [r.image_id for r in saved if r.ok], watermark, False
+                watermark = captured_on(image)
+            return [r.image_id for r in saved if r.ok], watermark, True
+
+        for image in images:
+            pending.append(image)
+            if len(pending) >= batch:
+                ids, watermark, ok = flush()
+                self.checkpoint(aoi, ids, watermark if complete else None)
+                complete = complete and ok
+                done.update(str(i) for i in ids)
+                pending = []
+        if pending:
+            ids, watermark, ok = flush()
+            self.checkpoint(aoi, ids, watermark if complete else None)
+        return results
+
+    def close(self):
+        self.db.close()
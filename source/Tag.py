@@ -1,4 +1,4 @@
-from carmera import Carmera
+from source.Api import get_scheduler, get_service
 # -*- coding: utf-8 -*-
 __author__ = 'Rainer Arencibia'
 
@@ -48,10 +48,14 @@ class Tag(object):
     On this class we implements the Object Tag from source to call the API methods + adding the error message, and
     others objects useful for a better and safety use of the API.
     """
-    def __init__(self, key):
-
-        cm = Carmera(api_key=str(key))
-        self.tag = cm.Tag()
+    def __init__(self, key, url=None, scheduler=None):
+        """
+        :param key: API key.
+        :param url: Base URL of the API, e.g. a local MockCarmera. None, the carmera client.
+        :param scheduler: Scheduler of the requests. None, the one shared by all the services of the same API.
+        """
+        self.scheduler = scheduler or get_scheduler(url)
+        self.tag = get_service(key, 'Tag', url=url, scheduler=self.scheduler)
         self.tag_id_set = set()     # A set for IDs, to avoid duplicate images in any search. Efficient in space & time.
 
     @staticmethod
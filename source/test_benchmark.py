@@ -0,0 +1,36 @@
+from unittest import TestCase
+from source import Benchmark
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class TestBenchmark(TestCase):
+
+    def test_run(self):
+        results = Benchmark.run(images=40, page_size=16, workers=4, processes=1, width=200)
+        self.assertEqual(results['search']['images'], 40)
+        self.assertEqual(results['download']['ok'], 40)
+        self.assertEqual(results['thumbnail']['ok'], 40)
+        self.assertEqual(results['ping']['sent'], 40)
+        self.assertEqual(results['ping_batch']['sent'], 40)
+        self.assertEqual(results['pipeline']['ping']['items'], 40)
+        self.assertEqual(results['server']['errors'], 0)
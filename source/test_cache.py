@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+from source.Cache import SEARCH_TTL, Cache
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class Response(object):
+    def __init__(self, feature_collection):
+        self.feature_collection = feature_collection
+
+    def json(self):
+        return self.feature_collection
+
+
+class TestCache(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_get_set(self):
+        cache = Cache(self.path)
+        self.assertIsNone(cache.get(Cache.image_key(1)))
+        cache.set(Cache.image_key(1), {'properties': {'id': 1}})
+        self.assertEqual(cache.get(Cache.image_key(1)), {'properties': {'id': 1}})
+        self.assertEqual(cache.stats['hits'], 1)
+        self.assertEqual(cache.stats['misses'], 1)
+
+    def test_persistent(self):
+        cache = Cache(self.path)
+        cache.set('a', [1, 2, 3])
+        cache.close()
+        self.assertEqual(Cache(self.path).get('a'), [1, 2, 3])
+
+    def test_ttl(self):
+        cache = Cache(self.path, ttl=0.05, memory=10)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=60)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+
+    def test_lru(self):
+        cache = Cache(self.path, max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        time.sleep(0.01)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.size, 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_memory(self):
+        cache = Cache(self.path, memory=1)
+        cache.set('a', 1)
+        cache.get('a')
+        self.assertEqual(cache.stats['memory_hits'], 1)
+
+    def test_memory_hits_count_for_lru(self):
+        cache = Cache(self.path, max_entries=2, memory=2)
+        cache.set('a', 1)
+        time.sleep(0.01)
+        cache.set('b', 2)
+        time.sleep(0.01)
+        cache.get('a')      # Only a hit of the memory layer, 'a' is now the hottest entry.
+        self.assertEqual(cache.stats['memory_hits'], 1)
+        cache.set('c', 3)
+        cache.memory.clear()
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+    def test_memory_hits_written_on_close(self):
+        cache = Cache(self.path, memory=10)
+        cache.set('a', 1)
+        accessed = cache.db.execute('SELECT accessed FROM cache').fetchone()[0]
+        time.sleep(0.01)
+        cache.get('a')
+        cache.close()
+        cache = Cache(self.path)
+        self.assertGreater(cache.db.execute('SELECT accessed FROM cache').fetchone()[0], accessed)
+
+    def test_search_key(self):
+        self.assertEqual(Cache.search_key('image', {'radius': 300, 'address': 'x', 'tags': None}),
+                         Cache.search_key('image', {'address': 'x', 'radius': 300}))
+
+    def test_cached_search(self):
+        calls = []
+
+        def search(options):
+            calls.append(options)
+            return Response({'features': [options['offset']]})
+
+        cached = Cache(self.path).cached_search('image', search)
+        self.assertEqual(cached({'offset': 0}).json(), {'features': [0]})
+        self.assertEqual(cached({'offset': 0}).json(), {'features': [0]})
+        self.assertEqual(cached({'offset': 5}).json(), {'features': [5]})
+        self.assertEqual(len(calls), 2)
+
+    def test_searches_expire(self):
+        def search(options):
+            return Response({'features': [options['offset']]})
+
+        def expires(cache, key):
+            return cache.db.execute('SELECT expires FROM cache WHERE key = ?', (key,)).fetchone()[0]
+
+        cache = Cache(self.path)
+        cache.cached_search('image', search)({'offset': 0})
+        cache.set(Cache.image_key(1), {'id': 1})
+        # A search expires by default, the metadata of an image does not.
+        self.assertAlmostEqual(time.time() + SEARCH_TTL, expires(cache, Cache.search_key('image', {'offset': 0})),
+                               delta=60)
+        self.assertIsNone(expires(cache, Cache.image_key(1)))
+        cache.close()
+
+        cache = Cache(self.path, search_ttl=0.05)
+        cached = cache.cached_search('aoi', search)
+        cached({'offset': 1})
+        time.sleep(0.1)
+        self.assertIsNone(cache.get(Cache.search_key('aoi', {'offset': 1})))
+        # The ttl of the cache is the one of the searches too, when it is given.
+        self.assertEqual(10, Cache(':memory:', ttl=10).search_ttl)
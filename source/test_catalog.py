@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+import numpy as np
+from source import MockCarmera
+from source.Catalog import Catalog
+from source.Image import Image
+from source.Paginator import image_id
+from source.Spatial import SpatialIndex
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class TestCatalog(TestCase):
+
+    def setUp(self):
+        self.features = MockCarmera.catalog(3000, seed=5)
+        self.catalog = Catalog.from_features(self.features, batch=700)
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_columns(self):
+        ids = sorted(set(int(image_id(f)) for f in self.features))
+        self.assertEqual(ids, self.catalog.ids.tolist())
+        self.assertEqual(np.float32, self.catalog.lon.dtype)
+        self.assertEqual(31 * len(ids), self.catalog.nbytes)
+        feature = self.features[10]
+        row = self.catalog.positions([image_id(feature)])[0]
+        self.assertAlmostEqual(feature['properties']['speed'], float(self.catalog.speed[row]), places=4)
+        self.assertEqual(feature['properties']['position'], int(self.catalog.position[row]))
+        self.assertAlmostEqual(feature['geometry']['coordinates'][1], float(self.catalog.lat[row]), places=4)
+
+    def test_membership(self):
+        first = self.catalog.ids[0]
+        self.assertIn(first, self.catalog)
+        self.assertNotIn(-1, self.catalog)
+        ids = [first, -1, 10 ** 15, first]
+        self.assertEqual([True, False, False, True], self.catalog.contains(ids).tolist())
+        self.assertEqual([-1, 10 ** 15], self.catalog.new(ids).tolist())
+        self.assertEqual([False], Catalog().contains([1]).tolist())
+
+    def test_last_copy_wins(self):
+        old = Catalog([3, 1], [0, 0], [0, 0], [0, 0], [1, 2], [1, 1], [0, 0])
+        new = old.add(Catalog([3, 5], [0, 0], [0, 0], [0, 0], [9, 4], [2, 2], [0, 0]))
+        self.assertEqual([1, 3, 5], new.ids.tolist())
+        self.assertEqual([2, 9, 4], new.speed.tolist())
+
+    def test_mask(self):
+        mask = self.catalog.mask(max_speed=5, position=[1, 4], range='2017-01-17,2017-01-18')
+        expected = set()
+        for f in self.features:
+            p = f['properties']
+            day = str(p['captured_on'])[:10]
+            if p['speed'] <= 5 and p['position'] in (1, 4) and '2017-01-17' <= day <= '2017-01-18':
+                expected.add(int(image_id(f)))
+        self.assertEqual(expected, set(self.catalog.select(mask).ids.tolist()))
+
+    def test_spatial(self):
+        index = self.catalog.spatial()
+        self.assertIsInstance(index, SpatialIndex)
+        self.assertEqual(len(self.catalog), len(index))
+
+    def test_save_load(self):
+        folder = os.path.join(self.folder, 'catalog')
+        self.catalog.save(folder)
+        loaded = Catalog.load(folder)
+        self.assertIsInstance(loaded.ids, np.memmap)
+        self.assertEqual(self.catalog.ids.tolist(), loaded.ids.tolist())
+        self.assertEqual(self.catalog.captured.tolist(), loaded.captured.tolist())
+        self.assertTrue(loaded.contains(self.catalog.ids[:5]).all())
+
+    def test_catalog_images(self):
+        with MockCarmera.MockCarmera(images=500, seed=2) as mock:
+            image = Image('test', url=mock.url)
+            catalog = Image.catalog_images(image, {'address': 'East Village'}, limit=200, batch=150)
+            self.assertEqual(500, len(catalog))
+            again = Image.catalog_images(image, {'address': 'East Village'})
+            self.assertIs(again, image.catalog)
+            self.assertEqual(catalog.ids.tolist(), again.ids.tolist())
@@ -0,0 +1,194 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+from unittest import TestCase
+
+import cv2
+import numpy as np
+
+from source import Cli
+from source.MockCarmera import MockCarmera
+from source.Store import ThumbnailStore
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+def open_files(folder):
+    """
+    :return: Files of the folder open in this process.
+    """
+    folder = os.path.realpath(folder)
+    found = []
+    for fd in os.listdir('/proc/self/fd'):
+        try:
+            path = os.readlink(os.path.join('/proc/self/fd', fd))
+        except OSError:
+            continue
+        if path.startswith(folder + os.sep):
+            found.append(path)
+    for line in open('/proc/self/maps'):
+        if folder + os.sep in line:
+            found.append(line.split()[-1])
+    return found
+
+
+class TestCli(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.images = os.path.join(self.folder, 'images')
+        os.makedirs(self.images)
+        for i in range(4):
+            img = np.random.RandomState(i).randint(0, 255, (480, 1280, 3)).astype(np.uint8)
+            cv2.imwrite(os.path.join(self.images, '{}.jpg'.format(i)), img)
+        self.stderr = sys.stderr
+        sys.stderr = io.StringIO()
+
+    def tearDown(self):
+        sys.stderr = self.stderr
+        shutil.rmtree(self.folder)
+
+    def test_search_options(self):
+        aoi = [[[-73.98, 40.73], [-73.98, 40.72], [-73.99, 40.72]]]
+        args = Cli.parser().parse_args(['search', '--aoi', json.dumps(aoi), '--range', '2017-01-17,2017-01-18'])
+        self.assertEqual(Cli.search_options(args), {'aoi': aoi, 'range': '2017-01-17,2017-01-18'})
+        self.assertEqual(args.func, Cli.cmd_search)
+
+    def test_key(self):
+        args = Cli.parser().parse_args(['--key', 'abc', 'search', '--address', 'Jay St'])
+        self.assertEqual(Cli.api_key(args), 'abc')
+        os.environ[Cli.ENV_KEY] = 'xyz'
+        try:
+            args = Cli.parser().parse_args(['search', '--address', 'Jay St'])
+            self.assertEqual(Cli.api_key(args), 'xyz')
+        finally:
+            del os.environ[Cli.ENV_KEY]
+
+    def test_write(self):
+        path = os.path.join(self.folder, 'rows.json')
+        self.assertEqual(Cli.write(iter([(1, 'a'), (2, 'b')]), ['id', 'name'], path, 'json'), 2)
+        with open(path) as f:
+            self.assertEqual([json.loads(line) for line in f], [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}])
+
+    def test_thumbnail_folder(self):
+        out = os.path.join(self.folder, 'thumbnail')
+        Cli.main(['thumbnail', '--source', self.images, '--out', out, '--width', '320', '--processes', '2'])
+        self.assertEqual(sorted(os.listdir(out)), ['0.jpg', '1.jpg', '2.jpg', '3.jpg'])
+        self.assertEqual(cv2.imread(os.path.join(out, '0.jpg')).shape[1], 320)
+        self.assertEqual(json.loads(sys.stderr.getvalue())['ok'], 4)
+
+    def test_quality(self):
+        path = os.path.join(self.folder, 'quality.csv')
+        Cli.main(['quality', '--source', self.images, '--output', path, '--processes', '2'])
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'name,blur,brightness,p5,p50,p95,occlusion')
+        self.assertEqual(len(lines), 5)
+
+    def test_detect_errors(self):
+        with open(os.path.join(self.images, 'broken.jpg'), 'wb') as f:
+            f.write(b'not a jpeg')
+        path = os.path.join(self.folder, 'boxes.csv')
+        cascade = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        Cli.main(['detect', '--source', self.images, '--cascade', cascade, '--output', path, '--processes', '2'])
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'name,detections,boxes,error')
+        self.assertEqual(len(lines), 6)
+        self.assertIn('broken.jpg,,null,Image can not be decoded', lines)
+        self.assertIn('broken.jpg failed: Image can not be decoded', sys.stderr.getvalue())
+
+
+class TestCliNetwork(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.mock = MockCarmera(images=60, page_size=25).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mock.stop()
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.stderr = sys.stderr
+        sys.stderr = io.StringIO()
+
+    def tearDown(self):
+        sys.stderr = self.stderr
+        shutil.rmtree(self.folder)
+
+    def run_cli(self, *argv):
+        Cli.main(['--key', 'test'] + list(argv) + ['--url', self.mock.url])
+        return json.loads(sys.stderr.getvalue().splitlines()[-1])
+
+    def test_search(self):
+        path = os.path.join(self.folder, 'images.csv')
+        stats = self.run_cli('search', '--address', 'East Village', '--page-size', '100', '--output', path)
+        self.assertEqual(60, stats['images'])
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual('image_id,captured_on,lon,lat', lines[0])
+        self.assertEqual(sorted(range(1, 61)), sorted(int(line.split(',')[0]) for line in lines[1:]))
+
+    def test_search_sample(self):
+        path = os.path.join(self.folder, 'sample.csv')
+        self.run_cli('search', '--address', 'East Village', '--sample', '10', '--min-speed', '0', '--output', path)
+        with open(path) as f:
+            rows = [line.split(',') for line in f.read().splitlines()[1:]]
+        self.assertTrue(0 < len(rows) <= 60)
+        self.assertEqual(len(rows), len(set(row[0] for row in rows)))
+        self.assertTrue(all(len(row[1]) == 19 and float(row[2]) and float(row[3]) for row in rows))
+
+    def test_download(self):
+        out = os.path.join(self.folder, 'images')
+        stats = self.run_cli('download', '--address', 'East Village', '--out', out, '--workers', '4', '--batch', '16')
+        self.assertEqual(60, stats['ok'])
+        self.assertEqual(0, stats['failed'])
+        self.assertEqual(60, len(os.listdir(out)))
+        self.assertIsNotNone(cv2.imread(os.path.join(out, '7.jpg')))
+
+    def test_thumbnail_pipeline(self):
+        out = os.path.join(self.folder, 'thumbnail')
+        metrics = self.run_cli('thumbnail', '--address', 'East Village', '--out', out, '--width', '320', '--no-ping')
+        self.assertEqual(60, metrics['thumbnail']['items'])
+        self.assertEqual(60, len(os.listdir(out)))
+        self.assertEqual(320, cv2.imread(os.path.join(out, '1.jpg')).shape[1])
+
+    def test_thumbnail_pipeline_packed(self):
+        out = os.path.join(self.folder, 'packed')
+        metrics = self.run_cli('thumbnail', '--address', 'East Village', '--out', out, '--width', '320',
+                               '--no-ping', '--packed')
+        self.assertEqual(60, metrics['thumbnail']['items'])
+        # The store of the command is closed: no SQLite file and no segment left open.
+        self.assertEqual([], open_files(out))
+        with ThumbnailStore(out) as packed:
+            self.assertEqual(60, len(packed))
+            self.assertEqual(320, packed.decode('5.jpg').shape[1])
+        # A store as the source of thumbnails is closed too.
+        small = os.path.join(self.folder, 'small')
+        Cli.main(['thumbnail', '--source', out, '--out', small, '--width', '160', '--processes', '2'])
+        self.assertEqual(60, len(os.listdir(small)))
+        self.assertEqual([], open_files(out))
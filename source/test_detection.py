@@ -0,0 +1,121 @@
+import os
+from unittest import TestCase
+import cv2
+import numpy as np
+from source.Processing import Detection
+from source.Processing.Detection import annotate, detect, detect_batch, detect_image, get_detector
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+CASCADE = os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+# A drawn face, 600 x 600 pixels at (400, 300) of a 1600 x 1200 image.
+FACE = (400, 300, 600, 600)
+
+
+def face_image():
+    """
+    :return: Color image with a simple drawn face the frontal face cascade finds.
+    """
+    size = FACE[2]
+    face = np.full((size, size), 200, dtype=np.uint8)
+    c = size // 2
+    cv2.ellipse(face, (c, c), (int(size * .35), int(size * .45)), 0, 0, 360, 170, -1)
+    for dx in (-1, 1):
+        cv2.ellipse(face, (c + dx * int(size * .15), int(size * .4)), (int(size * .08), int(size * .04)), 0, 0, 360,
+                    40, -1)
+        cv2.line(face, (c + dx * int(size * .25), int(size * .32)), (c + dx * int(size * .06), int(size * .32)), 60,
+                 size // 40)
+    cv2.line(face, (c, int(size * .45)), (c, int(size * .6)), 120, size // 50)
+    cv2.ellipse(face, (c, int(size * .72)), (int(size * .12), int(size * .04)), 0, 0, 360, 60, -1)
+    img = np.full((1200, 1600), 200, dtype=np.uint8)
+    img[FACE[1]:FACE[1] + size, FACE[0]:FACE[0] + size] = cv2.GaussianBlur(face, (5, 5), 2)
+    return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+
+
+class TestDetection(TestCase):
+
+    def setUp(self):
+        self.img = face_image()
+        self.jpg = cv2.imencode('.jpg', self.img)[1].tobytes()
+
+    def assertFace(self, boxes):
+        """
+        One box on the face, in pixels of the 1600 x 1200 image: within 15% of its size.
+        """
+        self.assertEqual(1, len(boxes), boxes)
+        x, y, w, h = boxes[0]
+        tolerance = 0.15 * FACE[2]
+        self.assertLess(abs(x + w / 2.0 - (FACE[0] + FACE[2] / 2.0)), tolerance)
+        self.assertLess(abs(y + h / 2.0 - (FACE[1] + FACE[3] / 2.0)), tolerance)
+        self.assertLess(abs(w - FACE[2]), 2 * tolerance)
+
+    def test_get_detector(self):
+        self.assertIs(get_detector(CASCADE), get_detector(CASCADE))
+        self.assertIn(CASCADE, Detection.DETECTORS)
+        self.assertRaises(IOError, get_detector, '/no/such/cascade.xml')
+
+    def test_detect(self):
+        # Full size, and a copy 640 wide: the boxes of both are in pixels of the original image.
+        self.assertFace(detect(self.img, CASCADE, width=None))
+        self.assertFace(detect(self.img, CASCADE, width=640))
+        self.assertFace(detect(cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY), CASCADE, width=320, min_size=(20, 20)))
+        self.assertEqual([], detect(np.full((480, 640, 3), 200, dtype=np.uint8), CASCADE))
+
+    def test_detect_image(self):
+        # The JPEG is decoded at 1/2 for width 640, then the boxes are mapped back to 1600 x 1200.
+        name, boxes, seconds, error = detect_image(('face.jpg', self.jpg), CASCADE, width=640)
+        self.assertEqual('face.jpg', name)
+        self.assertFace(boxes)
+        self.assertIsNone(error)
+        name, boxes, seconds, error = detect_image(('face.png', cv2.imencode('.png', self.img)[1].tobytes()),
+                                                   CASCADE, width=640)
+        self.assertFace(boxes)
+
+    def test_detect_image_errors(self):
+        name, boxes, seconds, error = detect_image(('broken.jpg', b'broken'), CASCADE)
+        self.assertIsNone(boxes)
+        self.assertEqual('Image can not be decoded', error)
+        # Not a decode error: the reason is given.
+        name, boxes, seconds, error = detect_image(('face.jpg', self.jpg), '/no/such/cascade.xml')
+        self.assertIsNone(boxes)
+        self.assertIn('can not be loaded', error)
+        name, boxes, seconds, error = detect_image('/no/such/image.jpg', CASCADE)
+        self.assertEqual('image.jpg', name)
+        self.assertIsNone(boxes)
+        self.assertTrue(error)
+
+    def test_detect_batch(self):
+        sources = [('face{}.jpg'.format(i), self.jpg) for i in range(3)] + [('broken.jpg', b'broken')]
+        results, stats = detect_batch(sources, CASCADE, width=640, processes=2, chunksize=1)
+        self.assertEqual((3, 1), (stats['ok'], stats['failed']))
+        errors = dict((name, error) for name, boxes, error in results)
+        results = dict((name, boxes) for name, boxes, error in results)
+        self.assertIsNone(results['broken.jpg'])
+        self.assertEqual('Image can not be decoded', errors['broken.jpg'])
+        for i in range(3):
+            self.assertFace(results['face{}.jpg'.format(i)])
+            self.assertIsNone(errors['face{}.jpg'.format(i)])
+        self.assertRaises(IOError, detect_batch, sources, '/no/such/cascade.xml')
+
+    def test_annotate(self):
+        img = annotate(np.zeros((100, 100, 3), dtype=np.uint8), [(10, 10, 50, 50)])
+        self.assertEqual([0, 255, 0], img[10, 30].tolist())
@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import TestCase
+from source.Downloader import Downloader
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """
+    Answer /v1/images/{id}/download/ with the bytes of the ID. IDs over 100 do not exist.
+    """
+    requests = []
+
+    def do_GET(self):
+        StandIn.requests.append(self.path)
+        image_id = int(self.path.split('/')[3])
+        if image_id > 100:
+            self.send_error(404)
+            return
+        body = 'image {}'.format(image_id).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestDownloader(TestCase):
+
+    def setUp(self):
+        self.server = Server(('127.0.0.1', 0), StandIn)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.url = 'http://127.0.0.1:{}/v1/'.format(self.server.server_port)
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.folder)
+
+    def test_fetch(self):
+        downloader = Downloader('key', url=self.url)
+        self.assertEqual(downloader.fetch(7), b'image 7')
+
+    def test_download_all(self):
+        downloader = Downloader('key', url=self.url, workers=4, per_host=2)
+        results = downloader.download_all(set(range(1, 21)), self.folder)
+        self.assertEqual(len(results), 20)
+        self.assertTrue(all(r.ok for r in results))
+        with open(os.path.join(self.folder, '3.jpg'), 'rb') as f:
+            self.assertEqual(f.read(), b'image 3')
+        self.assertEqual(downloader.stats['ok'], 20)
+        self.assertGreater(downloader.stats['images_per_sec'], 0)
+
+    def test_failure_does_not_stop_the_others(self):
+        downloader = Downloader('key', url=self.url, workers=4)
+        results = downloader.download_all([99, 100, 101, 102], self.folder)
+        self.assertEqual([r.ok for r in results], [True, True, False, False])
+        self.assertIsNotNone(results[2].error)
+        self.assertFalse(os.path.exists(os.path.join(self.folder, '101.jpg')))
+        self.assertEqual(downloader.stats['failed'], 2)
+
+    def test_size_for_width(self):
+        self.assertEqual(Downloader.size_for_width(360), 'tiny')
+        self.assertEqual(Downloader.size_for_width(640), 'small')
+        self.assertEqual(Downloader.size_for_width(700), 'medium')
+        self.assertEqual(Downloader.size_for_width(1280), 'large')
+        self.assertIsNone(Downloader.size_for_width(2000))
+        self.assertIsNone(Downloader.size_for_width(None))
+
+    def test_fetch_size(self):
+        downloader = Downloader('key', url=self.url)
+        downloader.fetch(7, size='small')
+        self.assertIn('size=small', StandIn.requests[-1])
+        downloader.fetch(7)
+        self.assertNotIn('size=', StandIn.requests[-1])
+
+    def test_connection_pool(self):
+        from requests.adapters import DEFAULT_POOLSIZE
+        downloader = Downloader('key', url=self.url, workers=16, per_host=3)
+        adapter = downloader.session.get_adapter(self.url)
+        self.assertEqual(3, adapter._pool_maxsize)
+        self.assertEqual(DEFAULT_POOLSIZE, adapter._pool_connections)
+        downloader.fetch(7)
+        pool = adapter.poolmanager.connection_from_url(self.url)
+        self.assertEqual(3, pool.pool.maxsize)
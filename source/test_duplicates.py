@@ -0,0 +1,90 @@
+import os
+import random
+import shutil
+import tempfile
+from unittest import TestCase
+import cv2
+import numpy as np
+from source.Downloader import Downloader
+from source.MockCarmera import MockCarmera, catalog, jpeg
+from source.Pipeline import Pipeline
+from source.Processing.Duplicates import BKTree, Deduplicator, dhash_bytes, hamming
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class TestDuplicates(TestCase):
+
+    def test_dhash(self):
+        a = jpeg(640, 480, 1)
+        img = cv2.imdecode(np.frombuffer(a, dtype=np.uint8), cv2.IMREAD_COLOR)
+        smaller = cv2.imencode('.jpg', cv2.resize(img, (500, 375)), [cv2.IMWRITE_JPEG_QUALITY, 50])[1].tobytes()
+        self.assertLessEqual(hamming(dhash_bytes(a), dhash_bytes(smaller)), 4)
+        self.assertGreater(hamming(dhash_bytes(a), dhash_bytes(jpeg(640, 480, 2))), 10)
+        self.assertIsNone(dhash_bytes(b'not an image'))
+
+    def test_bk_tree(self):
+        rnd = random.Random(1)
+        hashes = [rnd.getrandbits(64) for _ in range(2000)]
+        tree = BKTree()
+        for i, h in enumerate(hashes):
+            tree.add(h, i)
+        self.assertEqual(2000, len(tree))
+        for query in hashes[:20] + [rnd.getrandbits(64) for _ in range(20)]:
+            expected = sorted(i for i, h in enumerate(hashes) if hamming(query, h) <= 20)
+            self.assertEqual(expected, sorted(i for d, i in tree.search(query, 20)))
+        self.assertEqual([], BKTree().search(1, 5))
+
+    def test_same_place_only(self):
+        dedup = Deduplicator(radius=4, cell=0.001)
+        self.assertIsNone(dedup.check(1, 0b1011, -73.9865, 40.7280))
+        self.assertEqual(1, dedup.check(2, 0b1001, -73.9866, 40.7281))
+        # Next cell, still compared.
+        self.assertEqual(1, dedup.check(3, 0b1011, -73.9855, 40.7280))
+        # Far away, a new image.
+        self.assertIsNone(dedup.check(4, 0b1011, -73.9500, 40.7280))
+        self.assertIsNone(dedup.check(5, 2 ** 64 - 1, -73.9865, 40.7280))
+        self.assertEqual({'checked': 5, 'duplicates': 2, 'failed': 0}, dedup.stats)
+
+
+class TestPipelineDuplicates(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_pipeline(self):
+        with MockCarmera(images=40, variants=4) as mock:
+            downloader = Downloader('test', url=mock.url, workers=4)
+            # One cell for the whole catalog, so only the 4 different JPEGs are kept.
+            pipeline = Pipeline(downloader, self.folder, width=320, ping=lambda image_id: None,
+                                dedup=Deduplicator(radius=2, cell=1.0))
+            metrics = pipeline.run(catalog(40))
+        self.assertEqual(4, len(os.listdir(self.folder)))
+        self.assertEqual(36, len(pipeline.duplicates))
+        self.assertEqual(36, metrics['dedup']['dropped'])
+        self.assertEqual(4, metrics['ping']['items'])
+        self.assertEqual({}, pipeline.locations)
+        kept = set(int(name[:-4]) % 4 for name in os.listdir(self.folder))
+        self.assertEqual(set([0, 1, 2, 3]), kept)
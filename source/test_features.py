@@ -0,0 +1,122 @@
+from unittest import TestCase
+import json
+import os
+import shutil
+import tempfile
+import cv2
+import numpy as np
+from source.Classification.Features import DIM, HIST_BINS, FeatureStore, color_histogram, extract, extract_folder
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+def picture(seed, width=320, height=240):
+    rnd = np.random.RandomState(seed)
+    small = rnd.randint(0, 255, (height // 8, width // 8, 3)).astype(np.uint8)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_NEAREST)
+
+
+class TestFeatures(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.images = os.path.join(self.folder, 'images')
+        self.store = os.path.join(self.folder, 'features')
+        os.mkdir(self.images)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def save(self, *seeds):
+        for seed in seeds:
+            cv2.imwrite(os.path.join(self.images, '{}.jpg'.format(1000 + seed)), picture(seed))
+
+    def test_color_histogram(self):
+        img = picture(0)
+        hist = color_histogram(img)
+        self.assertEqual((3 * HIST_BINS,), hist.shape)
+        for ch in range(3):
+            part = hist[ch * HIST_BINS:(ch + 1) * HIST_BINS]
+            self.assertAlmostEqual(1.0, part.sum(), places=5)
+            counts = np.bincount(img[:, :, ch].ravel() // (256 // HIST_BINS), minlength=HIST_BINS)
+            np.testing.assert_allclose(counts / float(counts.sum()), part, rtol=1e-5)
+        vector = extract(img)
+        self.assertEqual((DIM,), vector.shape)
+        self.assertEqual(np.float32, vector.dtype)
+
+    def test_incremental(self):
+        self.save(0, 1, 2)
+        with open(os.path.join(self.images, '1099.jpg'), 'wb') as f:
+            f.write(b'not a jpeg')
+        store = FeatureStore(self.store)
+        result = extract_folder(self.images, store, processes=2, batch=2)
+        self.assertEqual(3, result['ok'])
+        self.assertEqual(['1099'], result['failed'])
+        self.assertEqual(['1000', '1001', '1002'], store.image_ids)
+        first = np.array(store.matrix())
+
+        self.save(3, 4)
+        os.remove(os.path.join(self.images, '1099.jpg'))
+        store = FeatureStore(self.store)
+        result = extract_folder(self.images, store, processes=2)
+        self.assertEqual(2, result['ok'])
+        self.assertEqual(['1000', '1001', '1002', '1003', '1004'], store.image_ids)
+        matrix = store.matrix()
+        self.assertEqual((5, DIM), matrix.shape)
+        # The rows already there are not written again.
+        np.testing.assert_array_equal(first, matrix[:3])
+        self.assertEqual(0, extract_folder(self.images, store)['ok'])
+        np.testing.assert_array_equal(matrix[[4, 1]], store.rows(['1004', 1001]))
+
+    def test_partial_row(self):
+        store = FeatureStore(self.store, dim=4)
+        store.append(['1', '2'], np.arange(8).reshape(2, 4))
+        # A crash in the middle of the next append: one row and a half written, the IDs not.
+        with open(store.data_path, 'ab') as f:
+            f.write(np.ones(6, dtype=np.float32).tobytes())
+        store = FeatureStore(self.store)
+        self.assertEqual(2, len(store))
+        self.assertEqual(2 * 4 * 4, os.path.getsize(store.data_path))
+        store.append(['3'], np.full((1, 4), 9))
+        np.testing.assert_array_equal([[0, 1, 2, 3], [4, 5, 6, 7], [9, 9, 9, 9]], store.matrix())
+
+    def test_ids_without_rows(self):
+        store = FeatureStore(self.store, dim=4)
+        store.append(['1', '2'], np.zeros((2, 4)))
+        with open(store.ids_path, 'a') as f:
+            f.write('3\n')
+        store = FeatureStore(self.store)
+        self.assertEqual(['1', '2'], store.image_ids)
+        self.assertNotIn('3', store)
+        with open(store.ids_path) as f:
+            self.assertEqual(['1', '2'], f.read().split())
+
+    def test_meta(self):
+        store = FeatureStore(self.store, dim=4)
+        store.append(['1'], np.zeros((1, 4)))
+        with open(os.path.join(self.store, 'meta.json')) as f:
+            self.assertEqual({'dim': 4}, json.load(f))
+        # The dim of the folder wins over the one given.
+        store = FeatureStore(self.store, dim=DIM)
+        self.assertEqual(4, store.dim)
+        self.assertEqual((1, 4), store.matrix().shape)
+        self.assertEqual(['2'], store.missing(['1', '2']))
@@ -1,5 +1,9 @@
+import os
+import shutil
+import tempfile
 from unittest import TestCase
 from source.Image import Image
+from source.MockCarmera import MockCarmera, CENTER, haversine
 
 """
 MIT License
@@ -24,29 +28,69 @@ SOFTWARE.
 
 class TestImage(TestCase):
 
+    @classmethod
+    def setUpClass(cls):
+        cls.mock = MockCarmera(images=500, page_size=100).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mock.stop()
+
+    def setUp(self):
+        self.image = Image('key', url=self.mock.url)
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
     def test_speed_of_image(self):
-        self.fail()
+        img = Image.get_image(self.image, 1)
+        self.assertEqual(Image.speed_of_image(img), self.mock.by_id[1]['properties']['speed'])
 
     def test_url_of_image(self):
-        self.fail()
+        img = Image.get_image(self.image, 2)
+        self.assertEqual(Image.url_of_image(img), 'images/2/download/')
 
     def test_size(self):
-        self.fail()
+        self.assertEqual(Image.size(self.image), 0)
+        Image.search_images_coordinates(self.image, points=list(CENTER), radius=200, limit=100)
+        self.assertEqual(Image.size(self.image), len(self.image.img_id_set))
 
     def test_get_image(self):
-        self.fail()
+        self.assertEqual(Image.get_image(self.image, 3)['properties']['id'], 3)
+        self.assertIsNone(Image.get_image(self.image, 100000))
 
     def test_search_images_address(self):
-        self.fail()
+        # Every page is walked, 500 images in pages of 100.
+        ids = Image.search_images_address(self.image, 'East Village', limit=100)
+        self.assertEqual(ids, set(range(1, 501)))
 
     def test_search_images_coordinates(self):
-        self.fail()
+        ids = Image.search_images_coordinates(self.image, points=list(CENTER), radius=300, limit=100)
+        expected = set(f['properties']['id'] for f in self.mock.features
+                       if haversine(CENTER[0], CENTER[1], *f['geometry']['coordinates']) <= 300)
+        self.assertTrue(len(expected) > 0)
+        self.assertEqual(ids, expected)
 
     def test_download_images(self):
-        self.fail()
+        self.assertIsNone(Image.download_images(self.image, self.folder))
+        self.image.img_id_set.update([1, 2, 3])
+        saved = Image.download_images(self.image, self.folder, width=300)
+        self.assertEqual(saved, {1, 2, 3})
+        self.assertEqual(sorted(os.listdir(self.folder)), ['1.jpg', '2.jpg', '3.jpg'])
 
     def test_download_images_address(self):
-        self.fail()
+        saved = Image.download_images_address(self.image, 'East Village', 150, self.folder, width=300)
+        self.assertEqual(saved, self.image.img_id_set)
+        self.assertEqual(len(os.listdir(self.folder)), len(saved))
 
     def test_download_images_coordinates(self):
-        self.fail()
+        saved = Image.download_images_coordinates(self.image, list(CENTER), 150, self.folder, width=300)
+        self.assertTrue(len(saved) > 0)
+        self.assertEqual(saved, self.image.img_id_set)
+
+    def test_page_size_cap(self):
+        # The server cuts the pages to 100 images, less than the 'limit' asked.
+        ids = [image['properties']['id'] for image in Image.stream_images(self.image, {'address': 'East Village'},
+                                                                          limit=300)]
+        self.assertEqual(sorted(ids), list(range(1, 501)))
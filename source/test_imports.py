@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Search, download, sync and ping never need the image or the machine learning libraries.
+CORE = ['source.Downloader', 'source.Paginator', 'source.Cache', 'source.Sync', 'source.Notifier',
+        'source.Image', 'source.AOI', 'source.Tag']
+HEAVY = ['carmera', 'cv2', 'numpy', 'scipy', 'sklearn', 'pandas', 'ggplot', 'keras', 'IPython']
+ML = ['sklearn', 'pandas', 'ggplot', 'keras', 'IPython']
+
+SCRIPT = """
+import json, sys, time
+start = time.time()
+for name in {modules!r}:
+    __import__(name)
+print(json.dumps({{'seconds': time.time() - start, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def imports(modules, heavy):
+    """
+    Import the modules in a new interpreter.
+    :return: dict with the seconds to import them and the heavy modules loaded by them.
+    """
+    out = subprocess.check_output([sys.executable, '-c', SCRIPT.format(modules=modules, heavy=heavy)], cwd=ROOT)
+    return json.loads(out.decode('utf-8').strip().splitlines()[-1])
+
+
+class TestImports(TestCase):
+
+    def test_core_is_slim(self):
+        result = imports(CORE, HEAVY)
+        self.assertEqual(result['loaded'], [])
+        self.assertLess(result['seconds'], 2.0)
+
+    def test_classification_is_lazy(self):
+        result = imports(['source.Classification.ScikitLearn', 'source.Classification.NN'], ML)
+        self.assertEqual(result['loaded'], [])
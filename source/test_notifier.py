@@ -0,0 +1,167 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import TestCase
+from source.Notifier import Notifier
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class Stub(BaseHTTPRequestHandler):
+    """
+    Receive the pings. The first 'failures' requests are answered with 503, the IDs in 'refused' with 404.
+    """
+    failures = 0
+    refused = set()
+    requests = []
+    pings = []
+    lock = threading.Lock()
+
+    def answer(self, image_ids):
+        with Stub.lock:
+            Stub.requests.extend(image_ids)
+            if Stub.refused.intersection(image_ids):
+                self.send_error(404)
+                return
+            if Stub.failures > 0:
+                Stub.failures -= 1
+                self.send_error(503)
+                return
+            Stub.pings.extend(image_ids)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        self.answer([self.path.split('image_id=')[1]])
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.answer(json.loads(body.decode())['image_ids'])
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestNotifier(TestCase):
+
+    def setUp(self):
+        Stub.failures = 0
+        Stub.refused = set()
+        Stub.requests = []
+        Stub.pings = []
+        self.server = Server(('127.0.0.1', 0), Stub)
+        threading.Thread(target=self.server.serve_forever).start()
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_port)
+        self.folder = tempfile.mkdtemp()
+        self.outbox = os.path.join(self.folder, 'outbox.db')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.folder)
+
+    def test_ping(self):
+        notifier = Notifier(url=self.url).start()
+        for i in range(20):
+            notifier.notify(i)
+        notifier.close()
+        self.assertEqual(sorted(Stub.pings, key=int), [str(i) for i in range(20)])
+        self.assertEqual(notifier.stats['sent'], 20)
+
+    def test_batch(self):
+        notifier = Notifier(batch_url=self.url + 'batch', batch_size=10, workers=1)
+        for i in range(25):
+            notifier.notify(i)
+        notifier.close()
+        self.assertEqual(len(Stub.pings), 25)
+        self.assertLessEqual(notifier.stats['requests'], 5)
+
+    def test_retry(self):
+        Stub.failures = 2
+        notifier = Notifier(url=self.url, workers=1, backoff=0.01).start()
+        notifier.notify(1)
+        notifier.close()
+        self.assertEqual(Stub.pings, ['1'])
+        self.assertEqual(notifier.stats['retries'], 2)
+
+    def test_outbox_survives_restart(self):
+        Stub.failures = 100
+        notifier = Notifier(url=self.url, outbox=self.outbox, retries=1, workers=1).start()
+        notifier.notify(1)
+        notifier.notify(2)
+        notifier.close()
+        self.assertEqual(notifier.stats['failed'], 2)
+
+        Stub.failures = 0
+        Notifier(url=self.url, outbox=self.outbox).close()
+        self.assertEqual(sorted(Stub.pings), ['1', '2'])
+
+    def test_full_queue_waits_on_outbox(self):
+        notifier = Notifier(url=self.url, outbox=self.outbox, queue_size=2)
+        for i in range(10):
+            notifier.notify(i)
+        notifier.close()
+        self.assertEqual(sorted(Stub.pings, key=int), [str(i) for i in range(10)])
+
+    def outbox_rows(self):
+        db = sqlite3.connect(self.outbox)
+        try:
+            return sorted(row[0] for row in db.execute('SELECT image_id FROM outbox'))
+        finally:
+            db.close()
+
+    def test_notify_does_not_write(self):
+        notifier = Notifier(url=self.url, outbox=self.outbox)
+        for i in range(5):
+            notifier.notify(i)
+        # Nothing on disk until the writer thread flushes, all at once.
+        self.assertEqual([], self.outbox_rows())
+        notifier.flush()
+        self.assertEqual(['0', '1', '2', '3', '4'], self.outbox_rows())
+        notifier.close()
+        self.assertEqual([], self.outbox_rows())
+        self.assertEqual(5, notifier.stats['sent'])
+
+    def test_refused_not_sent_again(self):
+        Stub.refused = set(['2'])
+        notifier = Notifier(url=self.url, outbox=self.outbox, workers=1, backoff=0.01).start()
+        for i in range(4):
+            notifier.notify(i)
+        notifier.close()
+        self.assertEqual(1, notifier.stats['rejected'])
+        self.assertEqual(3, notifier.stats['sent'])
+        self.assertEqual(1, Stub.requests.count('2'))
+        self.assertEqual([], self.outbox_rows())
+
+        Stub.refused = set()
+        Notifier(url=self.url, outbox=self.outbox).close()
+        self.assertEqual(1, Stub.requests.count('2'))
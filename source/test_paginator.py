@@ -0,0 +1,87 @@
+from unittest import TestCase
+from source.Paginator import paginate
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class Response(object):
+    def __init__(self, feature_collection):
+        self.feature_collection = feature_collection
+
+    def json(self):
+        return self.feature_collection
+
+
+class TestPaginator(TestCase):
+
+    def setUp(self):
+        self.offsets = []
+        self.cap = None         # Max page size of the server.
+        self.total = False      # Send the total of the collection.
+
+    def search(self, options):
+        """
+        Fake search over 23 images.
+        """
+        self.offsets.append(options['offset'])
+        limit = options['limit'] if self.cap is None else min(options['limit'], self.cap)
+        count = max(0, min(limit, 23 - options['offset']))
+        features = [{'properties': {'id': options['offset'] + i}} for i in range(count)]
+        collection = {'id': 1, 'features': features}
+        if self.total:
+            collection['total'] = 23
+        return Response(collection)
+
+    def test_walk_all_pages(self):
+        ids = [image['properties']['id'] for image in paginate(self.search, {}, limit=5)]
+        self.assertEqual(ids, list(range(23)))
+        # Without a total only an empty page ends the search.
+        self.assertEqual(self.offsets, [0, 5, 10, 15, 20, 23])
+
+    def test_total(self):
+        self.total = True
+        ids = [image['properties']['id'] for image in paginate(self.search, {}, limit=5)]
+        self.assertEqual(ids, list(range(23)))
+        self.assertEqual(self.offsets, [0, 5, 10, 15, 20])
+
+    def test_server_cap(self):
+        # The server answers 4 images when 10 are asked: the next page starts after the images received.
+        self.cap = 4
+        for prefetch in (True, False):
+            self.offsets = []
+            ids = [image['properties']['id'] for image in paginate(self.search, {}, limit=10, prefetch=prefetch)]
+            self.assertEqual(ids, list(range(23)))
+            self.assertEqual(self.offsets, [0, 4, 8, 12, 16, 20, 23])
+
+    def test_without_prefetch(self):
+        ids = [image['properties']['id'] for image in paginate(self.search, {}, limit=5, prefetch=False)]
+        self.assertEqual(ids, list(range(23)))
+
+    def test_last_page_full(self):
+        self.assertEqual(len(list(paginate(self.search, {}, limit=23))), 23)
+        self.assertEqual(self.offsets, [0, 23])
+
+    def test_on_page(self):
+        pages = []
+        list(paginate(self.search, {}, offset=10, limit=10, on_page=lambda page: pages.append(page['id'])))
+        # Pages of 10, 3 and the empty one that ends the search.
+        self.assertEqual(pages, [1, 1, 1])
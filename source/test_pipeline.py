@@ -0,0 +1,120 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import TestCase, mock
+from source.Downloader import Downloader
+from source.MockCarmera import MockCarmera, catalog, jpeg
+from source.Pipeline import Pipeline
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class FakeDownloader(object):
+    """
+    Same interface as Downloader for the pipeline, the images in 'broken' fail.
+    """
+    def __init__(self, broken=(), delay=0.0):
+        self.broken = set(broken)
+        self.delay = delay
+        self.content = jpeg(640, 480, 1)
+
+    @staticmethod
+    def size_for_width(width):
+        return Downloader.size_for_width(width)
+
+    def fetch(self, image_id, size=None):
+        time.sleep(self.delay)
+        if image_id in self.broken:
+            raise IOError('404 Not Found')
+        return self.content
+
+
+class TestPipeline(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_all_stages(self):
+        pinged = []
+        with MockCarmera(images=30) as mock:
+            downloader = Downloader('test', url=mock.url, workers=4)
+            pipeline = Pipeline(downloader, self.folder, width=320, ping=pinged.append, download_workers=4)
+            # Duplicates of the search are dropped before the download.
+            metrics = pipeline.run(catalog(30) + catalog(5))
+        for name in ('search', 'download', 'thumbnail', 'ping'):
+            self.assertEqual(30, metrics[name]['items'], name)
+            self.assertEqual(0, metrics[name]['failed'], name)
+        self.assertEqual(sorted(range(1, 31)), sorted(pinged))
+        self.assertEqual(30, len(os.listdir(self.folder)))
+        self.assertEqual([], pipeline.errors)
+
+    def test_backpressure_and_stop(self):
+        # A slow ping stage: the queues before it fill up to queue_size and never over it.
+        def ping(image_id):
+            time.sleep(0.005)
+        pipeline = Pipeline(FakeDownloader(), self.folder, width=160, ping=ping, download_workers=4,
+                            thumbnail_workers=2, queue_size=3)
+        before = threading.active_count()
+        metrics = pipeline.run(catalog(60))
+        for name in ('search', 'download', 'thumbnail'):
+            self.assertLessEqual(metrics[name]['max_queue_depth'], 3, name)
+        self.assertEqual(3, metrics['search']['max_queue_depth'])
+        self.assertEqual(60, metrics['ping']['items'])
+        # Every thread of every stage ended on STOP.
+        self.assertFalse(any(thread.is_alive() for thread in pipeline.threads))
+        self.assertLessEqual(threading.active_count(), before)
+
+    def test_download_errors(self):
+        pinged = []
+        broken = [2, 5, 7]
+        pipeline = Pipeline(FakeDownloader(broken=broken), self.folder, width=160, ping=pinged.append,
+                            download_workers=3)
+        done = threading.Event()
+        result = {}
+
+        def run():
+            result['metrics'] = pipeline.run(catalog(20))
+            done.set()
+        threading.Thread(target=run, daemon=True).start()
+        self.assertTrue(done.wait(30), 'The pipeline hangs after a failed download')
+        metrics = result['metrics']
+        self.assertEqual(3, metrics['download']['failed'])
+        self.assertEqual(17, metrics['download']['items'])
+        self.assertEqual(17, metrics['ping']['items'])
+        self.assertEqual(sorted(broken), sorted(image for stage, image, error in pipeline.errors))
+        self.assertTrue(all(stage == 'download' and '404' in error for stage, image, error in pipeline.errors))
+        self.assertEqual(set(range(1, 21)) - set(broken), set(pinged))
+
+    def test_write_errors(self):
+        pipeline = Pipeline(FakeDownloader(), self.folder, width=160, ping=lambda image_id: None)
+        with mock.patch('source.Pipeline.cv2.imwrite', return_value=False):
+            metrics = pipeline.run(catalog(4))
+        self.assertEqual(4, metrics['thumbnail']['failed'])
+        self.assertEqual(0, metrics['ping']['items'])
+        self.assertEqual(4, len(pipeline.errors))
+        self.assertTrue(all(stage == 'thumbnail' and 'can not be written' in error
+                            for stage, image, error in pipeline.errors))
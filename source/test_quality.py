@@ -0,0 +1,83 @@
+from unittest import TestCase
+import cv2
+import numpy as np
+from source.Processing.Quality import COLUMNS, score, score_batch, score_image
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+def texture(width=320, height=240, seed=0):
+    rnd = np.random.RandomState(seed)
+    small = rnd.randint(0, 255, (height // 4, width // 4)).astype(np.uint8)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_NEAREST)
+
+
+def values(gray):
+    return dict(zip(COLUMNS, score(gray)))
+
+
+class TestQuality(TestCase):
+
+    def test_blur(self):
+        sharp = texture()
+        blurred = cv2.GaussianBlur(sharp, (15, 15), 5)
+        self.assertGreater(values(sharp)['blur'], 10 * values(blurred)['blur'])
+
+    def test_dark(self):
+        bright = values(texture())
+        dark = values((texture() // 8).astype(np.uint8))
+        self.assertLess(dark['brightness'], 40)
+        self.assertGreater(bright['brightness'], 80)
+        self.assertLessEqual(dark['p95'], 32)
+        self.assertLessEqual(dark['p5'], dark['p50'])
+        self.assertLessEqual(dark['p50'], dark['p95'])
+
+    def test_occlusion(self):
+        gray = texture()
+        self.assertEqual(0.0, values(gray)['occlusion'])
+        # Something flat in front of the left half of the camera.
+        gray[:, :160] = 90
+        self.assertEqual(0.5, values(gray)['occlusion'])
+
+    def test_small_image(self):
+        result = values(texture(6, 4))
+        self.assertFalse(np.isnan(result['occlusion']))
+        self.assertFalse(np.isnan(values(np.full((1, 1), 7, dtype=np.uint8))['occlusion']))
+
+    def test_errors(self):
+        ok, buf = cv2.imencode('.jpg', texture(640, 480))
+        name, result, error = score_image(('a.jpg', buf.tobytes()), width=320)
+        self.assertEqual(('a.jpg', None), (name, error))
+        self.assertEqual(len(COLUMNS), len(result))
+        name, result, error = score_image(('b.jpg', b'broken'))
+        self.assertIsNone(result)
+        self.assertEqual('Image can not be decoded', error)
+        name, result, error = score_image('/no/such/file.jpg')
+        self.assertEqual('file.jpg', name)
+        self.assertIsNotNone(error)
+
+        columns, stats = score_batch([('a.jpg', buf.tobytes()), ('b.jpg', b'broken')], processes=1)
+        self.assertEqual((1, 1), (stats['ok'], stats['failed']))
+        self.assertEqual(['', 'Image can not be decoded'], columns['error'].tolist())
+        self.assertTrue(np.isnan(columns['blur'][1]))
+        self.assertAlmostEqual(stats['images_per_sec'], 1 / stats['seconds'], places=3)
+        self.assertEqual(set(COLUMNS + ['name', 'error']), set(columns))
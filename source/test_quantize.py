@@ -0,0 +1,118 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+import numpy as np
+from scipy.signal import correlate
+from source.Classification.Quantize import CpuModel, dequantize, quantize
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+def reference_conv(x, w, b, mode):
+    out = np.zeros((x.shape[0], w.shape[0]) + correlate(x[0, 0], w[0, 0], mode=mode).shape)
+    for n in range(x.shape[0]):
+        for f in range(w.shape[0]):
+            out[n, f] = sum(correlate(x[n, c], w[f, c], mode=mode) for c in range(x.shape[1])) + b[f]
+    return out
+
+
+class TestQuantize(TestCase):
+
+    def setUp(self):
+        self.rnd = np.random.RandomState(0)
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def weights(self, *shape):
+        return self.rnd.randn(*shape).astype(np.float32)
+
+    def test_conv(self):
+        x = self.weights(2, 3, 10, 12)
+        w = self.weights(4, 3, 3, 3)
+        b = self.weights(4)
+        valid = CpuModel.conv(x, w, b, 'valid')
+        self.assertEqual((2, 4, 8, 10), valid.shape)
+        self.assertLess(np.abs(valid - reference_conv(x, w, b, 'valid')).max(), 1e-5)
+        same = CpuModel.conv(x, w, b, 'same')
+        self.assertEqual((2, 4, 10, 12), same.shape)
+        self.assertLess(np.abs(same - reference_conv(x, w, b, 'same')).max(), 1e-5)
+
+    def test_pool(self):
+        x = self.weights(2, 3, 7, 9)
+        out = CpuModel.pool(x, 2)
+        self.assertEqual((2, 3, 3, 4), out.shape)
+        for i in range(3):
+            for j in range(4):
+                np.testing.assert_array_equal(x[:, :, 2 * i:2 * i + 2, 2 * j:2 * j + 2].max(axis=(2, 3)),
+                                              out[:, :, i, j])
+
+    def test_quantize(self):
+        w = self.weights(8, 3, 3, 3)
+        w[5] = 0.0
+        for precision, tolerance in [('float32', 0.0), ('float16', 2e-3)]:
+            q, scale = quantize(w, precision)
+            self.assertIsNone(scale)
+            self.assertLessEqual(np.abs(dequantize(q, scale) - w).max(), tolerance)
+        q, scale = quantize(w, 'int8')
+        self.assertEqual(np.int8, q.dtype)
+        self.assertEqual((8,), scale.shape)
+        self.assertEqual(127, np.abs(q[0]).max())
+        np.testing.assert_array_equal(0, q[5])
+        error = np.abs(dequantize(q, scale) - w).reshape(8, -1).max(axis=1)
+        # Half a step of the scale of the channel at most.
+        self.assertTrue((error <= scale / 2 + 1e-6).all())
+        self.assertRaises(ValueError, quantize, w, 'int4')
+
+    def model(self, precision):
+        conv_w, conv_b = self.weights(4, 1, 3, 3), self.weights(4)
+        dense_w, dense_b = self.weights(3, 4 * 4 * 4), self.weights(3)
+        arrays = {}
+        for i, w, b in [(0, conv_w, conv_b), (4, dense_w, dense_b)]:
+            q, scale = quantize(w, precision)
+            arrays['w{}'.format(i)] = q
+            arrays['b{}'.format(i)] = b
+            if scale is not None:
+                arrays['s{}'.format(i)] = scale
+        ops = ['conv:same:th', 'relu', 'pool:2:th', 'flatten', 'dense', 'softmax']
+        path = os.path.join(self.folder, 'model_{}.npz'.format(precision))
+        np.savez(path, ops=np.array(ops), precision=np.array(precision), **arrays)
+        return path, (conv_w, conv_b, dense_w, dense_b)
+
+    def test_predict(self):
+        x = self.rnd.rand(5, 1, 8, 8).astype(np.float32)
+        for precision, tolerance in [('float32', 1e-5), ('float16', 1e-2), ('int8', 5e-2)]:
+            path, (conv_w, conv_b, dense_w, dense_b) = self.model(precision)
+            model = CpuModel(path)
+            self.assertEqual(precision, model.precision)
+            self.assertEqual(np.float32, model.weights[0][0].dtype)
+            hidden = np.maximum(reference_conv(x, conv_w, conv_b, 'same'), 0)
+            hidden = hidden.reshape(5, 4, 4, 2, 4, 2).max(axis=(3, 5)).reshape(5, -1)
+            logits = hidden.dot(dense_w.T) + dense_b
+            expected = np.exp(logits - logits.max(axis=1, keepdims=True))
+            expected /= expected.sum(axis=1, keepdims=True)
+            prob = model.predict(x, batch_size=2)
+            self.assertEqual((5, 3), prob.shape)
+            np.testing.assert_allclose(1.0, prob.sum(axis=1), rtol=1e-5)
+            self.assertLess(np.abs(prob - expected).max(), tolerance, precision)
@@ -0,0 +1,110 @@
+import gc
+import weakref
+from unittest import TestCase
+import numpy as np
+from source.Catalog import Catalog
+from source.Sampling import plan, sample
+from source.Spatial import EARTH_RADIUS
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+METER = np.degrees(1.0 / EARTH_RADIUS)     # Degrees of latitude.
+
+
+def drive(camera, position, start, speeds, first_id, lat0=40.72):
+    """
+    One frame per second going north, at the speed of every second.
+    :return: Catalog
+    """
+    n = len(speeds)
+    lat = lat0 + np.concatenate([[0.0], np.cumsum(speeds[1:])]) * METER
+    return Catalog(np.arange(first_id, first_id + n), np.full(n, -73.98), lat, start + np.arange(n),
+                   speeds, np.full(n, position), np.full(n, camera))
+
+
+class TestSampling(TestCase):
+
+    def test_one_frame_every_meters(self):
+        # 5 m/s for 20 s (100 m), stopped 60 s at a light with GPS noise, 5 m/s again for 20 s.
+        speeds = np.array([5.0] * 20 + [0.0] * 60 + [5.0] * 20)
+        catalog = drive(1, 1, 1000, speeds, 1)
+        rows = np.arange(len(speeds))
+        catalog.lat[20:80] += np.where(rows[20:80] % 2, 3, -3) * METER
+        ids = plan(catalog, meters=10)
+        # One frame every 2 s while moving, none while stopped. float32 coordinates, about half a meter of error.
+        moving = ids[ids <= 20]
+        self.assertEqual(10, len(moving))
+        self.assertEqual(1, moving[0])
+        self.assertTrue(((np.diff(moving) >= 1) & (np.diff(moving) <= 3)).all())
+        self.assertLessEqual(len(ids[(ids > 20) & (ids <= 80)]), 1)
+        self.assertEqual(10, len(ids[ids > 80]))
+        # Without the speed, the noise of the stop counts as travel.
+        self.assertGreater(len(plan(catalog, meters=10, min_speed=None)), 40)
+
+    def test_per_camera_and_drive(self):
+        speeds = np.array([10.0] * 10)
+        catalog = drive(1, 1, 0, speeds, 1).add(drive(1, 4, 0, speeds, 11)).add(drive(2, 1, 0, speeds, 21))
+        # Same camera and position after one hour, another drive.
+        catalog = catalog.add(drive(1, 1, 3600, speeds, 31, lat0=40.80))
+        ids = plan(catalog, meters=50)
+        self.assertEqual([1, 6, 31, 36, 11, 16, 21, 26], ids.tolist())
+        self.assertEqual(0, len(plan(Catalog())))
+
+    def test_sample_features(self):
+        speeds = [0.0] * 30
+        features = []
+        for i, speed in enumerate(speeds):
+            features.append({'geometry': {'coordinates': [-73.98, 40.72]},
+                             'properties': {'id': 100 - i, 'captured_on': '2017-01-17 10:00:{:02d}'.format(i),
+                                            'speed': speed, 'position': 1, 'camera': 3}})
+        # A car stopped all the time: one frame.
+        kept = list(sample(iter(features), meters=10))
+        self.assertEqual([100], [f['properties']['id'] for f in kept])
+        self.assertEqual('2017-01-17 10:00:00', kept[0]['properties']['captured_on'])
+        self.assertAlmostEqual(40.72, kept[0]['geometry']['coordinates'][1], places=4)
+        self.assertEqual(3, kept[0]['properties']['camera'])
+        self.assertEqual([], list(sample([])))
+
+    def test_sample_streams(self):
+        class Feature(dict):
+            pass
+
+        refs = []
+
+        def search():
+            for i in range(200):
+                feature = Feature(geometry={'coordinates': [-73.98, 40.72 + i * 5 * METER]},
+                                  properties={'id': i + 1, 'captured_on': '2017-01-17 10:{:02d}:{:02d}'.format(
+                                      i // 60, i % 60), 'speed': 5.0, 'position': 1, 'camera': 1})
+                refs.append(weakref.ref(feature))
+                yield feature
+
+        kept = sample(search(), meters=50)
+        ids = [f['properties']['id'] for f in kept]
+        # One frame every 10 s at 5 m/s, float32 coordinates may move a frame by one.
+        self.assertEqual(20, len(ids))
+        self.assertEqual(1, ids[0])
+        self.assertTrue(((np.diff(ids) >= 9) & (np.diff(ids) <= 11)).all())
+        # Only the columns are kept, the features of the search are gone.
+        gc.collect()
+        self.assertEqual(200, len(refs))
+        self.assertFalse(any(ref() is not None for ref in refs))
@@ -0,0 +1,90 @@
+import time
+from unittest import TestCase
+from source.Api import ApiError
+from source.Image import Image
+from source.MockCarmera import MockCarmera
+from source.Scheduler import Scheduler, TokenBucket
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class Flaky(object):
+    """
+    Fail the first 'failures' calls with the HTTP code given.
+    """
+    def __init__(self, failures, code):
+        self.failures = failures
+        self.code = code
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ApiError(self.code, 'Flaky')
+        return 'ok'
+
+
+class TestScheduler(TestCase):
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(50, burst=1)
+        start = time.time()
+        for _ in range(11):
+            bucket.acquire()
+        self.assertGreaterEqual(time.time() - start, 0.18)
+
+    def test_retry(self):
+        scheduler = Scheduler(rate=None, retries=3, backoff=0.001)
+        flaky = Flaky(2, 503)
+        self.assertEqual(scheduler.call(flaky), 'ok')
+        self.assertEqual(flaky.calls, 3)
+        self.assertEqual(scheduler.stats['retries'], 2)
+        self.assertEqual(scheduler.stats['throttled'], 2)
+
+    def test_no_retry(self):
+        scheduler = Scheduler(rate=None, retries=3, backoff=0.001)
+        flaky = Flaky(1, 404)
+        self.assertRaises(ApiError, scheduler.call, flaky)
+        self.assertEqual(flaky.calls, 1)
+
+    def test_give_up(self):
+        scheduler = Scheduler(rate=None, retries=2, backoff=0.001)
+        flaky = Flaky(10, 429)
+        self.assertRaises(ApiError, scheduler.call, flaky)
+        self.assertEqual(flaky.calls, 3)
+        self.assertEqual(scheduler.stats['failed'], 1)
+
+    def test_back_off(self):
+        scheduler = Scheduler(rate=100.0, concurrency=16, retries=1, backoff=0.001)
+        scheduler.call(Flaky(1, 429))
+        self.assertEqual(scheduler.limit, 8 + 1.0 / 8)
+        self.assertLess(scheduler.bucket.rate, 100.0)
+
+    def test_shared(self):
+        with MockCarmera(images=300, error_rate=0.3, seed=1) as mock:
+            scheduler = Scheduler(rate=None, retries=10, backoff=0.001)
+            image = Image('key', url=mock.url, scheduler=scheduler)
+            ids = Image.search_images_address(image, 'East Village', limit=20)
+            self.assertEqual(ids, set(range(1, 301)))
+            self.assertGreater(scheduler.stats['retries'], 0)
+            self.assertEqual(scheduler.stats['failed'], 0)
+            self.assertIs(Image('key', url=mock.url).scheduler, Image('other', url=mock.url).scheduler)
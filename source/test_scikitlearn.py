@@ -0,0 +1,187 @@
+from unittest import TestCase
+import os
+import resource
+import shutil
+import tempfile
+import multiprocessing
+import time
+import tracemalloc
+import numpy as np
+import scipy.sparse as sp
+from source.Classification.ScikitLearn import START_METHOD, Net, _load_matrix, _save_matrix
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class Slow(object):
+    """
+    Classifier whose fit waits for an event that is never set.
+    """
+    def __init__(self):
+        self.event = multiprocessing.get_context(START_METHOD).Event()
+
+    def fit(self, x, y):
+        self.event.wait(600)
+        return self
+
+
+def data(n=120, features=4, seed=0):
+    rnd = np.random.RandomState(seed)
+    x = rnd.rand(n, features).astype(np.float32)
+    y = (x[:, 0] + x[:, 1] > 1.0).astype(np.int64)
+    return x[:n // 2], x[n // 2:], y[:n // 2], y[n // 2:]
+
+
+class TestScikitLearn(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_classifiers(self):
+        x_train, x_test, _, _ = data()
+        names = [clf.__class__.__name__ for clf in Net(x_train, x_test).classifiers]
+        self.assertIn('LinearDiscriminantAnalysis', names)
+        self.assertIn('QuadraticDiscriminantAnalysis', names)
+
+    def test_fit_parallel(self):
+        from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+        from sklearn.tree import DecisionTreeClassifier
+        x_train, x_test, y_train, y_test = data()
+        net = Net(x_train, x_test)
+        net.classifiers = [DecisionTreeClassifier(), LinearDiscriminantAnalysis()]
+        leaderboard = Net.fit_parallel(net, y_train, y_test, processes=2, timeout=60)
+        self.assertEqual(['DecisionTreeClassifier', 'LinearDiscriminantAnalysis'],
+                         sorted(row['name'] for row in leaderboard))
+        for row in leaderboard:
+            self.assertIsNone(row['error'])
+            self.assertGreater(row['accuracy'], 0.7)
+        self.assertGreaterEqual(leaderboard[0]['accuracy'], leaderboard[1]['accuracy'])
+        self.assertEqual(2, len(net.clf_array))
+        self.assertEqual(len(y_test), len(net.pred_array[0]))
+
+    def test_fit_parallel_timeout(self):
+        from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+        x_train, x_test, y_train, y_test = data()
+        net = Net(x_train, x_test)
+        net.classifiers = [Slow(), LinearDiscriminantAnalysis()]
+        # The timeout counts from the load of the data, not from the start of the process: a fit of 60 rows is
+        # far under it, however slow the start is.
+        leaderboard = Net.fit_parallel(net, y_train, y_test, processes=2, timeout=3)
+        rows = dict((row['name'], row) for row in leaderboard)
+        self.assertEqual('Timeout after 3 seconds', rows['Slow']['error'])
+        self.assertIsNone(rows['Slow']['accuracy'])
+        self.assertIsNone(rows['LinearDiscriminantAnalysis']['error'])
+        self.assertEqual('LinearDiscriminantAnalysis', leaderboard[0]['name'])
+        self.assertEqual(1, len(net.clf_array))
+
+    def test_peak_memory_of_the_process(self):
+        from sklearn.tree import DecisionTreeClassifier
+        x_train, x_test, y_train, y_test = data()
+        net = Net(x_train, x_test)
+        net.classifiers = [DecisionTreeClassifier()]
+        row = Net.fit_parallel(net, y_train, y_test, processes=1, timeout=60)[0]
+        # A small dataset: far less than the memory of this process, counted by ru_maxrss of the child too.
+        self.assertGreaterEqual(row['peak_memory'], 0)
+        self.assertLess(row['peak_memory'], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 // 2)
+
+    def test_trace_memory(self):
+        from sklearn.tree import DecisionTreeClassifier
+        x_train, x_test, y_train, y_test = data()
+        net = Net(x_train, x_test)
+        net.classifiers = [DecisionTreeClassifier()]
+        Net.fit_train_clf_pred_prob(net, y_train, y_test)
+        self.assertIsNone(net.peak_memory)
+        self.assertFalse(tracemalloc.is_tracing())
+        Net.fit_train_clf_pred_prob(net, y_train, y_test, trace_memory=True)
+        self.assertGreater(net.peak_memory, 0)
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(2, len(net.accuracy_array))
+
+    def test_dense_is_lazy(self):
+        x_train, x_test, _, _ = data()
+        net = Net(sp.csr_matrix(x_train), x_test)
+        self.assertEqual({}, net.dense_cache)
+        self.assertTrue(sp.issparse(net.X_train))
+        dense = net.X_train_dense
+        self.assertIsInstance(dense, np.ndarray)
+        np.testing.assert_array_equal(x_train, dense)
+        self.assertEqual(['train'], list(net.dense_cache))
+        self.assertIs(dense, net.X_train_dense)
+        # A dense matrix is not copied.
+        self.assertIs(x_test, net.X_test_dense)
+        self.assertEqual(['test', 'train'], sorted(net.dense_cache))
+
+    def test_save_load_csr(self):
+        x = sp.random(50, 30, density=0.1, format='csc', dtype=np.float32, random_state=0)
+        _save_matrix(self.folder, 'X', x)
+        y = _load_matrix(self.folder, 'X')
+        self.assertTrue(sp.isspmatrix_csr(y))
+        self.assertEqual(x.shape, y.shape)
+        self.assertFalse(y.data.flags.owndata)
+        np.testing.assert_array_equal(x.toarray(), y.toarray())
+
+    def test_save_load_memmap(self):
+        x_train, _, _, _ = data()
+        path = os.path.join(self.folder, 'input.npy')
+        np.save(path, x_train)
+        out = os.path.join(self.folder, 'out')
+        os.mkdir(out)
+        _save_matrix(out, 'X', np.load(path, mmap_mode='r'))
+        self.assertEqual(['X.path'], os.listdir(out))
+        y = _load_matrix(out, 'X')
+        self.assertEqual(os.path.abspath(path), os.path.abspath(y.filename))
+        np.testing.assert_array_equal(x_train, y)
+        # A part of the file is copied.
+        _save_matrix(out, 'Y', np.load(path, mmap_mode='r')[:10])
+        self.assertIn('Y.npy', os.listdir(out))
+        np.testing.assert_array_equal(x_train[:10], _load_matrix(out, 'Y'))
+
+    def test_serial_default_classifiers(self):
+        x_train, x_test, y_train, y_test = data()
+        net = Net(x_train, x_test)
+        self.assertIs(net, Net.fit_train_clf_pred_prob(net, y_train, y_test))
+        rows = net.leaderboard
+        self.assertEqual(len(net.classifiers), len(rows))
+        self.assertEqual(sorted(range(len(net.classifiers))), sorted(row['index'] for row in rows))
+        ok = [row for row in rows if row['error'] is None]
+        self.assertEqual(len(ok), len(net.clf_array))
+        self.assertEqual(len(ok), len(net.prob_array))
+        # SVC without predict_proba is scored with its decision_function, like fit_parallel.
+        for row in rows:
+            if row['name'] == 'SVC':
+                self.assertIsNone(row['error'])
+                self.assertIsNotNone(row['auc'])
+        self.assertGreaterEqual(len(ok), len(rows) - 1)
+        # Only the classifiers of NEEDS_DENSE make the dense copy, and the input is dense already: no copy.
+        self.assertIs(x_train, net.dense_cache.get('train', x_train))
+
+    def test_serial_sparse_not_densified(self):
+        from sklearn.linear_model import LogisticRegression
+        x_train, x_test, y_train, y_test = data()
+        net = Net(sp.csr_matrix(x_train), sp.csr_matrix(x_test))
+        net.classifiers = [LogisticRegression()]
+        Net.fit_train_clf_pred_prob(net, y_train, y_test)
+        self.assertIsNone(net.leaderboard[0]['error'])
+        self.assertEqual({}, net.dense_cache)
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from source import MockCarmera
+from source.Spatial import SpatialIndex
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+POLYGON = [[[-73.99, 40.722], [-73.982, 40.721], [-73.979, 40.731], [-73.988, 40.734], [-73.99, 40.722]]]
+
+
+class TestSpatialIndex(TestCase):
+
+    def setUp(self):
+        self.features = MockCarmera.catalog(5000, seed=3)
+        self.index = SpatialIndex.from_features(self.features)
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def brute_force(self, keep):
+        return [f['properties']['id'] for f in sorted(self.features, key=lambda f: f['properties']['captured_on'])
+                if keep(f['geometry']['coordinates'][0], f['geometry']['coordinates'][1], f['properties'])]
+
+    def test_polygon(self):
+        expected = self.brute_force(lambda lon, lat, p: MockCarmera.inside(lon, lat, POLYGON))
+        self.assertTrue(len(expected) > 0)
+        self.assertEqual(self.index.polygon(POLYGON).tolist(), expected)
+
+    def test_radius(self):
+        lon, lat = MockCarmera.CENTER
+        expected = self.brute_force(lambda x, y, p: MockCarmera.haversine(lon, lat, x, y) <= 400)
+        self.assertEqual(sorted(self.index.radius(lon, lat, 400).tolist()), sorted(expected))
+
+    def test_range_and_speed(self):
+        start, end = MockCarmera.day_range('2017-01-01 01:00:00,2017-01-01 02:00:00')
+        expected = self.brute_force(lambda lon, lat, p: MockCarmera.inside(lon, lat, POLYGON) and
+                                    start <= p['captured_on'] <= end and p['speed'] <= 10)
+        result = self.index.polygon(POLYGON, range='2017-01-01 01:00:00,2017-01-01 02:00:00', max_speed=10)
+        self.assertEqual(result.tolist(), expected)
+
+    def test_add_and_save(self):
+        moved = dict(self.features[0], geometry={'type': 'Point', 'coordinates': [-73.5, 40.5]})
+        index = self.index.add(SpatialIndex.from_features([moved]))
+        self.assertEqual(len(index), 5000)
+        path = os.path.join(self.folder, 'index.npz')
+        index.save(path)
+        index = SpatialIndex.load(path)
+        self.assertEqual(index.radius(-73.5, 40.5, 10).tolist(), [1])
+        self.assertNotIn(1, index.polygon(POLYGON).tolist())
+
+    def test_antimeridian(self):
+        # Two points 20 meters apart on both sides of the antimeridian, and one far away.
+        index = SpatialIndex([1, 2, 3], [179.9999, -179.9999, 179.0], [0.0, 0.0, 0.0], [0, 0, 0], [0, 0, 0])
+        self.assertEqual(sorted(index.radius(179.9999, 0, 100).tolist()), [1, 2])
+        self.assertEqual(sorted(index.radius(-179.9999, 0, 100).tolist()), [1, 2])
+        self.assertEqual(index.radius(-179.9999, 0, 10).tolist(), [2])
+        self.assertEqual(sorted(index.ids[index.candidates(179.5, -1, -179.5, 1)].tolist()), [1, 2])
+        self.assertEqual(len(index.candidates(-200, -1, 200, 1)), 3)
+        # Near a pole the box is wider than the world.
+        self.assertEqual(sorted(index.radius(0, 89.9999, 20000000).tolist()), [1, 2, 3])
+
+    def test_positions(self):
+        ids = [f['properties']['id'] for f in self.features[:5]]
+        positions = self.index.positions(ids)
+        self.assertEqual(self.index.ids[positions].tolist(), ids)
+        with self.assertRaises(KeyError) as raised:
+            self.index.positions(ids + [10 ** 12])
+        self.assertIn(str(10 ** 12), str(raised.exception))
+        self.assertRaises(KeyError, SpatialIndex([], [], [], [], []).positions, [1])
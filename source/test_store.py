@@ -0,0 +1,145 @@
+import os
+import shutil
+import tempfile
+import threading
+from multiprocessing import Pool
+from unittest import TestCase, mock
+from source.Downloader import Downloader
+from source.MockCarmera import MockCarmera, catalog, jpeg
+from source.test_pipeline import FakeDownloader
+from source.Pipeline import Pipeline
+from source.Processing import Quality
+from source.Processing.Thumbnail import thumbnails
+from source.Store import ThumbnailStore, is_store
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+def write(args):
+    folder, worker = args
+    with ThumbnailStore(folder, segment_size=4096) as store:
+        for i in range(50):
+            store.put('{}-{}.jpg'.format(worker, i), '{}:{}'.format(worker, i).encode() * 20)
+
+
+class TestThumbnailStore(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'store')
+        self.store = ThumbnailStore(self.path, segment_size=1000)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.folder)
+
+    def test_put_get(self):
+        self.assertTrue(is_store(self.path))
+        self.store.put('a.jpg', b'a' * 600)
+        self.store.put_many([('b.jpg', b'b' * 600), ('c.jpg', b'c' * 10)])
+        view = self.store.get('b.jpg')
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(b'b' * 600, view.tobytes())
+        self.assertIsNone(self.store.get('d.jpg'))
+        self.assertEqual(3, len(self.store))
+        self.assertIn('c.jpg', self.store)
+        # Full segments roll over to a new one.
+        self.assertEqual([0, 1], self.store.segments())
+        self.assertEqual(['a.jpg', 'b.jpg', 'c.jpg'], [name for name, _ in self.store.scan(batch=2)])
+
+    def test_replace_and_compact(self):
+        for i in range(10):
+            self.store.put('{}.jpg'.format(i % 3), str(i).encode() * 100)
+        self.store.delete('2.jpg')
+        size = self.store.size()
+        self.assertEqual(2, size['images'])
+        self.assertEqual(800, size['garbage_bytes'])
+        old = self.store.get('0.jpg')
+        result = self.store.compact()
+        self.assertEqual(1000, result['bytes_before'])
+        self.assertEqual(200, result['bytes_after'])
+        self.assertEqual(b'9' * 100, self.store.get('0.jpg').tobytes())
+        self.assertEqual(b'7' * 100, self.store.get('1.jpg').tobytes())
+        # A view taken before the compaction is still valid.
+        self.assertEqual(b'9' * 100, old.tobytes())
+        # Other store on the same folder sees the new place.
+        with ThumbnailStore(self.path) as other:
+            self.assertEqual(b'7' * 100, other.get('1.jpg').tobytes())
+            self.store.put('1.jpg', b'new')
+            self.store.compact()
+            self.assertEqual(b'new', other.get('1.jpg').tobytes())
+
+    def test_concurrent_writers(self):
+        pool = Pool(4)
+        try:
+            pool.map(write, [(self.path, worker) for worker in range(4)])
+        finally:
+            pool.close()
+            pool.join()
+        threads = [threading.Thread(target=write, args=((self.path, worker),)) for worker in range(4, 8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(400, len(self.store))
+        for worker in range(8):
+            for i in range(50):
+                data = self.store.get('{}-{}.jpg'.format(worker, i)).tobytes()
+                self.assertEqual('{}:{}'.format(worker, i).encode() * 20, data)
+
+    def test_decode_and_thumbnails(self):
+        sources = [('{}.png'.format(i), jpeg(640, 480, i)) for i in range(6)]
+        results, stats = thumbnails(sources, None, width=320, processes=2, chunksize=1, store=self.store)
+        self.assertEqual(6, stats['ok'])
+        self.assertEqual(6, len(self.store))
+        self.assertEqual((240, 320, 3), self.store.decode('3.jpg').shape)
+        self.assertEqual((120, 160), self.store.decode('3.jpg', width=160, gray=True).shape)
+        columns, stats = Quality.score_batch(self.path, width=160, processes=2)
+        self.assertEqual(sorted(name for name, _ in sources), sorted(n.replace('jpg', 'png') for n in columns['name']))
+
+    def test_pipeline(self):
+        with MockCarmera(images=20) as mock:
+            downloader = Downloader('test', url=mock.url, workers=4)
+            pipeline = Pipeline(downloader, None, width=320, ping=lambda image_id: None, store=self.store)
+            metrics = pipeline.run(catalog(20))
+        self.assertEqual(20, metrics['thumbnail']['items'])
+        self.assertEqual(20, len(self.store))
+        self.assertEqual(320, self.store.decode('7.jpg').shape[1])
+
+    def test_empty_image(self):
+        self.store.put('a.jpg', b'a' * 10)
+        self.assertRaises(ValueError, self.store.put, 'b.jpg', b'')
+        self.assertRaises(ValueError, self.store.put_many, [('c.jpg', b'c' * 10), ('d.jpg', bytearray())])
+        # Nothing of the batch is written.
+        self.assertEqual(['a.jpg'], self.store.names())
+        self.assertEqual(10, self.store.size()['bytes'])
+        self.assertEqual(b'a' * 10, self.store.get('a.jpg').tobytes())
+
+    def test_pipeline_encode_error(self):
+        pipeline = Pipeline(FakeDownloader(), None, width=160, ping=lambda image_id: None, store=self.store)
+        with mock.patch('source.Pipeline.cv2.imencode', return_value=(False, None)):
+            metrics = pipeline.run(catalog(5))
+        self.assertEqual(5, metrics['thumbnail']['failed'])
+        self.assertEqual(0, metrics['ping']['items'])
+        self.assertEqual(0, len(self.store))
+        self.assertTrue(all(stage == 'thumbnail' and 'can not be encoded' in error
+                            for stage, image, error in pipeline.errors))
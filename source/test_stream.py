@@ -0,0 +1,124 @@
+from unittest import TestCase
+import csv
+import os
+import shutil
+import tempfile
+import cv2
+import numpy as np
+from source.Classification.Stream import ImageBatchGenerator, predict_folder
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class Brightness(object):
+    """
+    Model of 2 classes: dark and bright images.
+    """
+    def __init__(self):
+        self.batches = []
+
+    def predict_on_batch(self, x):
+        self.batches.append(x.shape)
+        bright = x.reshape(len(x), -1).mean(axis=1)
+        return np.column_stack([1.0 - bright, bright])
+
+
+class TestStream(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def save(self, name, value):
+        path = os.path.join(self.folder, name)
+        cv2.imwrite(path, np.full((48, 64, 3), value, dtype=np.uint8))
+        return path
+
+    def broken(self, name):
+        path = os.path.join(self.folder, name)
+        with open(path, 'wb') as f:
+            f.write(b'not an image')
+        return path
+
+    def test_predict_folder(self):
+        for i, value in enumerate([10, 240, 30, 250, 200]):
+            self.save('{}.png'.format(100 + i), value)
+        self.broken('999.jpg')
+        model = Brightness()
+        out = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, out, True)
+        out = os.path.join(out, 'predictions.csv')
+        result = predict_folder(model, self.folder, out, width=16, height=8, batch_size=2, workers=2)
+        self.assertEqual(5, result['images'])
+        self.assertEqual(1, result['failed'])
+        with open(out) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(['image_id', 'class', 'probability'], rows[0])
+        self.assertEqual(['100', '101', '102', '103', '104'], [row[0] for row in rows[1:]])
+        self.assertEqual(['0', '1', '0', '1', '1'], [row[1] for row in rows[1:]])
+        self.assertAlmostEqual(250 / 255.0, float(rows[4][2]), places=4)
+        self.assertEqual((2, 3, 8, 16), model.batches[0])
+
+    def test_batches(self):
+        sources = [self.save('{}.png'.format(i), 20 * i) for i in range(5)] + [self.broken('x.jpg')]
+        generator = ImageBatchGenerator(sources, labels=[0, 1, 0, 1, 0, 1], width=8, height=8, depth=1,
+                                        batch_size=4, shuffle=False, loop=False)
+        try:
+            batches = list(generator)
+        finally:
+            generator.close()
+        self.assertEqual([(4, 1, 8, 8), (1, 1, 8, 8)], [x.shape for x, y in batches])
+        np.testing.assert_array_equal([[1, 0], [0, 1], [1, 0], [0, 1]], batches[0][1])
+
+    def test_error_in_feed(self):
+        sources = [self.save('{}.png'.format(i), 100) for i in range(3)]
+        # A label out of the classes fails in the feed thread.
+        generator = ImageBatchGenerator(sources, labels=[0, 1, 5], classes=2, width=8, height=8, batch_size=3,
+                                        loop=False)
+        try:
+            self.assertRaises(IndexError, generator.next_batch)
+            # The generator stays stopped.
+            self.assertRaises(IndexError, generator.next_batch)
+        finally:
+            generator.close()
+        self.assertFalse(generator.thread.is_alive())
+
+    def test_loop_without_images(self):
+        sources = [self.broken('{}.jpg'.format(i)) for i in range(3)]
+        generator = ImageBatchGenerator(sources, width=8, height=8, batch_size=2, loop=True)
+        try:
+            self.assertRaises(ValueError, generator.next_batch)
+        finally:
+            generator.close()
+        generator = ImageBatchGenerator([], width=8, height=8, loop=True)
+        try:
+            self.assertRaises(ValueError, generator.next_batch)
+        finally:
+            generator.close()
+        # Without loop it is only the end.
+        generator = ImageBatchGenerator(sources, width=8, height=8, loop=False)
+        try:
+            self.assertEqual([], list(generator))
+        finally:
+            generator.close()
@@ -0,0 +1,81 @@
+import datetime
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from source.Downloader import DownloadResult
+from source.Sync import Sync
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+class FakeDownloader(object):
+    """
+    Downloader that fails with the IDs in 'broken'.
+    """
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+        self.requested = []
+
+    def download_all(self, img_id_set, url_save, width=None):
+        self.requested.extend(img_id_set)
+        return [DownloadResult(i, i not in self.broken, None, 0, 0.0, None) for i in img_id_set]
+
+
+def images(first, last):
+    return [{'properties': {'image_id': i, 'captured_on': '2016-07-{:02d}T10:00:00.000Z'.format(i)}}
+            for i in range(first, last + 1)]
+
+
+class TestSync(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.sync = Sync(os.path.join(self.folder, 'sync.db'))
+
+    def tearDown(self):
+        self.sync.close()
+        shutil.rmtree(self.folder)
+
+    def test_new_aoi(self):
+        self.assertIsNone(self.sync.range('east village'))
+
+    def test_incremental(self):
+        self.sync.run('east village', images(1, 5), FakeDownloader(), self.folder, batch=2)
+        self.assertEqual(self.sync.watermark('east village'), '2016-07-05 10:00:00')
+        self.assertEqual(self.sync.range('east village', until=datetime.datetime(2016, 7, 9)),
+                         '2016-07-05 10:00:00,2016-07-09 00:00:00')
+
+        downloader = FakeDownloader()
+        self.sync.run('east village', images(5, 8), downloader, self.folder, batch=2)
+        self.assertEqual(downloader.requested, [6, 7, 8])
+        self.assertEqual(self.sync.watermark('east village'), '2016-07-08 10:00:00')
+
+    def test_resume_after_failure(self):
+        self.sync.run('east village', images(1, 6), FakeDownloader(broken=[3]), self.folder, batch=2)
+        self.assertEqual(self.sync.watermark('east village'), '2016-07-02 10:00:00')
+        self.assertEqual(self.sync.downloaded('east village'), set(['1', '2', '4', '5', '6']))
+
+        downloader = FakeDownloader()
+        self.sync.run('east village', images(2, 6), downloader, self.folder, batch=2)
+        self.assertEqual(downloader.requested, [3])
+        self.assertEqual(self.sync.watermark('east village'), '2016-07-06 10:00:00')
@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+import cv2
+import numpy as np
+from source.Processing.Thumbnail import decode, fit_width, jpeg_size, reduced_flag, thumbnail, thumbnail_bytes
+
+"""
+MIT License
+
+Copyright (c) 2016 Rainer Arencibia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+def image(width, height):
+    rnd = np.random.RandomState(0)
+    small = rnd.randint(0, 255, (height // 16 + 1, width // 16 + 1, 3)).astype(np.uint8)
+    return cv2.resize(small, (width, height))
+
+
+def encode(img, ext='.jpg', params=()):
+    ok, buf = cv2.imencode(ext, img, list(params))
+    return buf.tobytes()
+
+
+class TestThumbnail(TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_jpeg_size(self):
+        self.assertEqual((816, 612), jpeg_size(encode(image(816, 612))))
+        # Progressive JPEG, SOF2 marker.
+        progressive = encode(image(640, 480), params=[cv2.IMWRITE_JPEG_PROGRESSIVE, 1])
+        self.assertIn(b'\xff\xc2', progressive)
+        self.assertEqual((640, 480), jpeg_size(progressive))
+        # Not a JPEG, or a JPEG cut before the size.
+        self.assertIsNone(jpeg_size(encode(image(64, 48), ext='.png')))
+        self.assertIsNone(jpeg_size(b'not an image at all'))
+        self.assertIsNone(jpeg_size(encode(image(64, 48))[:20]))
+
+    def test_reduced_flag(self):
+        # Side facing cameras, 3264 wide.
+        self.assertEqual(cv2.IMREAD_REDUCED_COLOR_8, reduced_flag(3264, 400))
+        self.assertEqual(cv2.IMREAD_REDUCED_COLOR_4, reduced_flag(3264, 640))
+        self.assertEqual(cv2.IMREAD_REDUCED_COLOR_2, reduced_flag(3264, 1200))
+        self.assertEqual(cv2.IMREAD_COLOR, reduced_flag(3264, 2000))
+        self.assertEqual(cv2.IMREAD_REDUCED_GRAYSCALE_4, reduced_flag(3264, 640, gray=True))
+        self.assertEqual(cv2.IMREAD_COLOR, reduced_flag(None, 640))
+        self.assertEqual(cv2.IMREAD_GRAYSCALE, reduced_flag(3264, None, gray=True))
+
+    def test_decode(self):
+        buf = encode(image(1600, 1200))
+        self.assertEqual((150, 200, 3), decode(buf, 200).shape)
+        self.assertEqual((300, 400, 3), decode(buf, 201).shape)
+        self.assertEqual((600, 800), decode(buf, 700, gray=True).shape)
+        self.assertEqual((1200, 1600, 3), decode(buf).shape)
+        # A PNG has no reduced decode, it is decoded at full size.
+        self.assertEqual((48, 64, 3), decode(encode(image(64, 48), ext='.png'), 16).shape)
+
+    def test_thumbnail(self):
+        name, error, jpg = thumbnail_bytes(('a.png', encode(image(1600, 1200))), width=640)
+        self.assertIsNone(error)
+        self.assertEqual((640, 480), jpeg_size(jpg))
+        name, error, jpg = thumbnail_bytes(('b.jpg', b'broken'), width=640)
+        self.assertIsNotNone(error)
+        self.assertIsNone(jpg)
+        self.assertEqual(('a.png', None), thumbnail(('a.png', encode(image(800, 600))), self.folder, width=320))
+        self.assertEqual(['a.jpg'], os.listdir(self.folder))
+
+    def test_fit_width(self):
+        small = encode(image(320, 240))
+        self.assertIs(small, fit_width(small, 640))
+        self.assertEqual((640, 480), jpeg_size(fit_width(encode(image(1280, 960)), 640)))